@@ -1,107 +1,37 @@
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from imblearn.over_sampling import SMOTE
-from sklearn.neural_network import MLPClassifier
-from sklearn.metrics import f1_score, roc_auc_score, roc_curve
-from warnings import filterwarnings
-import matplotlib.pyplot as plt
-
-filterwarnings('ignore')
-
-# Load and preprocess data
-df = pd.read_csv('data/tess.csv')
-
-def encode_disposition(x):
-    if x == "CP":
-        return 1
-    elif x in ["FP", "AFP"]:
-        return 0
-    else:
-        return -1
-
-df['target'] = df['tfopwg_disp'].apply(encode_disposition)
-labeled = df[df['target'] != -1].copy()
-candidates = df[df['target'] == -1].copy()
-
-# Exclude unwanted columns including 'target'
-ignore = ['toi', 'tid', 'tfopwg_disp', 'toi_created', 'rowupdate', 'rastr', 'decstr', 'ra', 'dec', 'target']
-ignore += [col for col in df.columns if col.endswith('err1') or col.endswith('err2') or col.endswith('lim')]
-
-features = [c for c in df.columns if c not in ignore and pd.api.types.is_numeric_dtype(df[c])]
-
-# Prepare feature data
-X_labeled = labeled[features].copy()
-y = labeled['target'].copy()
-X_candidates = candidates[features].copy()
+"""
+Classify the unlabeled TESS candidates
+Works exactly like k2_predict.py on the TESS catalog: trains through the shared
+training pipeline (backend/api/training.py), prints held-out scores and lists
+the most promising liveable candidates.
+"""
+import sys
+from pathlib import Path
 
-# Replace zeros with NaN (treat zeros as missing)
-X_labeled.replace(0, pd.NA, inplace=True)
-X_candidates.replace(0, pd.NA, inplace=True)
-
-# Drop rows with any missing values (NaN) in labeled data, align y accordingly
-X_labeled.dropna(inplace=True)
-y = y.loc[X_labeled.index]
-
-# Drop rows with any missing values in candidates, align candidates dataframe accordingly
-X_candidates.dropna(inplace=True)
-candidates = candidates.loc[X_candidates.index]
-
-# Scale features
-scaler = StandardScaler()
-X_labeled_scaled = scaler.fit_transform(X_labeled)
-X_candidates_scaled = scaler.transform(X_candidates)
-
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(
-    X_labeled_scaled, y, test_size=0.2, stratify=y, random_state=42
-)
-
-# Random Forest with SMOTE
-smote = SMOTE(random_state=42)
-X_train_smote, y_train_smote = smote.fit_resample(X_train, y_train)
-rf_clf = RandomForestClassifier(n_estimators=100, random_state=42)
-rf_clf.fit(X_train_smote, y_train_smote)
-rf_preds = rf_clf.predict(X_test)
-rf_proba = rf_clf.predict_proba(X_test)[:, 1]
-rf_f1 = f1_score(y_test, rf_preds)
-rf_roc = roc_auc_score(y_test, rf_proba)
+import pandas as pd
 
-# Visualize top features from Random Forest
-importances = rf_clf.feature_importances_
-feature_names = X_labeled.columns
-indices = importances.argsort()[::-1][:30]
+here = Path(__file__).parent
+sys.path.insert(0, str(here.parent / "api"))
 
-plt.figure(figsize=(8,6))
-plt.barh(range(len(indices)), importances[indices][::-1])
-plt.yticks(range(len(indices)), [feature_names[i] for i in indices][::-1])
-plt.xlabel("Feature Importance")
-plt.title("Top 30 Feature Importances (Random Forest)")
-plt.tight_layout()
-plt.show()
+from training import build_features, predict_candidates, train_models
 
-# Neural Network (MLP) without SMOTE
-mlp_clf = MLPClassifier(random_state=42, max_iter=500)
-mlp_clf.fit(X_train, y_train)
-mlp_preds = mlp_clf.predict(X_test)
-mlp_proba = mlp_clf.predict_proba(X_test)[:, 1]
-mlp_f1 = f1_score(y_test, mlp_preds)
-mlp_roc = roc_auc_score(y_test, mlp_proba)
+features = build_features("tess")
+models = train_models("tess", features)
 
-# Print F1 and ROC AUC scores
-print(f"Random Forest (SMOTE) - F1: {rf_f1:.3f}, ROC AUC: {rf_roc:.3f}")
-print(f"Neural Network (no SMOTE) - F1: {mlp_f1:.3f}, ROC AUC: {mlp_roc:.3f}")
+# Print held-out scores
+for key, label in (("rf", "Random Forest (SMOTE)"), ("mlp", "Neural Network (no SMOTE)")):
+    m = models["metrics"][key]
+    print(f"{label} - F1: {m['f1']:.3f}, Accuracy: {m['accuracy']:.3f}")
 
 # Predict on candidates using Random Forest
+candidates = predict_candidates("tess", models, features)
 if not candidates.empty:
-    cand_pred_labels = rf_clf.predict(X_candidates_scaled)
+    cand_pred_labels = candidates['predicted_label'].values
     total = len(cand_pred_labels)
     num_exoplanet = (cand_pred_labels == 1).sum()
     num_false = (cand_pred_labels == 0).sum()
     print(f"Among {total} candidates: {num_exoplanet} predicted exoplanet ({num_exoplanet/total:.2%}), {num_false} predicted non-exoplanet ({num_false/total:.2%})")
 
-    predicted_exoplanets = candidates[cand_pred_labels == 1].copy()
+    predicted_exoplanets = candidates[candidates['predicted_label'] == 1].copy()
 
     def check_habitable(row):
         criteria = {
@@ -122,17 +52,3 @@ if not candidates.empty:
     print("\nTop potentially liveable candidate exoplanets predicted by Random Forest:")
     print(liveable_candidates[['toi', 'pl_rade', 'pl_eqt', 'pl_insol', 'st_teff', 'habitability_score']]
           .sort_values('habitability_score', ascending=False).head(20))
-
-# Visualization: ROC curve comparison
-rf_fpr, rf_tpr, _ = roc_curve(y_test, rf_proba)
-mlp_fpr, mlp_tpr, _ = roc_curve(y_test, mlp_proba)
-plt.figure(figsize=(8,6))
-plt.plot(rf_fpr, rf_tpr, label=f'Random Forest (AUC={rf_roc:.2f})')
-plt.plot(mlp_fpr, mlp_tpr, label=f'Neural Network (AUC={mlp_roc:.2f})')
-plt.plot([0,1],[0,1],'k--',label='Chance')
-plt.xlabel("False Positive Rate")
-plt.ylabel("True Positive Rate (Recall)")
-plt.title("ROC Curve Comparison")
-plt.legend()
-plt.tight_layout()
-plt.show()
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+Pluggable data sources for the TRICERATOPS FPP pipeline
+The "mast" source queries MAST/TIC, TRILEGAL and lightkurve live (the original
+behaviour). The "local" source serves recorded star tables, TRILEGAL tables and
+light curves from a fixture directory, so the pipeline runs offline:
+
+    <fixture_dir>/EPIC<ID>/stars.csv       target.stars as returned by tr.target
+    <fixture_dir>/EPIC<ID>/trilegal.csv    TRILEGAL output (optional)
+    <fixture_dir>/EPIC<ID>/lightcurve.csv  raw time, flux, flux_err
+
+The source is chosen with FPP_DATA_SOURCE ("mast" or "local") and
+FPP_FIXTURE_DIR, or passed explicitly to run_fpp_for_planet.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import triceratops.triceratops as tr
+
+DATA_SOURCE_ENV = "FPP_DATA_SOURCE"
+FIXTURE_DIR_ENV = "FPP_FIXTURE_DIR"
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def target_from_star_table(ID, stars, sectors, search_radius, mission, trilegal_fname):
+    """
+    Build a tr.target around an existing star table without running its
+    constructor (which queries MAST and downloads pixel files).
+    """
+    target = tr.target.__new__(tr.target)
+    target.ID = ID
+    target.mission = mission
+    target.sectors = sectors
+    target.search_radius = search_radius
+    target.N_pix = 2 * search_radius + 2
+    target.stars = stars
+    target.trilegal_fname = trilegal_fname
+    target.trilegal_url = None
+    target.TESS_images = []
+    target.col0s = []
+    target.row0s = []
+    target.pix_coords = []
+    return target
+
+
+class MastDataSource:
+    """Live MAST/TIC, TRILEGAL and lightkurve queries"""
+    name = "mast"
+
+    def build_target(self, ID, ra, dec, sectors, search_radius, mission,
+                     lightkurve_cache_dir, trilegal_fname):
+        return tr.target(
+            ID=ID,
+            sectors=sectors,
+            search_radius=search_radius,
+            mission=mission,
+            lightkurve_cache_dir=lightkurve_cache_dir,
+            trilegal_fname=trilegal_fname,
+            ra=ra,
+            dec=dec
+        )
+
+    def get_lightcurve(self, hostname, ID):
+        """Raw (time, flux, flux_err) arrays, or None if no light curve exists"""
+        import lightkurve as lk
+
+        search_result = lk.search_lightcurve(hostname, mission="K2")
+        if len(search_result) == 0:
+            return None
+        lc = search_result.download().remove_nans()
+        return (
+            np.asarray(lc.time.value, dtype=float),
+            np.asarray(lc.flux.value, dtype=float),
+            np.asarray(lc.flux_err.value, dtype=float),
+        )
+
+
+class LocalFixtureDataSource:
+    """Recorded star tables and light curves read from disk, no network access"""
+    name = "local"
+
+    def __init__(self, fixture_dir=None):
+        self.fixture_dir = fixture_dir or os.environ.get(FIXTURE_DIR_ENV, DEFAULT_FIXTURE_DIR)
+
+    def target_dir(self, ID):
+        return os.path.join(self.fixture_dir, f"EPIC{int(ID)}")
+
+    def build_target(self, ID, ra, dec, sectors, search_radius, mission,
+                     lightkurve_cache_dir, trilegal_fname):
+        """
+        Build a tr.target from the recorded star table.
+        Uses the recorded TRILEGAL table when present, else trilegal_fname.
+        """
+        stars_file = os.path.join(self.target_dir(ID), "stars.csv")
+        if not os.path.exists(stars_file):
+            raise FileNotFoundError(f"No recorded star table for EPIC {ID}: {stars_file}")
+
+        recorded_trilegal = os.path.join(self.target_dir(ID), "trilegal.csv")
+        trilegal = recorded_trilegal if os.path.exists(recorded_trilegal) else trilegal_fname
+        return target_from_star_table(
+            ID, pd.read_csv(stars_file), sectors, search_radius, mission, trilegal
+        )
+
+    def get_lightcurve(self, hostname, ID):
+        """Raw (time, flux, flux_err) arrays, or None if none was recorded"""
+        lc_file = os.path.join(self.target_dir(ID), "lightcurve.csv")
+        if not os.path.exists(lc_file):
+            return None
+        lc = pd.read_csv(lc_file)
+        flux_err = lc["flux_err"] if "flux_err" in lc.columns else np.nan
+        return (
+            lc["time"].to_numpy(dtype=float),
+            lc["flux"].to_numpy(dtype=float),
+            np.broadcast_to(np.asarray(flux_err, dtype=float), len(lc)).copy(),
+        )
+
+
+DATA_SOURCES = {
+    MastDataSource.name: MastDataSource,
+    LocalFixtureDataSource.name: LocalFixtureDataSource,
+}
+
+
+def get_data_source(name=None, fixture_dir=None):
+    """
+    Return the configured data source.
+    name defaults to $FPP_DATA_SOURCE, then "mast".
+    """
+    name = name or os.environ.get(DATA_SOURCE_ENV, MastDataSource.name)
+    if name not in DATA_SOURCES:
+        raise ValueError(f"Unknown FPP data source '{name}'. Use one of {list(DATA_SOURCES)}")
+    if name == LocalFixtureDataSource.name:
+        return LocalFixtureDataSource(fixture_dir)
+    return DATA_SOURCES[name]()
+
+
+def record_fixture(planet, fixture_dir, search_radius=10, trilegal_fname=None,
+                   lightkurve_cache_dir=None, source=None):
+    """
+    Record the star table, TRILEGAL table and raw light curve for one planet
+    (row from DataFrame) from a live source, in the layout the local source reads.
+    Returns the fixture directory for the target.
+    """
+    source = source or MastDataSource()
+    ID = int(planet["hostname"].split()[-1])
+    fixture = LocalFixtureDataSource(fixture_dir)
+    out_dir = fixture.target_dir(ID)
+    os.makedirs(out_dir, exist_ok=True)
+
+    target = source.build_target(
+        ID=ID,
+        ra=float(planet["ra"]),
+        dec=float(planet["dec"]),
+        sectors=np.array([0]),
+        search_radius=search_radius,
+        mission="K2",
+        lightkurve_cache_dir=lightkurve_cache_dir,
+        trilegal_fname=trilegal_fname
+    )
+    target.stars.to_csv(os.path.join(out_dir, "stars.csv"), index=False)
+    if target.trilegal_fname and os.path.exists(target.trilegal_fname):
+        shutil.copyfile(target.trilegal_fname, os.path.join(out_dir, "trilegal.csv"))
+
+    lc = source.get_lightcurve(planet["hostname"], ID)
+    if lc is not None:
+        time_arr, flux_arr, flux_err = lc
+        pd.DataFrame({"time": time_arr, "flux": flux_arr, "flux_err": flux_err}).to_csv(
+            os.path.join(out_dir, "lightcurve.csv"), index=False
+        )
+
+    print(f"Recorded fixture for EPIC {ID} in {out_dir}")
+    return out_dir
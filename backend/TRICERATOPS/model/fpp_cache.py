@@ -0,0 +1,63 @@
+"""
+Persistent store of TRICERATOPS FPP results
+Results are keyed by EPIC ID, orbital period, search radius, sampling settings
+and FPP_PIPELINE_VERSION, and stored one JSON file per key, so repeat queries
+return without rerunning calc_probs. Bump FPP_PIPELINE_VERSION whenever a change
+to the pipeline would alter FPP/NFPP, which invalidates every stored result.
+"""
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+FPP_PIPELINE_VERSION = "1"
+
+
+def fpp_result_key(ID, period, search_radius, **settings):
+    """
+    Stable key for one FPP computation. settings holds the sampling and
+    processing options (N, adaptive, nsamples, detrend method, ...).
+    """
+    fields = {
+        "epic": int(ID),
+        "period": round(float(period), 8),
+        "search_radius": search_radius,
+        "settings": settings,
+        "version": FPP_PIPELINE_VERSION,
+    }
+    digest = hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+    return f"EPIC{int(ID)}_{digest[:16]}", fields
+
+
+def load_fpp_result(cache_dir, key):
+    """Stored result dict (FPP, NFPP, precision, ...) or None"""
+    path = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("key_fields", {}).get("version") != FPP_PIPELINE_VERSION:
+        return None
+    return record
+
+
+def save_fpp_result(cache_dir, key, key_fields, FPP, NFPP, precision=None):
+    """Write a result atomically (temp file + rename)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    record = {
+        "FPP": float(FPP),
+        "NFPP": float(NFPP),
+        "precision": precision,
+        "key_fields": key_fields,
+        "computed": datetime.utcnow().isoformat(),
+    }
+    path = os.path.join(cache_dir, f"{key}.json")
+    tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+    with open(tmp, "w") as f:
+        json.dump(record, f, indent=2, default=str)
+    os.replace(tmp, path)
+    return record
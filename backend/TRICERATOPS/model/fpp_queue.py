@@ -0,0 +1,383 @@
+"""
+Work queue for distributed TRICERATOPS FPP runs
+Jobs live in a SQLite database, one job per host star (so multi-planet systems
+still share a target, see run_fpp_for_host). Any number of worker processes, on
+one or several machines, pull jobs from the same database file:
+
+    python fpp_queue.py enqueue --db /shared/fpp_queue.db --csv exoplanets_to_confirm.csv
+    python fpp_queue.py worker  --db /shared/fpp_queue.db     # once per process/host
+    python fpp_queue.py status  --db /shared/fpp_queue.db
+    python fpp_queue.py collect --db /shared/fpp_queue.db --out fpp_results.csv
+
+A worker claims a job with a lease and extends it with heartbeats while
+calc_probs runs. If a worker dies, its lease expires and another worker picks
+the job up; failed jobs are retried up to max_attempts. Hosts are independent,
+so throughput grows with the number of workers until the queue runs dry.
+The database uses SQLite's rollback journal and file locks; put it on storage
+that honours POSIX locks (a local disk, or NFS with locking enabled).
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from triceratops_model import run_fpp_for_host
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    hostname TEXT NOT NULL,
+    planets TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    heartbeat REAL,
+    results TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+def connect(db_path, timeout=60):
+    """Open the queue database, creating the schema if needed"""
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _job_id(hostname, periods, settings):
+    fields = json.dumps([hostname, sorted(float(p) for p in periods), settings], sort_keys=True)
+    return hashlib.sha1(fields.encode()).hexdigest()[:16]
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def enqueue_planets(db_path, planets, max_attempts=3, search_radius=10, adaptive=False,
+                    detrend_method="savgol", window_length=401, force=False):
+    """
+    Add one job per host star in planets (DataFrame of candidate rows).
+    Job IDs are derived from the host, its periods and the settings, so
+    enqueueing the same catalog twice does not duplicate work.
+    Returns the number of jobs added.
+    """
+    settings = dict(search_radius=search_radius, adaptive=adaptive,
+                    detrend_method=detrend_method, window_length=window_length, force=force)
+    now = time.time()
+    added = 0
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for hostname, group in pd.DataFrame(planets).groupby("hostname", sort=False):
+            records = group.to_dict(orient="records")
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, hostname, planets, settings, status, max_attempts, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_job_id(hostname, group["pl_orbper"], settings), hostname,
+                 json.dumps(records, default=_json_default), json.dumps(settings),
+                 PENDING, max_attempts, now, now)
+            )
+            added += cursor.rowcount
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return added
+
+
+def claim_job(conn, worker, lease_seconds=600):
+    """
+    Lease the oldest runnable job: pending, or leased with an expired lease
+    (its worker stopped heartbeating). Returns the job row or None.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE (status = ? OR (status = ? AND lease_expires < ?))"
+            " ORDER BY created LIMIT 1",
+            (PENDING, LEASED, now)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        if row["attempts"] >= row["max_attempts"]:
+            # Lease expired on the final attempt
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                (FAILED, row["error"] or "lease expired", now, row["id"])
+            )
+            conn.execute("COMMIT")
+            return claim_job(conn, worker, lease_seconds)
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1,"
+            " lease_expires = ?, heartbeat = ?, updated = ? WHERE id = ?",
+            (LEASED, worker, now + lease_seconds, now, now, row["id"])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+
+def heartbeat(conn, job_id, worker, lease_seconds=600):
+    """Extend a lease; False if the worker no longer holds it"""
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ?, heartbeat = ?, updated = ?"
+        " WHERE id = ? AND worker = ? AND status = ?",
+        (now + lease_seconds, now, now, job_id, worker, LEASED)
+    )
+    return cursor.rowcount == 1
+
+
+def complete_job(conn, job_id, worker, results):
+    """Store results for a leased job; False if the lease was lost meanwhile"""
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = ?, results = ?, error = NULL, lease_expires = NULL, updated = ?"
+        " WHERE id = ? AND worker = ? AND status = ?",
+        (DONE, json.dumps(results, default=_json_default), now, job_id, worker, LEASED)
+    )
+    return cursor.rowcount == 1
+
+
+def fail_job(conn, job_id, worker, error):
+    """Return a job to the queue for retry, or mark it failed after max_attempts"""
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+        " error = ?, lease_expires = NULL, updated = ?"
+        " WHERE id = ? AND worker = ? AND status = ?",
+        (FAILED, PENDING, str(error), now, job_id, worker, LEASED)
+    )
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a job's lease alive while the worker computes"""
+
+    def __init__(self, db_path, job_id, worker, lease_seconds, interval):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        conn = connect(self.db_path)
+        try:
+            while not self.stopped.wait(self.interval):
+                if not heartbeat(conn, self.job_id, self.worker, self.lease_seconds):
+                    print(f"Lost lease on job {self.job_id}")
+                    self.lost = True
+                    return
+        finally:
+            conn.close()
+
+
+def run_job(job, **pipeline_kwargs):
+    """Run one host job; returns per-candidate result dicts"""
+    planets = pd.DataFrame(json.loads(job["planets"]))
+    settings = json.loads(job["settings"])
+    results = run_fpp_for_host(planets, **settings, **pipeline_kwargs)
+    if all(fpp is None for fpp, _, _ in results):
+        raise RuntimeError(f"FPP analysis failed for {job['hostname']}")
+    return [
+        {"pl_name": planet.get("pl_name"), "hostname": planet["hostname"],
+         "pl_orbper": planet["pl_orbper"], "FPP": fpp, "NFPP": nfpp, "precision": precision}
+        for planet, (fpp, nfpp, precision) in zip(planets.to_dict(orient="records"), results)
+    ]
+
+
+def worker_paths(data_dir, worker):
+    """
+    Cache paths for one worker. The light curve archive and the FPP result
+    cache are shared under data_dir (both are written atomically); TRILEGAL
+    files, lightkurve downloads and star tables go to the worker's own scratch
+    directory data_dir/workers/<worker>, so workers never touch each other's
+    in-flight inputs.
+    """
+    scratch = os.path.join(data_dir, "workers", worker)
+    return dict(
+        k2_lc_cache_dir=os.path.join(scratch, "k2_lk"),
+        trilegal_cache_dir=os.path.join(scratch, "trilegal"),
+        star_cache_dir=os.path.join(scratch, "star_tables"),
+        lc_archive_dir=os.path.join(data_dir, "lc_archive"),
+        result_cache_dir=os.path.join(data_dir, "fpp_results"),
+    )
+
+
+def run_worker(db_path, worker=None, data_dir=None, lease_seconds=600, heartbeat_interval=60,
+               poll_interval=10, max_jobs=None, exit_when_empty=True, **pipeline_kwargs):
+    """
+    Pull and run jobs until the queue is empty (or forever with
+    exit_when_empty=False). With data_dir, cache paths come from worker_paths
+    and the worker's scratch directory is removed when it stops.
+    pipeline_kwargs are passed to run_fpp_for_host (max_workers, or explicit
+    k2_lc_cache_dir, trilegal_cache_dir, lc_archive_dir, star_cache_dir,
+    result_cache_dir).
+    Returns the number of jobs completed.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    if data_dir:
+        pipeline_kwargs = {**worker_paths(data_dir, worker), **pipeline_kwargs}
+    conn = connect(db_path)
+    completed = 0
+    try:
+        while max_jobs is None or completed < max_jobs:
+            job = claim_job(conn, worker, lease_seconds)
+            if job is None:
+                if exit_when_empty:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print(f"[{worker}] {job['hostname']} (job {job['id']}, attempt {job['attempts']})")
+            start = time.perf_counter()
+            beat = _Heartbeat(db_path, job["id"], worker, lease_seconds, heartbeat_interval)
+            beat.start()
+            try:
+                results = run_job(job, **pipeline_kwargs)
+            except Exception as e:
+                print(f"[{worker}] job {job['id']} failed: {e}")
+                fail_job(conn, job["id"], worker, e)
+                continue
+            finally:
+                beat.stopped.set()
+                beat.join()
+
+            if complete_job(conn, job["id"], worker, results):
+                completed += 1
+                print(f"[{worker}] finished {job['hostname']} in {time.perf_counter() - start:.1f}s")
+            else:
+                print(f"[{worker}] lease on job {job['id']} was taken over; result discarded")
+    finally:
+        conn.close()
+        if data_dir:
+            shutil.rmtree(os.path.join(data_dir, "workers", worker), ignore_errors=True)
+    return completed
+
+
+def queue_status(db_path):
+    """Job counts by status"""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    counts = {status: 0 for status in (PENDING, LEASED, DONE, FAILED)}
+    counts.update({row["status"]: row["n"] for row in rows})
+    return counts
+
+
+def collect_results(db_path):
+    """DataFrame with one row per candidate of every finished job"""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT results FROM jobs WHERE status = ? ORDER BY created", (DONE,)).fetchall()
+    finally:
+        conn.close()
+    records = [record for row in rows for record in json.loads(row["results"])]
+    return pd.DataFrame(records, columns=["pl_name", "hostname", "pl_orbper", "FPP", "NFPP", "precision"])
+
+
+def retry_failed(db_path):
+    """Requeue failed jobs with a fresh attempt budget; returns the count"""
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, attempts = 0, worker = NULL, updated = ? WHERE status = ?",
+            (PENDING, time.time(), FAILED)
+        )
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed TRICERATOPS FPP queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="add candidates to the queue")
+    enqueue.add_argument("--db", required=True)
+    enqueue.add_argument("--csv", default="exoplanets_to_confirm.csv")
+    enqueue.add_argument("--search-radius", type=int, default=10)
+    enqueue.add_argument("--adaptive", action="store_true")
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+    enqueue.add_argument("--all-rows", action="store_true", help="include rows with default_flag != 1")
+
+    worker = sub.add_parser("worker", help="run jobs from the queue")
+    worker.add_argument("--db", required=True)
+    worker.add_argument("--data-dir", default="data",
+                        help="cache root: shared archive and results, per-worker scratch under workers/")
+    worker.add_argument("--lease", type=float, default=600)
+    worker.add_argument("--heartbeat", type=float, default=60)
+    worker.add_argument("--max-jobs", type=int)
+    worker.add_argument("--max-workers", type=int, help="processes per host job")
+    worker.add_argument("--wait", action="store_true", help="keep polling when the queue is empty")
+
+    status = sub.add_parser("status", help="job counts by status")
+    status.add_argument("--db", required=True)
+
+    collect = sub.add_parser("collect", help="write finished results to CSV")
+    collect.add_argument("--db", required=True)
+    collect.add_argument("--out", default="fpp_results.csv")
+
+    retry = sub.add_parser("retry", help="requeue failed jobs")
+    retry.add_argument("--db", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        df = pd.read_csv(args.csv)
+        if not args.all_rows and "default_flag" in df.columns:
+            df = df[df["default_flag"] == 1]
+        added = enqueue_planets(args.db, df, max_attempts=args.max_attempts,
+                                search_radius=args.search_radius, adaptive=args.adaptive)
+        print(f"Enqueued {added} host jobs")
+    elif args.command == "worker":
+        done = run_worker(
+            args.db,
+            data_dir=args.data_dir,
+            lease_seconds=args.lease,
+            heartbeat_interval=args.heartbeat,
+            max_jobs=args.max_jobs,
+            exit_when_empty=not args.wait,
+            max_workers=args.max_workers
+        )
+        print(f"Worker finished {done} jobs")
+    elif args.command == "status":
+        print(queue_status(args.db))
+    elif args.command == "collect":
+        results = collect_results(args.db)
+        results.to_csv(args.out, index=False)
+        print(f"Wrote {len(results)} results to {args.out}")
+    elif args.command == "retry":
+        print(f"Requeued {retry_failed(args.db)} jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Star table normalization and caching for TRICERATOPS
+normalize_star_table adds every column calc_probs needs in one vectorized pass;
+normalized tables are cached per EPIC as typed columnar .npz files so later runs
+skip both the MAST star query and the patching
+"""
+import hashlib
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "api"))
+from tracing import log
+
+STAR_TABLE_VERSION = 1
+
+# Columns calc_probs (and the internal TRILEGAL CSV reader) expect on target.stars
+STAR_TABLE_COLUMNS = [
+    "mass", "rad", "Teff", "logg", "plx", "Tmag", "fluxratio",
+    "Mact", "J", "H", "Ks", "TESS", "logTe",
+]
+
+# Planet row fields the normalized table depends on
+PLANET_FIELDS = ["st_mass", "st_rad", "st_teff", "st_logg", "sy_dist", "sy_vmag", "sy_kmag", "st_met"]
+
+G_SUN_LOG10 = 4.437  # log10(g_sun) in cgs, g_sun ~ 27400 cm/s²
+
+
+def _planet_value(planet_row, key):
+    value = planet_row.get(key, np.nan) if hasattr(planet_row, "get") else np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def normalize_star_table(stars, planet_row):
+    """
+    Return a copy of stars with mass, rad, Teff, logg, plx, Tmag, fluxratio,
+    Mact, J, H, Ks, TESS, logTe and [M/H] filled in. Existing columns are kept;
+    missing ones come from the planet row (host star values) or are derived
+    column-wise. planet_row is a pandas Series from the CSV row for this planet.
+    """
+    stars = stars.copy()
+    has = stars.columns.__contains__
+    new = {}
+
+    # Host star parameters from the planet row
+    for column, field in (("mass", "st_mass"), ("rad", "st_rad"), ("Teff", "st_teff")):
+        if not has(column) and field in planet_row:
+            new[column] = _planet_value(planet_row, field)
+
+    def column(name):
+        if name in new:
+            return np.broadcast_to(np.asarray(new[name], dtype=float), len(stars))
+        return stars[name].to_numpy(dtype=float)
+
+    if not has("logg"):
+        st_logg = _planet_value(planet_row, "st_logg")
+        if not np.isnan(st_logg):
+            new["logg"] = st_logg
+        elif (has("mass") or "mass" in new) and (has("rad") or "rad" in new):
+            # log10(g) = log10(g_sun) + log10(M) - 2 log10(R), solar units
+            with np.errstate(divide="ignore", invalid="ignore"):
+                new["logg"] = G_SUN_LOG10 + np.log10(column("mass")) - 2 * np.log10(column("rad"))
+        else:
+            log("Warning: cannot compute logg (missing mass or rad).")
+
+    # Parallax in mas
+    if not has("plx") and "sy_dist" in planet_row:
+        dist = _planet_value(planet_row, "sy_dist")
+        if dist > 0:
+            new["plx"] = 1000.0 / dist
+
+    if not has("Tmag"):
+        vmag = _planet_value(planet_row, "sy_vmag")
+        kmag = _planet_value(planet_row, "sy_kmag")
+        if not np.isnan(vmag):
+            new["Tmag"] = vmag
+        elif not np.isnan(kmag):
+            new["Tmag"] = kmag + 1.5
+            log("Note: Tmag estimated from Kmag + 1.5")
+
+    has_tmag = has("Tmag") or "Tmag" in new
+    if not has("fluxratio"):
+        if has_tmag and len(stars):
+            tmag = column("Tmag")
+            new["fluxratio"] = 10 ** (-0.4 * (tmag - tmag[0]))
+        else:
+            log("Warning: cannot compute fluxratio (missing Tmag).")
+
+    # Aliases expected by the TRILEGAL CSV reader
+    for alias, source in (("Mact", "mass"), ("J", "Jmag"), ("H", "Hmag"), ("Ks", "Kmag"), ("TESS", "Tmag")):
+        if not has(alias) and (has(source) or source in new):
+            new[alias] = column(source)
+
+    if not has("logTe") and (has("Teff") or "Teff" in new):
+        teff = column("Teff")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new["logTe"] = np.where(teff > 0, np.log10(np.where(teff > 0, teff, 1.0)), np.nan)
+
+    if not has("[M/H]") and "st_met" in planet_row:
+        new["[M/H]"] = _planet_value(planet_row, "st_met")
+
+    if new:
+        stars = stars.assign(**new)
+    return stars
+
+
+def star_table_key(ID, search_radius, planet_row, source):
+    """
+    Cache key for a normalized table: EPIC, data source name ("mast", "local"),
+    search radius and the host star inputs
+    """
+    inputs = {field: _planet_value(planet_row, field) if field in planet_row else None
+              for field in PLANET_FIELDS}
+    digest = hashlib.sha1(
+        json.dumps([STAR_TABLE_VERSION, inputs], sort_keys=True, default=str).encode()
+    ).hexdigest()[:12]
+    return f"EPIC{int(ID)}_{source}_r{search_radius}_{digest}"
+
+
+def save_star_table(cache_dir, key, stars):
+    """
+    Store a star table as typed columns in a single .npz file.
+    Numeric columns keep their dtype; other columns are stored as unicode
+    arrays with a null mask.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {"__columns__": np.array(stars.columns.astype(str).tolist())}
+    for i, name in enumerate(stars.columns):
+        values = stars[name]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[f"c{i}"] = values.to_numpy()
+        else:
+            arrays[f"c{i}"] = values.astype(str).to_numpy(dtype=str)
+            arrays[f"n{i}"] = values.isna().to_numpy()
+
+    path = os.path.join(cache_dir, f"{key}.npz")
+    tmp = f"{path}.tmp-{uuid.uuid4().hex}.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+def load_star_table(cache_dir, key):
+    """Load a cached star table, or None if it is not cached"""
+    path = os.path.join(cache_dir, f"{key}.npz")
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        columns = data["__columns__"].tolist()
+        table = {}
+        for i, name in enumerate(columns):
+            values = data[f"c{i}"]
+            if f"n{i}" in data.files:
+                values = pd.Series(values, dtype=object).where(~data[f"n{i}"], None)
+            table[name] = values
+    return pd.DataFrame(table, columns=columns)
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("triceratops.triceratops")
+
+import fpp_queue
+
+
+def fake_run_fpp_for_host(planets, k2_lc_cache_dir, trilegal_cache_dir, star_cache_dir,
+                          lc_archive_dir, result_cache_dir, **settings):
+    """Writes this host's inputs to the scratch dirs and checks nobody else touches them"""
+    os.makedirs(trilegal_cache_dir, exist_ok=True)
+    hostname = planets.iloc[0]["hostname"]
+    own = Path(trilegal_cache_dir) / f"{hostname}.csv"
+    own.write_text("Mact,logg\n1,4\n")
+    time.sleep(0.2)
+    intact = own.exists() and sorted(p.name for p in Path(trilegal_cache_dir).iterdir()) == [own.name]
+    own.unlink()
+    info = {"pid": os.getpid(), "trilegal": trilegal_cache_dir, "k2_lk": k2_lc_cache_dir,
+            "star_tables": star_cache_dir, "archive": lc_archive_dir, "results": result_cache_dir,
+            "intact": intact}
+    return [(0.2, 0.01, info)] * len(planets)
+
+
+def test_two_workers_share_one_queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(fpp_queue, "run_fpp_for_host", fake_run_fpp_for_host)
+    db = str(tmp_path / "queue.db")
+    data_dir = str(tmp_path / "data")
+    planets = pd.DataFrame({
+        "pl_name": [f"EPIC {i}.01" for i in range(8)],
+        "hostname": [f"EPIC {i}" for i in range(8)],
+        "pl_orbper": [1.0 + i for i in range(8)],
+    })
+    assert fpp_queue.enqueue_planets(db, planets) == 8
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=fpp_queue.run_worker, args=(db,),
+                               kwargs={"worker": f"w{i}", "data_dir": data_dir, "poll_interval": 0.1})
+               for i in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    assert fpp_queue.queue_status(db) == {"pending": 0, "leased": 0, "done": 8, "failed": 0}
+    results = fpp_queue.collect_results(db)
+    assert sorted(results["hostname"]) == sorted(planets["hostname"])
+    info = pd.DataFrame(list(results["precision"]))
+    assert info["intact"].all()
+    # Both workers ran jobs, each in its own scratch space, sharing archive and results
+    assert info["pid"].nunique() == 2
+    for column in ("trilegal", "k2_lk", "star_tables"):
+        assert info.groupby("pid")[column].nunique().eq(1).all()
+        assert info[column].nunique() == 2
+    assert info["archive"].unique().tolist() == [os.path.join(data_dir, "lc_archive")]
+    assert info["results"].unique().tolist() == [os.path.join(data_dir, "fpp_results")]
+    # Scratch directories are removed when the workers stop
+    assert not os.listdir(os.path.join(data_dir, "workers"))
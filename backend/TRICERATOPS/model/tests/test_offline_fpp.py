@@ -0,0 +1,142 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+tr = pytest.importorskip("triceratops.triceratops")
+Table = pytest.importorskip("astropy.table").Table
+
+from data_sources import DEFAULT_FIXTURE_DIR, LocalFixtureDataSource, target_from_star_table
+import triceratops_model
+import tracing
+from lightcurve_archive import RAW_VARIANT, list_archived, load_lightcurve, processing_variant
+
+ID = 201111557
+FIXTURE = Path(DEFAULT_FIXTURE_DIR) / f"EPIC{ID}"
+TIC_COLUMNS = ["ID", "Tmag", "Jmag", "Hmag", "Kmag", "ra", "dec", "mass", "rad", "Teff", "plx",
+               "disposition", "duplicate_id"]
+
+
+@pytest.fixture
+def planet():
+    df = pd.read_csv(Path(__file__).parent.parent / "exoplanets_to_confirm.csv")
+    return df[df["pl_name"] == f"EPIC {ID}.01"].iloc[0]
+
+
+@pytest.fixture
+def recorded_stars():
+    return pd.read_csv(FIXTURE / "stars.csv")
+
+
+class RecordedCatalogs:
+    """Answers tr.target's TIC queries with the recorded catalog rows"""
+
+    def __init__(self, stars):
+        self.table = Table.from_pandas(stars[TIC_COLUMNS])
+
+    def query_region(self, coord, radius, catalog):
+        return self.table
+
+    def query_object(self, name, radius, catalog):
+        return self.table
+
+
+class NoPixelFiles:
+    @staticmethod
+    def search_targetpixelfile(*args, **kwargs):
+        raise ConnectionError("offline")
+
+
+def test_star_table_target_matches_constructor(monkeypatch, planet, recorded_stars):
+    monkeypatch.setattr(tr, "Catalogs", RecordedCatalogs(recorded_stars))
+    monkeypatch.setattr(tr, "lightkurve", NoPixelFiles)
+    sectors = np.array([0])
+    trilegal = str(FIXTURE / "trilegal.csv")
+
+    real = tr.target(ID=ID, sectors=sectors, search_radius=10, mission="K2",
+                     trilegal_fname=trilegal, ra=float(planet["ra"]), dec=float(planet["dec"]))
+    built = target_from_star_table(ID, recorded_stars, sectors, 10, "K2", trilegal)
+    local = LocalFixtureDataSource().build_target(ID, planet["ra"], planet["dec"], sectors, 10, "K2",
+                                                 None, "unused.csv")
+
+    for target in (built, local):
+        assert set(vars(target)) == set(vars(real))
+        for name, value in vars(real).items():
+            if name == "stars":
+                # The recording holds what the constructor derives (sep, PA) as well
+                pd.testing.assert_frame_equal(target.stars, value, check_dtype=False)
+            elif name == "sectors":
+                np.testing.assert_array_equal(target.sectors, value)
+            else:
+                assert getattr(target, name) == value, name
+
+
+def test_offline_pipeline(monkeypatch, tmp_path, planet):
+    # No live source may be touched: the constructor and MAST both fail
+    def offline(*args, **kwargs):
+        raise AssertionError("network access in an offline run")
+
+    monkeypatch.setattr(tr.target, "__init__", offline)
+    monkeypatch.setattr(tr, "Catalogs", None)
+    # Fewer Monte Carlo draws and supersamples keep the run short; every stage stays real
+    calc_probs = tr.target.calc_probs
+    monkeypatch.setattr(tr.target, "calc_probs",
+                        lambda self, N, **kwargs: calc_probs(self, N=500, **dict(kwargs, nsamples=20)))
+
+    events = []
+    caches = {name: tmp_path / name for name in ("lc", "trilegal", "archive", "stars", "results")}
+
+    def run():
+        return triceratops_model.run_fpp_for_planet(
+            planet, None, caches["lc"], caches["trilegal"],
+            lc_archive_dir=caches["archive"],
+            data_source=LocalFixtureDataSource(),
+            star_cache_dir=caches["stars"],
+            result_cache_dir=caches["results"],
+            return_precision=True,
+            progress=lambda stage, **info: events.append((stage, info)),
+        )
+
+    fpp, nfpp, precision = run()
+    assert 0 <= fpp <= 1 and 0 <= nfpp <= 1
+    assert not precision["cached"]
+    assert {"star_table", "lightcurve", "detrend", "calc_probs", "candidate"} <= {stage for stage, _ in events}
+    # Target scenarios plus NTP/NEB for each of the two neighbours
+    scenarios = [info["scenario"] for stage, info in events if stage == "calc_probs"]
+    assert scenarios == list(range(1, 15))
+
+    assert run() == (fpp, nfpp, dict(precision, cached=True))
+
+    # Fixture curves are archived apart from the MAST variants charts and live runs read
+    assert list_archived(caches["archive"]) == [ID]
+    for variant in (RAW_VARIANT, processing_variant()):
+        assert load_lightcurve(caches["archive"], ID, variant) is None
+        assert load_lightcurve(caches["archive"], ID, f"local-{variant}") is not None
+
+
+def test_prepare_host_keeps_shared_caches(tmp_path, planet):
+    lc_dir, trilegal_dir = tmp_path / "lc", tmp_path / "trilegal"
+    lc_dir.mkdir()
+    trilegal_dir.mkdir()
+    # Files of runs still in flight, and an interrupted write for this EPIC
+    (lc_dir / "other_download.fits").write_text("x")
+    (trilegal_dir / "trilegal_EPIC1.csv").write_text("Mact,logg\n1,4\n")
+    (trilegal_dir / f"trilegal_EPIC{ID}.csv").write_text("")
+
+    outcomes = []
+    for _ in range(2):
+        trace, token = tracing.begin("test")
+        host = triceratops_model.prepare_host(planet, str(lc_dir), str(trilegal_dir),
+                                              data_source=LocalFixtureDataSource())
+        tracing.end(trace, token, threshold_ms=float("inf"))
+        assert host is not None
+        outcomes.append(dict(trace.caches["trilegal"]))
+
+    assert outcomes == [{"miss": 1}, {"hit": 1}]
+    assert (lc_dir / "other_download.fits").exists()
+    assert (trilegal_dir / "trilegal_EPIC1.csv").exists()
+    assert (trilegal_dir / f"trilegal_EPIC{ID}.csv").stat().st_size > 0
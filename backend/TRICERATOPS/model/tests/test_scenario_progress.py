@@ -0,0 +1,47 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+tr = pytest.importorskip("triceratops.triceratops")
+
+from triceratops_model import SCENARIO_CALLS, scenario_progress
+
+
+def fake_likelihood(name):
+    def func(*args, **kwargs):
+        print(f"Calculating {name} scenario")
+    func.__name__ = name
+    return func
+
+
+def test_scenario_events_stay_with_their_thread(monkeypatch):
+    for name in SCENARIO_CALLS:
+        monkeypatch.setattr(tr, name, fake_likelihood(name))
+    barrier = threading.Barrier(3)
+    events = {"a": [], "b": []}
+
+    def job(key):
+        with scenario_progress(lambda stage, **info: events[key].append((info["scenario"], info["detail"])),
+                               len(SCENARIO_CALLS), job=key):
+            barrier.wait()
+            for name in SCENARIO_CALLS:
+                getattr(tr, name)()
+            barrier.wait()
+
+    threads = [threading.Thread(target=job, args=(key,)) for key in events]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    # Calls and prints outside a registered thread are not attributed to any job
+    tr.lnZ_TTP()
+    print("Calculating something else")
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    expected = [(i + 1, name[len("lnZ_"):]) for i, name in enumerate(SCENARIO_CALLS)]
+    assert events == {"a": expected, "b": expected}
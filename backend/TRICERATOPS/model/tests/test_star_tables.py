@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from star_tables import STAR_TABLE_COLUMNS, load_star_table, normalize_star_table, save_star_table, star_table_key
+
+PLANET = pd.Series({"st_mass": 0.73, "st_rad": 0.76, "st_teff": 4616.5, "st_logg": 4.54,
+                    "sy_dist": 97.2, "sy_vmag": 11.7, "sy_kmag": 9.2, "st_met": -0.03})
+
+
+def test_key_depends_on_data_source():
+    mast = star_table_key(201111557, 10, PLANET, "mast")
+    local = star_table_key(201111557, 10, PLANET, "local")
+    assert mast != local
+    assert mast == star_table_key(201111557, 10, PLANET.copy(), "mast")
+
+
+def test_normalized_table_round_trips(tmp_path):
+    stars = pd.DataFrame({"ID": [1, 2], "Tmag": [11.1, 13.6], "Jmag": [9.9, 12.0],
+                          "Hmag": [9.4, 11.5], "Kmag": [9.2, 11.4], "disposition": [None, "ARTIFACT"]})
+    table = normalize_star_table(stars, PLANET)
+    assert set(STAR_TABLE_COLUMNS) <= set(table.columns)
+    np.testing.assert_allclose(table["fluxratio"], [1.0, 10 ** (-0.4 * 2.5)])
+
+    key = star_table_key(1, 10, PLANET, "local")
+    save_star_table(tmp_path, key, table)
+    loaded = load_star_table(tmp_path, key)
+    pd.testing.assert_frame_equal(loaded, table, check_dtype=False)
+    assert load_star_table(tmp_path, star_table_key(1, 10, PLANET, "mast")) is None
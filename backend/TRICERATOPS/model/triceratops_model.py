@@ -1,9 +1,28 @@
 import os
+import sys
 import numpy as np
 import pandas as pd
-import triceratops.triceratops as tr
-import lightkurve as lk
 import shutil
+import copy
+import functools
+import time
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import triceratops.triceratops as tr
+
+from data_sources import get_data_source, target_from_star_table
+from fpp_cache import fpp_result_key, load_fpp_result, save_fpp_result
+from star_tables import load_star_table, normalize_star_table, save_star_table, star_table_key
+
+# Shared light curve processing lives with the API
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "api"))
+from lightcurve_tools import flatten_lightcurve
+from lightcurve_archive import RAW_VARIANT, load_lightcurve, processing_variant, save_lightcurve, source_variant
+from tracing import cache_outcome, log, span
 
 def clean_cache_folders(trilegal_cache_dir, k2_lc_cache_dir):
     """
@@ -19,224 +38,539 @@ def clean_cache_folders(trilegal_cache_dir, k2_lc_cache_dir):
                     elif os.path.isdir(file_path):
                         shutil.rmtree(file_path)
                 except Exception as e:
-                    print(f"Failed to delete {file_path}: {e}")
+                    log(f"Failed to delete {file_path}: {e}")
+
+def report(progress, stage, **info):
+    """Send a progress event (stage name plus details) to an optional callback"""
+    if progress is not None:
+        progress(stage, **info)
+
+# Per-scenario marginal likelihoods calc_probs calls (module globals of triceratops.triceratops)
+SCENARIO_CALLS = ("lnZ_TTP", "lnZ_TEB", "lnZ_PTP", "lnZ_PEB", "lnZ_STP", "lnZ_SEB",
+                  "lnZ_DTP", "lnZ_DEB", "lnZ_BTP", "lnZ_BEB")
+
+_scenario_watch = threading.local()
+_wrap_lock = threading.Lock()
+
+def _reporting_call(func):
+    """Wrap a scenario likelihood so it reports to the calling thread's watch, if any"""
+    scenario_name = func.__name__[len("lnZ_"):]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        watch = getattr(_scenario_watch, "watch", None)
+        if watch is not None:
+            watch["count"] += 1
+            n = watch["n_scenarios"]
+            report(watch["progress"], "calc_probs",
+                   scenario=(watch["count"] - 1) % n + 1, n_scenarios=n,
+                   batch=(watch["count"] - 1) // n + 1, detail=scenario_name, **watch["info"])
+        return func(*args, **kwargs)
+
+    wrapper.reports_progress = True
+    return wrapper
+
+@contextmanager
+def scenario_progress(progress, n_scenarios, **info):
+    """
+    Report calc_probs scenario i of n_scenarios (and the Monte Carlo batch
+    for adaptive runs) to progress while the block runs in this thread.
+    Events come from wrappers around the scenario likelihoods, which only
+    report to the thread that registered the callback.
+    """
+    if progress is None:
+        yield
+        return
+    with _wrap_lock:
+        for name in SCENARIO_CALLS:
+            func = getattr(tr, name)
+            if not getattr(func, "reports_progress", False):
+                setattr(tr, name, _reporting_call(func))
+    _scenario_watch.watch = {"progress": progress, "n_scenarios": max(int(n_scenarios), 1), "count": 0,
+                             "info": info}
+    try:
+        yield
+    finally:
+        _scenario_watch.watch = None
+
+def n_scenarios(stars):
+    """Scenario likelihoods calc_probs evaluates: 10 for the target, 2 (NTP, NEB) per other star with tdepth > 0"""
+    return 10 + 2 * max(int((stars["tdepth"] > 0).sum()) - 1, 0)
 
 def patch_star_table(target, planet_row):
     """
     Ensure that target.stars has all columns needed for calc_probs:
-    mass, rad, Teff, logg, plx, Tmag, fluxratio.
+    mass, rad, Teff, logg, plx, Tmag, fluxratio, Mact, J/H/Ks, TESS, logTe.
     planet_row is a pandas Series from your CSV row for this planet.
     """
-    stars = target.stars
-    # Use in‑place additions
-    # 1. mass
-    if "mass" not in stars.columns and "st_mass" in planet_row:
-        stars["mass"] = planet_row["st_mass"]
-    # 2. radius
-    if "rad" not in stars.columns and "st_rad" in planet_row:
-        stars["rad"] = planet_row["st_rad"]
-    # 3. Teff
-    if "Teff" not in stars.columns and "st_teff" in planet_row:
-        stars["Teff"] = planet_row["st_teff"]
-    # 4. logg
-    if "logg" not in stars.columns:
-        if "st_logg" in planet_row and not pd.isna(planet_row["st_logg"]):
-            stars["logg"] = planet_row["st_logg"]
-        elif ("mass" in stars.columns) and ("rad" in stars.columns):
-            # Compute logg: log10(g) in cgs; g = G M / R^2
-            # Use solar constants: log10(g_sun) ~ 4.437 (g_sun ~ 27400 cm/s²)
-            G_SUN_LOG10 = 4.437
-            stars["logg"] = G_SUN_LOG10 + np.log10(stars["mass"]) - 2 * np.log10(stars["rad"])
-        else:
-            print("Warning: cannot compute logg (missing mass or rad).")
-    # 5. plx (parallax, in mas)
-    if "plx" not in stars.columns and "sy_dist" in planet_row:
-        dist = planet_row["sy_dist"]
-        if dist > 0:
-            stars["plx"] = 1000.0 / dist
-    # 6. Tmag
-    if "Tmag" not in stars.columns:
-        # Prefer sy_vmag
-        vmag = planet_row.get("sy_vmag", np.nan)
-        if not pd.isna(vmag):
-            stars["Tmag"] = vmag
-        else:
-            # fallback: sy_kmag (approx shift)
-            kmag = planet_row.get("sy_kmag", np.nan)
-            if not pd.isna(kmag):
-                stars["Tmag"] = kmag + 1.5
-                print("Note: Tmag estimated from Kmag + 1.5")
-    # 7. fluxratio
-    if "fluxratio" not in stars.columns:
-        if "Tmag" in stars.columns:
-            T0 = stars.iloc[0]["Tmag"]
-            # Compute ratio: 10^(-0.4 * (T_i - T0))
-            stars["fluxratio"] = stars["Tmag"].apply(lambda T: 10 ** (-0.4 * (T - T0)))
-        else:
-            print("Warning: cannot compute fluxratio (missing Tmag).")
+    target.stars = normalize_star_table(target.stars, planet_row)
+
+def get_processed_lightcurve(hostname, ID, lc_archive_dir=None, detrend_method="savgol", window_length=401,
+                             data_source=None, progress=None):
+    """
+    Return the detrended, outlier-clipped K2 light curve as (time, flux) arrays.
+    With lc_archive_dir set, arrays are read memory-mapped from the local archive
+    and only fetched from data_source/flattened (then archived) on a miss.
+    Returns (None, None) if no light curve is available.
+    """
+    data_source = data_source or get_data_source()
+    # Fixture runs archive under their own variant names, apart from MAST data
+    variant = source_variant(processing_variant(detrend_method, window_length, outlier_sigma=5),
+                             data_source.name)
+    if lc_archive_dir:
+        cached = load_lightcurve(lc_archive_dir, ID, variant)
+        cache_outcome("lc_archive", cached is not None)
+        if cached is not None:
+            log(f"Loading light curve from archive: EPIC {ID} ({variant})")
+            report(progress, "lightcurve", source="archive", n_points=len(cached["time"]))
+            return cached["time"], cached["flux"]
 
-    if "[M/H]" not in stars.columns and "st_met" in planet_row:
-        stars["[M/H]"]  = planet_row["st_met"]
+    report(progress, "lightcurve", source=data_source.name)
+    with span("download", source=data_source.name):
+        lc = data_source.get_lightcurve(hostname, ID)
+    if lc is None:
+        log(f"No light curve found for {hostname}")
+        return None, None
+    raw_time, raw_flux, raw_err = lc
 
-def run_fpp_for_planet(planet, csv_base_path, k2_lc_cache_dir, trilegal_cache_dir, search_radius = 10):
+    report(progress, "detrend", method=detrend_method, window_length=window_length, n_points=len(raw_time))
+    with span("detrend", method=detrend_method, n_points=len(raw_time)):
+        time_arr, flux_arr, err_arr = flatten_lightcurve(
+            raw_time,
+            raw_flux,
+            raw_err,
+            method=detrend_method,
+            window_length=window_length,
+            outlier_sigma=5
+        )
+
+    if lc_archive_dir:
+        try:
+            source = {"hostname": hostname, "mission": "K2", "source": data_source.name}
+            save_lightcurve(lc_archive_dir, ID, raw_time, raw_flux, raw_err,
+                            variant=source_variant(RAW_VARIANT, data_source.name), **source)
+            save_lightcurve(
+                lc_archive_dir, ID, time_arr, flux_arr, err_arr, variant=variant,
+                detrend_method=detrend_method, window_length=window_length, outlier_sigma=5, **source
+            )
+            log(f"Archived light curve for EPIC {ID}")
+        except Exception as e:
+            log("Warning: failed to archive light curve:", e)
+
+    return time_arr, flux_arr
+
+# NFPP below this marks a validated planet (same threshold as /api/triceratops)
+NFPP_THRESHOLD = 0.1
+
+# Estimator behind adaptive FPP/NFPP, stored with results so a rule change invalidates them
+ADAPTIVE_ESTIMATOR = "mean_of_batch_ratios/t0.95"
+
+def calc_probs_adaptive(target, threshold=NFPP_THRESHOLD, batch_N=1000, max_N=10000, min_batches=3,
+                        confidence=0.95, **calc_kwargs):
     """
-    Run triceratops FPP analysis for one planet (row from DataFrame).
-    Returns (FPP, NFPP) or (None, None) on error.
+    Run target.calc_probs in independent batches of batch_N Monte Carlo draws
+    until the two-sided Student-t confidence interval of the NFPP batch mean
+    (k - 1 degrees of freedom, so 3 batches need |mean - threshold| > 4.3
+    standard errors at 95%) lies on one side of threshold, or max_N draws are
+    spent. Clear planets and clear false positives stop after min_batches batches.
+    FPP/NFPP are the mean of the per-batch estimates (each a ratio of scenario
+    probabilities over batch_N draws), not a single pooled max_N-draw
+    calc_probs; precision["estimator"] says so.
+    Sets target.FPP/target.NFPP and returns the achieved precision: FPP_err,
+    NFPP_err (standard errors), N, batches, converged, estimator.
     """
-    # Clean cache folders before patching star table
-    clean_cache_folders(trilegal_cache_dir, k2_lc_cache_dir)
-    # Extract basic info
-    hostname = planet["hostname"]
-    if(hostname.split()[0]!="EPIC"):
-        return "Nan", "Nan"
+    from scipy.stats import t as student_t
+
+    fpps, nfpps = [], []
+    converged = False
+    while True:
+        target.calc_probs(N=batch_N, **calc_kwargs)
+        fpps.append(float(target.FPP))
+        nfpps.append(float(target.NFPP))
+
+        k = len(nfpps)
+        if k >= max(min_batches, 2):
+            nfpp_err = np.std(nfpps, ddof=1) / np.sqrt(k)
+            quantile = student_t.ppf(0.5 + confidence / 2, df=k - 1)
+            if abs(np.mean(nfpps) - threshold) > quantile * nfpp_err:
+                converged = True
+                break
+        if (k + 1) * batch_N > max_N:
+            break
 
+    k = len(nfpps)
+    target.FPP = float(np.mean(fpps))
+    target.NFPP = float(np.mean(nfpps))
+    precision = {
+        "FPP_err": float(np.std(fpps, ddof=1) / np.sqrt(k)) if k > 1 else None,
+        "NFPP_err": float(np.std(nfpps, ddof=1) / np.sqrt(k)) if k > 1 else None,
+        "N": k * batch_N,
+        "batches": k,
+        "converged": converged,
+        "estimator": ADAPTIVE_ESTIMATOR,
+    }
+    log(f"Adaptive calc_probs: {k} batches, N={k * batch_N}, "
+        f"NFPP={target.NFPP:.4f} +/- {precision['NFPP_err']}, converged={converged}")
+    return precision
+
+def _parse_epic(hostname):
+    """EPIC ID from a hostname like 'EPIC 201111557', "Nan" for non-EPIC hosts, None if unparsable"""
+    if hostname.split()[0] != "EPIC":
+        return "Nan"
     try:
-        ID = int(hostname.split()[-1])
+        return int(hostname.split()[-1])
     except ValueError:
-        print(f"Skipping target: cannot parse EPIC from hostname '{hostname}'")
-        return None, None
+        log(f"Skipping target: cannot parse EPIC from hostname '{hostname}'")
+        return None
+
+def _result_key(ID, period, search_radius, adaptive, detrend_method, window_length, data_source):
+    return fpp_result_key(
+        ID, period, search_radius,
+        N=10000, nsamples=1000, adaptive=ADAPTIVE_ESTIMATOR if adaptive else False,
+        detrend_method=detrend_method, window_length=window_length,
+        data_source=data_source.name
+    )
+
+_epic_locks = {}
+_epic_locks_guard = threading.Lock()
+
+def _epic_lock(ID):
+    """Lock for one EPIC's cached files, shared by every thread of this process"""
+    with _epic_locks_guard:
+        return _epic_locks.setdefault(ID, threading.Lock())
+
+def _usable_trilegal(fname):
+    """
+    True if a cached TRILEGAL file exists and has a readable header.
+    An empty or corrupt file (an interrupted run) is removed so it is rebuilt.
+    Call with the EPIC's lock held.
+    """
+    if not os.path.exists(fname):
+        return False
+    try:
+        if os.path.getsize(fname) > 0 and len(pd.read_csv(fname, nrows=1).columns) > 1:
+            return True
+    except (OSError, ValueError):
+        pass
+    log(f"Empty or corrupt TRILEGAL file found and removed: {fname}")
+    try:
+        os.remove(fname)
+    except FileNotFoundError:
+        pass
+    return False
+
+def prepare_host(planet, k2_lc_cache_dir, trilegal_cache_dir, search_radius=10,
+                 detrend_method="savgol", window_length=401, lc_archive_dir=None, data_source=None,
+                 star_cache_dir=None, progress=None):
+    """
+    Build the state shared by every candidate around one host star: the
+    triceratops target with its normalized star table and transit depth, and
+    the processed light curve. planet is any CSV row for that host.
+    progress receives stage events (see report).
+    Returns a dict (target, time, flux, flux_err) or None on error.
+    """
+    data_source = data_source or get_data_source()
+    hostname = planet["hostname"]
+    ID = _parse_epic(hostname)
+    if not isinstance(ID, int):
+        return None
 
     ra = float(planet["ra"])
     dec = float(planet["dec"])
     sectors = np.array([0])  # K2 campaign dummy
     mission = "K2"
-    search_radius = search_radius
 
     # Prepare TRILEGAL cache filename
     os.makedirs(trilegal_cache_dir, exist_ok=True)
     trilegal_fname = os.path.join(trilegal_cache_dir, f"trilegal_EPIC{ID}.csv")
 
-    # Remove zero-byte stale file
-    if os.path.exists(trilegal_fname) and os.path.getsize(trilegal_fname) == 0:
-        print(f"Empty TRILEGAL file found and removed: {trilegal_fname}")
-        os.remove(trilegal_fname)
-
     # Instantiate target, letting triceratops simulate TRILEGAL if needed
-    if os.path.exists(trilegal_fname):
-        print(f"Loading TRILEGAL from cache: {trilegal_fname}")
-        target = tr.target(
-            ID=ID,
-            sectors=sectors,
-            search_radius=search_radius,
-            mission=mission,
-            lightkurve_cache_dir=k2_lc_cache_dir,
-            trilegal_fname=trilegal_fname,
-            ra=ra,
-            dec=dec
-        )
+    with _epic_lock(ID):
+        has_trilegal_cache = _usable_trilegal(trilegal_fname)
+    cache_outcome("trilegal", has_trilegal_cache)
+    if has_trilegal_cache:
+        log(f"Loading TRILEGAL from cache: {trilegal_fname}")
     else:
-        print("No TRILEGAL cache — generating new.")
-        target = tr.target(
-            ID=ID,
-            sectors=sectors,
-            search_radius=search_radius,
-            mission=mission,
-            lightkurve_cache_dir=k2_lc_cache_dir,
-            trilegal_fname=trilegal_fname,
-            ra=ra,
-            dec=dec
-        )
-
-        # Patch before saving
-        patch_star_table(target, planet)
-
-        if "Mact" not in target.stars.columns and "mass" in target.stars.columns:
-            target.stars["Mact"] = target.stars["mass"]
-        
-        if "J" not in target.stars.columns and "Jmag" in target.stars.columns:
-            target.stars["J"] = target.stars["Jmag"]
-        
-        if "H" not in target.stars.columns and "Hmag" in target.stars.columns:
-            target.stars["H"] = target.stars["Hmag"]
-        
-        if "Ks" not in target.stars.columns and "Kmag" in target.stars.columns:
-            target.stars["Ks"] = target.stars["Kmag"]
-
-        if "TESS" not in target.stars.columns and "Tmag" in target.stars.columns:
-            target.stars["TESS"] = target.stars["Tmag"]
-
-        if "logTe" not in target.stars.columns and "Teff" in target.stars.columns:
-            target.stars["logTe"] = target.stars["Teff"].apply(
-                lambda T: np.log10(T) if T > 0 else np.nan
+        log("No TRILEGAL cache — generating new.")
+    star_key = star_table_key(ID, search_radius, planet, data_source.name)
+    cached_stars = load_star_table(star_cache_dir, star_key) if star_cache_dir else None
+    if star_cache_dir:
+        cache_outcome("star_table", cached_stars is not None)
+    report(progress, "star_table", hostname=hostname, cached=cached_stars is not None)
+    with span("star_table", cached=cached_stars is not None):
+        if cached_stars is not None:
+            log(f"Loading normalized star table from cache: {star_key}")
+            target = target_from_star_table(ID, cached_stars, sectors, search_radius, mission, trilegal_fname)
+        else:
+            target = data_source.build_target(
+                ID=ID,
+                ra=ra,
+                dec=dec,
+                sectors=sectors,
+                search_radius=search_radius,
+                mission=mission,
+                lightkurve_cache_dir=k2_lc_cache_dir,
+                trilegal_fname=trilegal_fname
             )
+            # Add every column calc_probs needs in one pass
+            patch_star_table(target, planet)
+            if star_cache_dir:
+                try:
+                    save_star_table(star_cache_dir, star_key, target.stars)
+                except Exception as e:
+                    log("Warning: failed to cache star table:", e)
 
-
+    if not has_trilegal_cache:
         try:
-            target.stars.to_csv(trilegal_fname, index=False)
-            print(f"Saved TRILEGAL output to {trilegal_fname}")
+            # Written aside and renamed, so a concurrent run never reads a partial file
+            tmp = f"{trilegal_fname}.tmp-{uuid.uuid4().hex}"
+            target.stars.to_csv(tmp, index=False)
+            with _epic_lock(ID):
+                os.replace(tmp, trilegal_fname)
+            log(f"Saved TRILEGAL output to {trilegal_fname}")
         except Exception as e:
-            print("Warning: failed to save TRILEGAL output:", e)
+            log("Warning: failed to save TRILEGAL output:", e)
 
 
     # Diagnostics
-    print("Star table columns:", target.stars.columns.tolist())
-    print("Number of stars:", len(target.stars))
+    log("Star table columns:", target.stars.columns.tolist())
+    log("Number of stars:", len(target.stars))
 
-    # Download K2 light curve
-    search_result = lk.search_lightcurve(hostname, mission="K2")
-    if len(search_result) == 0:
-        print(f"No light curve found for {hostname}")
-        return None, None
-    lc = search_result.download()
-    lc = lc.flatten(window_length=401).remove_outliers(sigma=5)
+    # K2 light curve (archived or downloaded)
+    with span("lightcurve"):
+        time_arr, flux_arr = get_processed_lightcurve(
+            hostname, ID,
+            lc_archive_dir=lc_archive_dir,
+            detrend_method=detrend_method,
+            window_length=window_length,
+            data_source=data_source,
+            progress=progress
+        )
+    if time_arr is None:
+        return None
 
-    time_arr = lc.time.value
-    flux_arr = lc.flux.value
     flux_err = np.std(flux_arr)
 
     # Estimate transit depth (ppm)
     tdepth_est = (1.0 - np.min(flux_arr)) * 1e6
-    print(f"Estimated depth: {tdepth_est:.2f} ppm")
+    log(f"Estimated depth: {tdepth_est:.2f} ppm")
 
     target.stars["tdepth"] = tdepth_est  # assign to all rows
 
-    # Patch missing columns needed internally
-    patch_star_table(target, planet)
-
-    # Also ensure “Mact” exists (expected by internal CSV reader)
-    if "Mact" not in target.stars.columns and "mass" in target.stars.columns:
-        target.stars["Mact"] = target.stars["mass"]
+    return {"target": target, "time": time_arr, "flux": flux_arr, "flux_err": flux_err}
 
-    # Call calc_probs with P_orb as at least 1D
-    P_orb = np.atleast_1d(planet["pl_orbper"])
+def evaluate_candidate(host, P_orb, adaptive=False, progress=None, parallel=True):
+    """
+    Run calc_probs for one orbital period against the shared host state.
+    Works on a copy of the target, so candidates of one host can be evaluated
+    concurrently. progress receives calc_probs scenario events.
+    parallel lets calc_probs start its own process pool; pass False when the
+    candidate already runs in a pool worker, or every worker forks another pool.
+    Returns (FPP, NFPP, precision).
+    """
+    target = copy.copy(host["target"])
+    target.stars = host["target"].stars.copy()
 
-    # try:
-    target.calc_probs(
-        time=time_arr,
-        flux_0=flux_arr,
-        flux_err_0=flux_err,
-        P_orb=P_orb,
+    calc_kwargs = dict(
+        time=np.asarray(host["time"]),
+        flux_0=np.asarray(host["flux"]),
+        flux_err_0=host["flux_err"],
+        P_orb=np.atleast_1d(P_orb),  # calc_probs expects P_orb as at least 1D
         contrast_curve_file=None,
-        filt="Kepler",
-        N=10000,
-        parallel=True,
+        filt="Vis",  # contrast curve band only; triceratops has no Kepler option
+        parallel=parallel,
         drop_scenario=[],
         verbose=1,
         flatpriors=False,
         exptime=0.0204,
         nsamples=1000
     )
-    # except Exception as e:
-    #     print("Error during calc_probs:", e)
-    #     return None, None
 
-    return target.FPP, target.NFPP
+    with scenario_progress(progress, n_scenarios(target.stars), P_orb=float(P_orb)), \
+            span("calc_probs", P_orb=float(P_orb), adaptive=adaptive):
+        if adaptive:
+            precision = calc_probs_adaptive(target, **calc_kwargs)
+        else:
+            target.calc_probs(N=10000, **calc_kwargs)
+    if not adaptive:
+        precision = {"FPP_err": None, "NFPP_err": None, "N": 10000, "batches": 1, "converged": None,
+                     "estimator": "single_run"}
+
+    return target.FPP, target.NFPP, precision
+
+def run_fpp_for_host(planets, k2_lc_cache_dir, trilegal_cache_dir, search_radius=10,
+                     detrend_method="savgol", window_length=401, lc_archive_dir=None, data_source=None,
+                     star_cache_dir=None, adaptive=False, result_cache_dir=None, force=False,
+                     max_workers=None, progress=None):
+    """
+    Run FPP analysis for every candidate (DataFrame rows) orbiting one host.
+    The target, star table and light curve are built once; each candidate's
+    pl_orbper is then evaluated against that shared state, in parallel worker
+    processes when there is more than one. Memoized results are reused unless
+    force is set. progress receives stage events, calc_probs scenario events
+    (single candidate only; parallel candidates run in other processes) and a
+    "candidate" event with each result as it finishes.
+    Returns a list of (FPP, NFPP, precision) in row order.
+    """
+    data_source = data_source or get_data_source()
+    planets = pd.DataFrame(planets)
+    hostname = planets.iloc[0]["hostname"]
+    ID = _parse_epic(hostname)
+    if ID == "Nan":
+        return [("Nan", "Nan", None)] * len(planets)
+    if ID is None:
+        return [(None, None, None)] * len(planets)
+
+    results = [None] * len(planets)
+    keys = []
+    for i, period in enumerate(planets["pl_orbper"]):
+        key, fields = _result_key(ID, period, search_radius, adaptive, detrend_method, window_length, data_source)
+        keys.append((key, fields))
+        if result_cache_dir and not force:
+            cached = load_fpp_result(result_cache_dir, key)
+            cache_outcome("fpp_result", cached is not None)
+            if cached is not None:
+                log(f"Loading FPP result from cache: {key}")
+                results[i] = (cached["FPP"], cached["NFPP"], dict(cached.get("precision") or {}, cached=True))
+                report(progress, "candidate", index=i, hostname=hostname, P_orb=float(period),
+                       FPP=results[i][0], NFPP=results[i][1], cached=True)
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+
+    with span("prepare_host", hostname=hostname):
+        host = prepare_host(
+            planets.iloc[0], k2_lc_cache_dir, trilegal_cache_dir,
+            search_radius=search_radius,
+            detrend_method=detrend_method,
+            window_length=window_length,
+            lc_archive_dir=lc_archive_dir,
+            data_source=data_source,
+            star_cache_dir=star_cache_dir,
+            progress=progress
+        )
+    if host is None:
+        for i in pending:
+            results[i] = (None, None, None)
+        return results
+
+    def finish(i, fpp, nfpp, precision):
+        if result_cache_dir:
+            try:
+                key, fields = keys[i]
+                save_fpp_result(result_cache_dir, key, fields, fpp, nfpp, precision)
+            except Exception as e:
+                log("Warning: failed to cache FPP result:", e)
+        results[i] = (fpp, nfpp, dict(precision, cached=False))
+        report(progress, "candidate", index=i, hostname=hostname, P_orb=float(planets.iloc[i]["pl_orbper"]),
+               FPP=fpp, NFPP=nfpp, cached=False)
+
+    if len(pending) == 1:
+        i = pending[0]
+        finish(i, *evaluate_candidate(host, planets.iloc[i]["pl_orbper"], adaptive, progress))
+    else:
+        log(f"Evaluating {len(pending)} candidates of {hostname} in parallel")
+        report(progress, "calc_probs", hostname=hostname, candidates=len(pending))
+        # Worker processes do not see the trace; the pool is timed as one span
+        with span("calc_probs_parallel", candidates=len(pending)), \
+                ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(evaluate_candidate, host, planets.iloc[i]["pl_orbper"], adaptive, parallel=False): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                finish(futures[future], *future.result())
+
+    return results
+
+def run_fpp_for_planets(planets, max_workers=None, progress=None, **kwargs):
+    """
+    Run FPP analysis for a DataFrame of candidates, grouped by host star so
+    multi-planet systems share one target, star table and light curve.
+    kwargs are passed to run_fpp_for_host. progress additionally receives a
+    "host" event before each host, with candidate indices relative to planets.
+    Returns a DataFrame with FPP, NFPP and precision columns aligned with planets.
+    """
+    planets = pd.DataFrame(planets)
+    fpp = pd.Series(index=planets.index, dtype=object)
+    nfpp = pd.Series(index=planets.index, dtype=object)
+    precision = pd.Series(index=planets.index, dtype=object)
+
+    positions = pd.Series(range(len(planets)), index=planets.index)
+    groups = planets.groupby("hostname", sort=False)
+    for h, (hostname, group) in enumerate(groups):
+        report(progress, "host", hostname=hostname, host=h + 1, n_hosts=groups.ngroups, candidates=len(group))
+
+        def host_progress(stage, **info):
+            if "index" in info:
+                info["index"] = int(positions[group.index[info["index"]]])
+            report(progress, stage, **info)
+
+        with span("host", hostname=hostname, candidates=len(group)):
+            results = run_fpp_for_host(group, max_workers=max_workers,
+                                       progress=host_progress if progress else None, **kwargs)
+        for idx, (f, n, p) in zip(group.index, results):
+            fpp[idx], nfpp[idx], precision[idx] = f, n, p
+
+    return planets.assign(FPP=fpp, NFPP=nfpp, precision=precision)
+
+def run_fpp_for_planet(planet, csv_base_path, k2_lc_cache_dir, trilegal_cache_dir, search_radius = 10,
+                       detrend_method="savgol", window_length=401, lc_archive_dir=None, data_source=None,
+                       star_cache_dir=None, adaptive=False, return_precision=False,
+                       result_cache_dir=None, force=False, progress=None):
+    """
+    Run triceratops FPP analysis for one planet (row from DataFrame).
+    detrend_method/window_length select the shared detrending stage
+    ('savgol' reproduces lc.flatten(window_length=401)).
+    lc_archive_dir enables the local light curve archive, so repeat runs skip
+    the download and the detrending.
+    data_source is a data_sources source ("mast" live queries or "local"
+    recorded fixtures); defaults to the FPP_DATA_SOURCE setting.
+    star_cache_dir caches the normalized star table, so repeat runs on the same
+    EPIC skip the star query and the patching.
+    adaptive runs calc_probs in growing sample batches (calc_probs_adaptive)
+    instead of a fixed N=10000.
+    result_cache_dir memoizes (FPP, NFPP) per EPIC, period, search radius,
+    sampling settings and pipeline version; force recomputes and overwrites.
+    progress receives stage and calc_probs scenario events (see run_fpp_for_host).
+    Returns (FPP, NFPP) or (None, None) on error; with return_precision,
+    (FPP, NFPP, precision) where precision describes the Monte Carlo error
+    and whether the result came from the result cache.
+    """
+    planets = pd.DataFrame([planet])
+    FPP, NFPP, precision = run_fpp_for_host(
+        planets, k2_lc_cache_dir, trilegal_cache_dir,
+        search_radius=search_radius,
+        detrend_method=detrend_method,
+        window_length=window_length,
+        lc_archive_dir=lc_archive_dir,
+        data_source=data_source,
+        star_cache_dir=star_cache_dir,
+        adaptive=adaptive,
+        result_cache_dir=result_cache_dir,
+        force=force,
+        progress=progress
+    )[0]
+    return (FPP, NFPP, precision) if return_precision else (FPP, NFPP)
 
 def main():
-    for i in range(15):
-        df = pd.read_csv("exoplanets_to_confirm.csv")
-        df_default = df[df["default_flag"] == 1]
-
-        planet = df_default.iloc[i]
-
-        FPP, NFPP = run_fpp_for_planet(planet,
-                                    csv_base_path="exoplanets_to_confirm.csv",
-                                    k2_lc_cache_dir="data/k2_lk/",
-                                    trilegal_cache_dir="data/trilegal", 
-                                    search_radius=20)
-        print("Final result:", FPP, NFPP)
+    df = pd.read_csv("exoplanets_to_confirm.csv")
+    df_default = df[df["default_flag"] == 1]
+
+    start = time.perf_counter()
+    results = run_fpp_for_planets(
+        df_default.iloc[:15],
+        k2_lc_cache_dir="data/k2_lk/",
+        trilegal_cache_dir="data/trilegal",
+        search_radius=20
+    )
+    print(f"Finished {len(results)} candidates in {time.perf_counter() - start:.1f}s")
+
+    for _, row in results.iterrows():
+        print("Final result:", row["pl_name"], row["FPP"], row["NFPP"])
         # if NFPP < 0.1 planet, else not planet
-        if NFPP < 0.1:
+        if isinstance(row["NFPP"], float) and row["NFPP"] < 0.1:
             print("Confirmed planet")
         else:
             print("Not a planet")
@@ -0,0 +1,230 @@
+"""
+Response encoding for the API
+- FastJSONResponse renders with orjson (NumPy arrays and scalars natively)
+  instead of the standard library encoder; endpoints with large bodies return
+  it directly, skipping FastAPI's jsonable_encoder pass
+- CompressionMiddleware compresses bodies above a size threshold with zstd
+  (if the zstandard package is installed and the client accepts it) or gzip
+- cached_response serves responses fully determined by a key (model versions,
+  archived data) with a strong ETag, answers matching If-None-Match with 304
+  and keeps recent rendered bodies, so they are not rebuilt per call
+
+orjson and zstandard are optional; without them responses use json and gzip.
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from tracing import cache_outcome
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Rendered bodies kept by cached_response
+RESPONSE_CACHE_SIZE = 256
+# Bump when the shape of a cached response changes without a code change here
+RESPONSE_SCHEMA_VERSION = 1
+
+
+def _source_digest():
+    """Digest of the API's Python sources: equal in every worker, changed by an upgrade"""
+    digest = hashlib.sha1(str(RESPONSE_SCHEMA_VERSION).encode())
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Part of every ETag: identical content gets identical ETags across workers and
+# restarts, while a different API version never matches a stale one
+ETAG_SALT = _source_digest()
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    """obj with NaN and infinity replaced by None, as orjson writes them"""
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    return obj
+
+
+def dumps(content, default=_default):
+    """JSON bytes of content; NaN and infinity become null"""
+    if orjson is not None:
+        return orjson.dumps(content, default=default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        text = json.dumps(content, default=default, ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":"))
+    except ValueError:
+        # Out-of-range floats (rare): rewrite them and encode again
+        text = json.dumps(_finite(content), default=default, ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson (falls back to json)"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def _accepted_encoding(accept_encoding):
+    """zstd or gzip, whichever the client accepts (zstd preferred), or None"""
+    accepted = set()
+    for token in accept_encoding.lower().split(","):
+        name, _, params = token.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compress complete response bodies of at least minimum_size bytes
+    Streaming responses (Server-Sent Events, chunked bodies) pass through untouched.
+    A compressed response's ETag gets an -<encoding> suffix, as its bytes differ.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        streaming = False
+
+        async def send_compressed(message):
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if message.get("more_body", False):
+                streaming = True
+            elif (len(body) >= self.minimum_size and "content-encoding" not in headers
+                    and not headers.get("content-type", "").startswith("text/event-stream")):
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                message = {**message, "body": body}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def etag_for(*parts):
+    """Strong ETag of a response fully determined by parts"""
+    digest = hashlib.sha1(json.dumps([ETAG_SALT, *parts], default=str).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match names etag (in any content encoding)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        for suffix in ("-gzip\"", "-zstd\""):
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+        if tag == etag:
+            return True
+    return False
+
+
+_bodies = OrderedDict()
+
+
+def cached_response(request, key, build):
+    """
+    Response for a deterministic resource: 304 if the client holds the current
+    version, else the rendered body of build() (remembered per key)
+    """
+    etag = etag_for(*key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        cache_outcome("response", "not_modified")
+        return Response(status_code=304, headers=headers)
+    body = _bodies.get(etag)
+    cache_outcome("response", body is not None)
+    if body is None:
+        body = dumps(build())
+        _bodies[etag] = body
+        if len(_bodies) > RESPONSE_CACHE_SIZE:
+            _bodies.popitem(last=False)
+    else:
+        _bodies.move_to_end(etag)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,276 @@
+"""
+Compact in-memory and on-disk format for fitted RandomForestClassifiers
+All trees are flattened into a few small arrays: int16 split features, float32
+thresholds, int16/int32 child codes and leaf class probabilities quantized to
+uint8 (or uint16). Subtrees whose leaves quantize to the same probabilities are
+pruned. Arrays are saved as .npy files and opened memory-mapped, so loading is
+near-instant and worker processes share the same pages.
+
+Child codes: a value >= 0 is an internal node index, a value < 0 is leaf ~code.
+Thresholds are rounded down to float32, so comparisons on float32 inputs match
+sklearn's exactly; the only approximation is leaf quantization, which keeps
+every predicted probability within max_error() (1/510 for 8 bits) of the
+original forest.
+"""
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+COMPACT_FORMAT_VERSION = 1
+ARRAY_NAMES = ("feature", "threshold", "children", "roots", "leaf_value", "node_value")
+
+
+def _quantize(proba, bits):
+    scale = (1 << bits) - 1
+    return np.rint(proba * scale).astype(np.uint8 if bits == 8 else np.uint16)
+
+
+def _float32_floor(values):
+    """Largest float32 <= each float64 value"""
+    t32 = values.astype(np.float32)
+    above = t32.astype(np.float64) > values
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def _flatten_tree(tree, bits):
+    """
+    Quantize and prune one sklearn tree.
+    Returns (internal nodes as (orig_id, feature, threshold, left, right),
+    leaf values, node values, root code); codes are local to the tree.
+    """
+    left = tree.children_left
+    right = tree.children_right
+    value = tree.value[:, 0, :].astype(np.float64)
+    proba = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+    q = _quantize(proba, bits)
+
+    # Children always have larger ids than their parent, so a reverse scan
+    # visits every subtree before its root
+    is_leaf = left == -1
+    for i in range(tree.node_count - 1, -1, -1):
+        if not is_leaf[i] and is_leaf[left[i]] and is_leaf[right[i]] and np.array_equal(q[left[i]], q[right[i]]):
+            is_leaf[i] = True
+            q[i] = q[left[i]]
+
+    internal, leaves, codes = [], [], {}
+    stack = [0]
+    order = []
+    while stack:
+        i = stack.pop()
+        order.append(i)
+        if is_leaf[i]:
+            codes[i] = ~len(leaves)
+            leaves.append(q[i])
+        else:
+            codes[i] = len(internal)
+            internal.append(i)
+            stack.extend((right[i], left[i]))
+
+    nodes = [(i, tree.feature[i], tree.threshold[i], codes[left[i]], codes[right[i]]) for i in internal]
+    return nodes, leaves, [q[i] for i in internal], codes[0]
+
+
+class CompactForest:
+    """
+    Quantized, pruned forest with the predict/predict_proba interface of the
+    RandomForestClassifier it was built from
+    """
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.roots = arrays["roots"]
+        self.leaf_value = arrays["leaf_value"]
+        self.node_value = arrays["node_value"]
+        self.meta = meta
+        self.bits = meta["bits"]
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+        self.feature_importances_ = np.asarray(meta["feature_importances"])
+        self.n_estimators = len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, forest, bits=8):
+        """Convert a fitted RandomForestClassifier (single output)"""
+        if bits not in (8, 16):
+            raise ValueError("bits must be 8 or 16")
+        feature, threshold, left, right, node_value, leaf_value, roots = [], [], [], [], [], [], []
+        n_internal = n_leaves = 0
+        for estimator in forest.estimators_:
+            nodes, leaves, values, root = _flatten_tree(estimator.tree_, bits)
+            shift = lambda code: code + n_internal if code >= 0 else code - n_leaves
+            for _, f, t, l, r in nodes:
+                feature.append(f)
+                threshold.append(t)
+                left.append(shift(l))
+                right.append(shift(r))
+            node_value.extend(values)
+            leaf_value.extend(leaves)
+            roots.append(shift(root))
+            n_internal += len(nodes)
+            n_leaves += len(leaves)
+
+        code_dtype = np.int16 if max(n_internal, n_leaves) < np.iinfo(np.int16).max else np.int32
+        n_classes = len(forest.classes_)
+        value_dtype = np.uint8 if bits == 8 else np.uint16
+        arrays = {
+            "feature": np.asarray(feature, dtype=np.int16 if forest.n_features_in_ < 32768 else np.int32),
+            "threshold": _float32_floor(np.asarray(threshold, dtype=np.float64)),
+            "children": np.stack([np.asarray(left), np.asarray(right)], axis=1).astype(code_dtype)
+            if n_internal else np.zeros((0, 2), dtype=code_dtype),
+            "roots": np.asarray(roots, dtype=code_dtype),
+            "leaf_value": np.asarray(leaf_value, dtype=value_dtype).reshape(-1, n_classes),
+            "node_value": np.asarray(node_value, dtype=value_dtype).reshape(-1, n_classes),
+        }
+        meta = {
+            "format_version": COMPACT_FORMAT_VERSION,
+            "bits": bits,
+            "classes": forest.classes_.tolist(),
+            "n_features": int(forest.n_features_in_),
+            "feature_importances": forest.feature_importances_.tolist(),
+            "n_estimators": len(forest.estimators_),
+            "n_internal": n_internal,
+            "n_leaves": n_leaves,
+            "original_nodes": int(sum(e.tree_.node_count for e in forest.estimators_)),
+        }
+        return cls(arrays, meta)
+
+    def max_error(self):
+        """Bound on |predict_proba - original predict_proba| from leaf quantization"""
+        return 0.5 / ((1 << self.bits) - 1)
+
+    def nbytes(self):
+        return int(sum(getattr(self, name).nbytes for name in ARRAY_NAMES))
+
+    def apply(self, X):
+        """Leaf index (into leaf_value) reached in every tree, shape (n_samples, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        feature, threshold, children = self._walk_arrays()
+        n_trees = self.n_estimators
+        codes = np.tile(self.roots.astype(np.intp), len(X))
+        X_flat = X.ravel()
+        # Walk all (sample, tree) pairs level by level, dropping those that reached a leaf
+        active = np.flatnonzero(codes >= 0)
+        row_offset = (active // n_trees) * X.shape[1]
+        while len(active):
+            node = codes.take(active)
+            go_right = X_flat.take(row_offset + feature.take(node)) > threshold.take(node)
+            step = children.take(2 * node + go_right)
+            codes[active] = step
+            still = step >= 0
+            active = active.compress(still)
+            row_offset = row_offset.compress(still)
+        return ~codes.reshape(len(X), n_trees)
+
+    def _walk_arrays(self):
+        """Native-width copies of the split arrays for traversal (small; built once)"""
+        if getattr(self, "_walk", None) is None:
+            self._walk = (
+                np.asarray(self.feature, dtype=np.intp),
+                np.asarray(self.threshold, dtype=np.float32),
+                np.asarray(self.children, dtype=np.intp).ravel(),
+            )
+        return self._walk
+
+    def contributions(self, X, class_index=-1):
+        """
+        Path-based attribution of predict_proba[:, class_index]: every split a
+        row passes through credits its feature with the change in node value.
+        Returns (bias, contributions) with bias + contributions.sum(axis=1)
+        equal to the predicted probability; contributions is (n_samples, n_features).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        feature, threshold, children = self._walk_arrays()
+        scale = (1 << self.bits) - 1
+        node_value = np.asarray(self.node_value[:, class_index], dtype=np.float64) / scale
+        leaf_value = np.asarray(self.leaf_value[:, class_index], dtype=np.float64) / scale
+
+        def value_of(codes):
+            return np.where(codes >= 0, node_value.take(np.maximum(codes, 0), mode="clip"),
+                            leaf_value.take(np.maximum(~codes, 0), mode="clip"))
+
+        n_samples, n_features = X.shape
+        n_trees = self.n_estimators
+        roots = self.roots.astype(np.intp)
+        bias = np.full(n_samples, value_of(roots).mean())
+        contrib = np.zeros(n_samples * n_features)
+
+        codes = np.tile(roots, n_samples)
+        X_flat = X.ravel()
+        active = np.flatnonzero(codes >= 0)
+        rows = active // n_trees
+        while len(active):
+            node = codes.take(active)
+            split = feature.take(node)
+            go_right = X_flat.take(rows * n_features + split) > threshold.take(node)
+            step = children.take(2 * node + go_right)
+            contrib += np.bincount(rows * n_features + split, weights=value_of(step) - node_value.take(node),
+                                   minlength=len(contrib))
+            codes[active] = step
+            still = step >= 0
+            active = active.compress(still)
+            rows = rows.compress(still)
+        return bias, contrib.reshape(n_samples, n_features) / n_trees
+
+    def predict_proba(self, X):
+        scale = (1 << self.bits) - 1
+        leaves = self.apply(X)
+        return self.leaf_value[leaves].astype(np.float64).mean(axis=1) / scale
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def compare(self, forest, X):
+        """Agreement with the original forest on X: max probability error and label flips"""
+        ours = self.predict_proba(X)
+        theirs = forest.predict_proba(X)
+        return {
+            "max_abs_error": float(np.abs(ours - theirs).max()) if len(X) else 0.0,
+            "bound": self.max_error(),
+            "label_agreement": float(np.mean(np.argmax(ours, axis=1) == np.argmax(theirs, axis=1))) if len(X) else 1.0,
+        }
+
+
+def save_compact_forest(path, model):
+    """Write a CompactForest as .npy arrays plus meta.json (atomic rename)"""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{path}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(model, name)))
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(model.meta, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_dir, path)
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+
+def load_compact_forest(path, mmap=True):
+    """Open a saved CompactForest (memory-mapped by default), or None if missing"""
+    meta_file = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != COMPACT_FORMAT_VERSION:
+        return None
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in ARRAY_NAMES
+    }
+    return CompactForest(arrays, meta)
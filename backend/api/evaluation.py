@@ -0,0 +1,219 @@
+"""
+Headless evaluation of the K2 and TESS classifiers
+Runs stratified k-fold cross-validation for every (dataset, model) pair in
+parallel worker processes, with the same preprocessing, training recipe and
+(tuned) hyperparameters as training.py (scaler and SMOTE fitted inside each
+fold, so no test rows leak into training). Results are cached by a hash of the
+data and hyperparameters, so republishing unchanged data skips the CV. Serving
+latency and model size are measured on the trained artifact and stored with it
+in the registry manifest.
+
+Usage: python evaluation.py [k2] [tess] [--folds 5] [--workers N] [--force] [--imbalance METHOD]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import sklearn
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+
+from compact_forest import CompactForest
+from training import (
+    FAST_TIER_PARAMS, IMBALANCE, IMBALANCE_METHODS, MISSIONS, _predict_latency_ms, backend_path, build_features, model_params, resample
+)
+
+# Cached CV results, one JSON file per dataset and data/recipe hash
+EVALUATION_DIR = backend_path.parent / "model" / "data" / "evaluation"
+N_SPLITS = 5
+MODEL_KEYS = ("rf", "rf_fast", "mlp")
+METRICS = ("precision", "recall", "f1", "accuracy", "roc_auc")
+
+def recipe_params(dataset, key, overrides=None):
+    """Constructor arguments training.train_models uses for a model key (plus any overrides)"""
+    if key == "rf_fast":
+        return {**FAST_TIER_PARAMS, "random_state": 42}
+    return {**model_params(dataset, key), **(overrides or {}).get(key, {})}
+
+
+def fit_model(key, params, X_train, y_train, imbalance=IMBALANCE):
+    """
+    Train one model key on raw (unscaled) rows with the loaders' recipe
+    (forests with the imbalance method, the MLP on the raw rows); returns (scaler, model)
+    """
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    if key == "mlp":
+        model = MLPClassifier(**params)
+    else:
+        X_train, y_train, balance_params = resample(X_train, y_train, imbalance)
+        model = RandomForestClassifier(**{**params, **balance_params})
+    model.fit(X_train, y_train)
+    return scaler, model
+
+
+def score(y_true, proba):
+    """Fold metrics from planet-class probabilities"""
+    pred = (proba >= 0.5).astype(int)
+    return {
+        "precision": float(precision_score(y_true, pred, zero_division=0)),
+        "recall": float(recall_score(y_true, pred, zero_division=0)),
+        "f1": float(f1_score(y_true, pred, zero_division=0)),
+        "accuracy": float(accuracy_score(y_true, pred)),
+        "roc_auc": float(roc_auc_score(y_true, proba)) if len(np.unique(y_true)) > 1 else float("nan"),
+    }
+
+
+def run_fold(dataset, key, params, fold, X, y, train_idx, test_idx, imbalance=IMBALANCE):
+    """Train and score one fold (runs in a worker process)"""
+    start = time.perf_counter()
+    scaler, model = fit_model(key, params, X[train_idx], y[train_idx], imbalance)
+    proba = model.predict_proba(scaler.transform(X[test_idx]))[:, 1]
+    return dataset, key, fold, {**score(y[test_idx], proba), "fit_seconds": time.perf_counter() - start}
+
+
+def _data_key(X, y, params, n_splits, imbalance):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y).tobytes())
+    # Cached and fresh SMOTE give identical folds, so they share results
+    method = "smote" if imbalance == "smote_cached" else imbalance
+    h.update(json.dumps({"params": params, "n_splits": n_splits, "imbalance": method,
+                         "sklearn": sklearn.__version__}, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def _cache_path(dataset, data_key):
+    return EVALUATION_DIR / f"{dataset}-{data_key}.json"
+
+
+def summarize(folds):
+    """Mean and standard deviation of each metric over folds"""
+    summary = {"folds": folds, "n_splits": len(folds)}
+    for metric in METRICS + ("fit_seconds",):
+        values = np.array([f[metric] for f in folds], dtype=float)
+        summary[metric] = float(np.nanmean(values))
+        summary[f"{metric}_std"] = float(np.nanstd(values))
+    return summary
+
+
+def cross_validate(datasets=("k2", "tess"), n_splits=N_SPLITS, max_workers=None, force=False, params=None,
+                   imbalance=IMBALANCE):
+    """
+    Stratified k-fold CV of every model key on every dataset
+    params optionally overrides hyperparameters as {dataset: {model_key: {...}}}
+    All (dataset, model, fold) fits run in one process pool; datasets with a
+    cached result for the same data and recipe are skipped unless force.
+    Returns {dataset: {model_key: summary}}
+    """
+    results, pending, keys, used = {}, {}, {}, {}
+    for dataset in datasets:
+        fs = build_features(dataset)
+        X = np.asarray(fs["X_labeled"], dtype=np.float64)
+        y = np.asarray(fs["y"], dtype=int)
+        used[dataset] = {key: recipe_params(dataset, key, (params or {}).get(dataset)) for key in MODEL_KEYS}
+        keys[dataset] = _data_key(X, y, used[dataset], n_splits, imbalance)
+        path = _cache_path(dataset, keys[dataset])
+        if path.exists() and not force:
+            with open(path) as f:
+                results[dataset] = json.load(f)
+            print(f"{dataset.upper()} CV: cached ({path.name})")
+        else:
+            pending[dataset] = (X, y)
+
+    if pending:
+        start = time.perf_counter()
+        folds = {dataset: {key: [None] * n_splits for key in MODEL_KEYS} for dataset in pending}
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for dataset, (X, y) in pending.items():
+                splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+                for fold, (train_idx, test_idx) in enumerate(splitter.split(X, y)):
+                    for key in MODEL_KEYS:
+                        futures.append(pool.submit(
+                            run_fold, dataset, key, used[dataset][key], fold, X, y, train_idx, test_idx, imbalance
+                        ))
+            for future in futures:
+                dataset, key, fold, metrics = future.result()
+                folds[dataset][key][fold] = metrics
+
+        os.makedirs(EVALUATION_DIR, exist_ok=True)
+        for dataset in pending:
+            results[dataset] = {
+                key: {**summarize(folds[dataset][key]), "params": used[dataset][key], "imbalance": imbalance}
+                for key in MODEL_KEYS
+            }
+            with open(_cache_path(dataset, keys[dataset]), "w") as f:
+                json.dump(results[dataset], f, indent=2)
+        print(f"CV of {', '.join(d.upper() for d in pending)}: {len(futures)} fits on "
+              f"{workers} workers in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def model_size_bytes(model):
+    """In-memory array size of a compact forest, pickled size of anything else"""
+    if isinstance(model, CompactForest):
+        return model.nbytes()
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def serving_stats(models, keys=MODEL_KEYS):
+    """Per-row and batch predict_proba latency and size of each served model"""
+    rows = np.asarray(models["warmup_rows"])
+    batch = np.repeat(rows, max(1, 1000 // len(rows)), axis=0)
+    return {
+        key: {
+            "latency_ms": _predict_latency_ms(models[key], rows[:1]),
+            "batch_latency_ms": _predict_latency_ms(models[key], batch, repeats=5),
+            "batch_rows": len(batch),
+            "size_bytes": model_size_bytes(models[key]),
+        }
+        for key in keys if key in models
+    }
+
+
+def attach_evaluation(models, cv):
+    """Store CV metrics and serving stats of one dataset's models under models["evaluation"]"""
+    serving = serving_stats(models)
+    models["evaluation"] = {key: {"cv": cv.get(key), **serving.get(key, {})} for key in MODEL_KEYS}
+    return models["evaluation"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate the K2 and TESS classifiers")
+    parser.add_argument("datasets", nargs="*", help="Datasets to evaluate (k2, tess; default: all)")
+    parser.add_argument("--folds", type=int, default=N_SPLITS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Ignore cached results")
+    parser.add_argument("--imbalance", choices=IMBALANCE_METHODS, default=IMBALANCE,
+                        help="Class imbalance handling for the forests")
+    args = parser.parse_args()
+    unknown = set(args.datasets) - set(MISSIONS)
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+
+    results = cross_validate(args.datasets or sorted(MISSIONS), args.folds, args.workers, args.force,
+                             imbalance=args.imbalance)
+    for dataset, by_model in results.items():
+        for key, summary in by_model.items():
+            print(f"{dataset.upper():5s} {key:8s} " + "  ".join(
+                f"{m} {summary[m]:.3f}±{summary[f'{m}_std']:.3f}" for m in METRICS
+            ))
+
+
+if __name__ == "__main__":
+    main()
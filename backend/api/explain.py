@@ -0,0 +1,108 @@
+"""
+Per-prediction explanations for the RF and MLP classifiers
+Random forests use path-based contributions (each split credits its feature
+with the change in node value along the row's path), the MLP uses occlusion
+(the drop in probability when one feature is reset to the training mean).
+Both are computed for whole batches in a few numpy passes; per-model state
+(compact tree arrays, global importances, baseline probability) is cached.
+"""
+import weakref
+
+import numpy as np
+
+from compact_forest import CompactForest
+from tracing import cache_outcome
+
+TOP_K = 8
+
+# Per-model explainer state, dropped together with the model
+_cache = weakref.WeakKeyDictionary()
+
+
+def _model_cache(model):
+    try:
+        return _cache.setdefault(model, {})
+    except TypeError:
+        return {}
+
+
+def _positive_index(model):
+    classes = list(getattr(model, "classes_", [0, 1]))
+    return classes.index(1) if 1 in classes else len(classes) - 1
+
+
+def global_importance(model, features, top=TOP_K):
+    """Top feature_importances_ as [{feature, importance}], sorted once per model"""
+    cache = _model_cache(model)
+    cache_outcome("explainer", "global" in cache)
+    if "global" not in cache:
+        if hasattr(model, "feature_importances_"):
+            importances = np.asarray(model.feature_importances_)
+            order = np.argsort(importances)[::-1]
+            cache["global"] = [
+                {"feature": features[i], "importance": float(importances[i])} for i in order
+            ]
+        else:
+            cache["global"] = []
+    return cache["global"][:top]
+
+
+def tree_contributions(model, X):
+    """Path contributions to P(confirmed) for a CompactForest or sklearn forest"""
+    if not isinstance(model, CompactForest):
+        cache = _model_cache(model)
+        if "compact" not in cache:
+            cache["compact"] = CompactForest.from_sklearn(model, bits=16)
+        model = cache["compact"]
+    return model.contributions(X, class_index=_positive_index(model))
+
+
+def occlusion_contributions(model, X, baseline=None):
+    """
+    P(confirmed) minus P(confirmed) with each feature reset to baseline
+    (zeros, i.e. the training mean in scaled space), evaluated as one batch
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n_samples, n_features = X.shape
+    baseline = np.zeros(n_features) if baseline is None else np.asarray(baseline, dtype=np.float64)
+    positive = _positive_index(model)
+
+    cache = _model_cache(model)
+    if "bias" not in cache:
+        cache["bias"] = float(model.predict_proba(baseline[None, :])[0, positive])
+
+    occluded = np.repeat(X[:, None, :], n_features, axis=1)
+    diag = np.arange(n_features)
+    occluded[:, diag, diag] = baseline
+    proba = model.predict_proba(np.vstack([X, occluded.reshape(-1, n_features)]))[:, positive]
+    full = proba[:n_samples]
+    dropped = proba[n_samples:].reshape(n_samples, n_features)
+    return np.full(n_samples, cache["bias"]), full[:, None] - dropped
+
+
+def contributions(model, X):
+    """(bias, contributions, method) for any served classifier"""
+    if isinstance(model, CompactForest) or hasattr(model, "estimators_"):
+        bias, contrib = tree_contributions(model, X)
+        return bias, contrib, "tree_path"
+    bias, contrib = occlusion_contributions(model, X)
+    return bias, contrib, "occlusion"
+
+
+def explain_row(model, X_scaled, X_raw, features, row=0, top=TOP_K):
+    """
+    Explanation of one row: the top features by absolute contribution with
+    their input values, the bias (base probability) and the method used
+    """
+    bias, contrib, method = contributions(model, X_scaled[row:row + 1])
+    contrib = contrib[0]
+    order = np.argsort(np.abs(contrib))[::-1][:top]
+    raw = np.asarray(X_raw, dtype=np.float64)[row]
+    return {
+        "method": method,
+        "baseValue": float(bias[0]),
+        "contributions": [
+            {"feature": features[i], "value": float(raw[i]), "contribution": float(contrib[i])}
+            for i in order
+        ]
+    }
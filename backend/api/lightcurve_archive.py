@@ -0,0 +1,215 @@
+"""
+Local light curve archive for the FPP pipeline and the API charts
+Arrays are stored per EPIC as .npy files and opened memory-mapped (zero-copy),
+with a JSON metadata sidecar describing how they were produced. Each variant
+is a set of immutable version directories behind a CURRENT pointer file:
+
+    <archive>/EPIC<ID>/<variant>/CURRENT        name of the current version
+    <archive>/EPIC<ID>/<variant>/v<timestamp>/  time.npy, flux.npy, flux_err.npy, meta.json
+"""
+import json
+import os
+import shutil
+import time as _time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ARCHIVE_FORMAT_VERSION = 1
+ARRAY_NAMES = ("time", "flux", "flux_err")
+RAW_VARIANT = "raw"
+# File naming a variant's current version directory
+POINTER = "CURRENT"
+# Version directories kept per variant (the current one and its predecessor)
+KEEP_VERSIONS = 2
+# Older versions are only removed once they are this old (seconds), so a writer
+# that is about to point at one and readers that just resolved one are unaffected
+PRUNE_GRACE = 60
+# Times a reader follows the pointer again when writers prune the version it resolved
+READ_ATTEMPTS = 10
+# Data source whose arrays use the plain variant names (the ones charts read)
+LIVE_SOURCE = "mast"
+
+
+def processing_variant(method="savgol", window_length=401, outlier_sigma=5):
+    """Name of the archive variant holding arrays processed with these settings"""
+    return f"{method}_w{int(window_length)}_o{outlier_sigma}"
+
+
+def source_variant(variant, source="mast"):
+    """
+    Variant name for arrays from a data source. Live MAST data keeps the plain
+    name; other sources (recorded fixtures) are prefixed, so they never replace
+    or stand in for MAST data.
+    """
+    return variant if source == LIVE_SOURCE else f"{source}-{variant}"
+
+
+def archive_path(archive_dir, epic, variant=RAW_VARIANT):
+    """Directory holding one variant of one EPIC light curve"""
+    return os.path.join(archive_dir, f"EPIC{int(epic)}", variant)
+
+
+def _current_dir(archive_dir, epic, variant=RAW_VARIANT):
+    """Directory of the variant's current version, or None"""
+    path = archive_path(archive_dir, epic, variant)
+    try:
+        with open(os.path.join(path, POINTER)) as f:
+            current = os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        pass
+    else:
+        if os.path.isdir(current):
+            return current
+        # A concurrent writer pruned the version a slower writer pointed at last:
+        # fall back to the newest complete one
+        versions = sorted(n for n in os.listdir(path) if n.startswith("v"))
+        return os.path.join(path, versions[-1]) if versions else None
+    # Archives written before versioning keep the files in the variant directory
+    return path if os.path.exists(os.path.join(path, "meta.json")) else None
+
+
+def has_lightcurve(archive_dir, epic, variant=RAW_VARIANT):
+    """True if a complete variant exists in the archive"""
+    current = _current_dir(archive_dir, epic, variant)
+    return current is not None and os.path.exists(os.path.join(current, "meta.json"))
+
+
+def _version_name():
+    return f"v{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+
+def _prune(variant_dir, current):
+    """Remove versions beyond the newest KEEP_VERSIONS (never the current one) and stale leftovers"""
+    names = sorted(n for n in os.listdir(variant_dir) if n.startswith("v"))
+    cutoff = f"v{datetime.utcnow() - timedelta(seconds=PRUNE_GRACE):%Y%m%dT%H%M%S%f}"
+    for name in names[:-KEEP_VERSIONS]:
+        if name != current and name < cutoff:
+            shutil.rmtree(os.path.join(variant_dir, name), ignore_errors=True)
+    for name in os.listdir(variant_dir):
+        path = os.path.join(variant_dir, name)
+        if name.startswith(".tmp-") or name.startswith(f".{POINTER}.tmp-"):
+            # Left by a crashed writer (live writers finish well within the hour)
+            try:
+                if _time.time() - os.path.getmtime(path) > 3600:
+                    shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+            except OSError:
+                pass
+        elif name == "meta.json" or name.endswith(".npy"):
+            # Files of the pre-versioning layout, superseded by the pointer
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def save_lightcurve(archive_dir, epic, time, flux, flux_err=None, variant=RAW_VARIANT, **metadata):
+    """
+    Write time/flux/flux_err arrays (float64, C-contiguous) plus metadata.
+    Each write goes to a new version directory, and the variant's CURRENT
+    pointer file is then replaced atomically. Superseded versions are only
+    removed after PRUNE_GRACE, so readers that already followed the old pointer
+    can finish. Concurrent writers never collide (the last pointer swap wins).
+    Returns the metadata dict that was stored.
+    """
+    time = np.ascontiguousarray(time, dtype=np.float64)
+    flux = np.ascontiguousarray(flux, dtype=np.float64)
+    if flux_err is None:
+        flux_err = np.full(len(flux), np.nan)
+    flux_err = np.ascontiguousarray(np.broadcast_to(flux_err, flux.shape), dtype=np.float64)
+    if not (len(time) == len(flux) == len(flux_err)):
+        raise ValueError("time, flux and flux_err must have the same length")
+
+    variant_dir = archive_path(archive_dir, epic, variant)
+    os.makedirs(variant_dir, exist_ok=True)
+    tmp_dir = os.path.join(variant_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+
+    meta = {
+        "format_version": ARCHIVE_FORMAT_VERSION,
+        "epic": int(epic),
+        "variant": variant,
+        "n_points": int(len(time)),
+        "created": datetime.utcnow().isoformat(),
+        **metadata,
+    }
+    try:
+        for name, arr in zip(ARRAY_NAMES, (time, flux, flux_err)):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        # Named when complete, so the grace period runs from here
+        version = _version_name()
+        os.rename(tmp_dir, os.path.join(variant_dir, version))
+
+        pointer_tmp = os.path.join(variant_dir, f".{POINTER}.tmp-{uuid.uuid4().hex}")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(variant_dir, POINTER))
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _prune(variant_dir, version)
+    return meta
+
+
+def _read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def load_lightcurve(archive_dir, epic, variant=RAW_VARIANT):
+    """
+    Open an archived light curve without copying it into memory.
+    Returns a dict with read-only memory-mapped 'time', 'flux', 'flux_err'
+    arrays and 'meta', or None if the variant is not archived.
+    """
+    # Follow the pointer again if concurrent writers pruned the version meanwhile
+    for _ in range(READ_ATTEMPTS):
+        path = _current_dir(archive_dir, epic, variant)
+        if path is None:
+            return None
+        try:
+            meta = _read_meta(path)
+            if meta.get("format_version") != ARCHIVE_FORMAT_VERSION:
+                return None
+            result = {"meta": meta}
+            for name in ARRAY_NAMES:
+                result[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            return result
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def lightcurve_stamp(archive_dir, epic, variant=RAW_VARIANT):
+    """Identifier of the stored version of a variant (changes whenever it is rewritten), or None"""
+    for _ in range(READ_ATTEMPTS):
+        path = _current_dir(archive_dir, epic, variant)
+        if path is None:
+            return None
+        try:
+            meta = _read_meta(path)
+        except FileNotFoundError:
+            continue
+        return f"{meta.get('format_version')}:{os.path.basename(path)}:{meta.get('created')}:{meta.get('n_points')}"
+    return None
+
+
+def delete_lightcurve(archive_dir, epic):
+    """Remove every archived variant of an EPIC"""
+    path = os.path.join(archive_dir, f"EPIC{int(epic)}")
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+
+def list_archived(archive_dir):
+    """EPIC IDs present in the archive"""
+    if not os.path.exists(archive_dir):
+        return []
+    return sorted(
+        int(name[4:]) for name in os.listdir(archive_dir)
+        if name.startswith("EPIC") and name[4:].isdigit()
+    )
@@ -0,0 +1,428 @@
+"""
+Light curve processing utilities shared by the API charts and the TRICERATOPS pipeline
+All routines work on plain NumPy arrays so they scale to long K2/TESS series
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import oaconvolve, savgol_coeffs
+
+
+def clean_series(x, y):
+    """
+    Drop non-finite samples and make sure x is ascending.
+    Returns float64 copies of (x, y).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    x, y = x[mask], y[mask]
+
+    if len(x) > 1 and np.any(np.diff(x) < 0):
+        order = np.argsort(x, kind="mergesort")
+        x, y = x[order], y[order]
+
+    return x, y
+
+
+def _bucket_edges(start, stop, n_buckets):
+    """Split the index range [start, stop) into n_buckets contiguous, non-empty buckets"""
+    return np.linspace(start, stop, n_buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Keeps the first and last samples and, for each interior bucket, the sample
+    forming the largest triangle with the previously kept sample and the mean of
+    the next bucket. Returns the indices of the kept samples (ascending).
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+
+    n_buckets = n_out - 2
+    edges = _bucket_edges(1, n - 1, n_buckets)
+    counts = np.diff(edges)
+
+    # Bucket means computed in one pass; the "next bucket" of the last bucket is the last sample
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+
+    a = 0
+    for i in range(n_buckets):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs(
+            (ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay)
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+
+    return out
+
+
+def minmax_indices(x, y, n_out):
+    """
+    Min/max envelope downsampling.
+    Splits the series into n_out // 2 buckets and keeps the minimum and maximum
+    sample of each, so narrow transits and flares survive. Fully vectorized.
+    Returns the indices of the kept samples (ascending).
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+
+    n_buckets = max(n_out // 2, 1)
+    edges = _bucket_edges(0, n, n_buckets)
+    counts = np.diff(edges)
+    bucket_ids = np.repeat(np.arange(n_buckets), counts)
+    positions = np.arange(n)
+
+    y_min = np.minimum.reduceat(y, edges[:-1])
+    y_max = np.maximum.reduceat(y, edges[:-1])
+
+    # First index in each bucket that hits the bucket minimum / maximum
+    i_min = np.minimum.reduceat(np.where(y == y_min[bucket_ids], positions, n), edges[:-1])
+    i_max = np.minimum.reduceat(np.where(y == y_max[bucket_ids], positions, n), edges[:-1])
+
+    return np.unique(np.concatenate([i_min, i_max]))
+
+
+DOWNSAMPLERS = {
+    "lttb": lttb_indices,
+    "minmax": minmax_indices,
+}
+
+
+def downsample(x, y, max_points=1000, x_range=None, method="lttb"):
+    """
+    Reduce a series to at most max_points visually faithful samples.
+    If x_range=(x_min, x_max) is given, only that window is considered and it is
+    downsampled from the full-resolution data (used for chart zoom requests).
+    Returns (x, y) arrays.
+    """
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Use one of {list(DOWNSAMPLERS)}")
+
+    x, y = clean_series(x, y)
+
+    if x_range is not None:
+        x_min, x_max = x_range
+        lo = np.searchsorted(x, x_min, side="left") if x_min is not None else 0
+        hi = np.searchsorted(x, x_max, side="right") if x_max is not None else len(x)
+        x, y = x[lo:hi], y[lo:hi]
+
+    if max_points is None or len(x) <= max_points:
+        return x, y
+
+    idx = DOWNSAMPLERS[method](x, y, int(max_points))
+    return x[idx], y[idx]
+
+
+def to_records(x, y, x_name, y_name):
+    """Convert two arrays into the list-of-dicts format used by the frontend charts"""
+    return [{x_name: xv, y_name: yv} for xv, yv in zip(x.tolist(), y.tolist())]
+
+
+# ============================================================================
+# Detrending
+# ============================================================================
+
+def _odd_window(window_length, n):
+    """Clamp a cadence window to an odd length that fits in n samples"""
+    w = min(int(window_length), n)
+    if w % 2 == 0:
+        w -= 1
+    return max(w, 1)
+
+
+def _savgol_trend(y, window_length, polyorder=2):
+    """Savitzky-Golay smoothing as a single FFT (overlap-add) convolution, O(n log w)"""
+    w = _odd_window(window_length, len(y))
+    if w <= polyorder + 1:
+        return _median_trend(y, window_length)
+    half = w // 2
+    padded = np.pad(y, half, mode="reflect", reflect_type="odd") if half < len(y) else y
+    coeffs = savgol_coeffs(w, polyorder, use="conv")
+    smooth = oaconvolve(padded, coeffs, mode="same")
+    return smooth[half:half + len(y)] if padded is not y else smooth
+
+
+def _median_trend(y, window_length, block_threshold=64):
+    """
+    Centered running median.
+    Short windows use pandas' skiplist rolling median (O(n log w)). Long windows
+    take medians of ~w/8-sample blocks (one O(n) partition pass), run the
+    rolling median over the block medians and interpolate back to every sample.
+    """
+    n = len(y)
+    w = _odd_window(window_length, n)
+    if w < block_threshold:
+        return pd.Series(y).rolling(w, center=True, min_periods=1).median().to_numpy()
+
+    block = max(w // 8, 1)
+    n_blocks = -(-n // block)
+    padded = np.full(n_blocks * block, np.nan)
+    padded[:n] = y
+    block_medians = np.nanmedian(padded.reshape(n_blocks, block), axis=1)
+    block_centers = np.minimum(np.arange(n_blocks) * block + (block - 1) / 2, n - 1)
+
+    smooth = pd.Series(block_medians).rolling(
+        _odd_window(w // block, n_blocks), center=True, min_periods=1
+    ).median().to_numpy()
+    return np.interp(np.arange(n), block_centers, smooth)
+
+
+def _rolling_sum(a, w):
+    """Centered running sum over w samples using a cumulative sum, O(n)"""
+    half = w // 2
+    c = np.cumsum(np.concatenate([np.zeros(half + 1), a, np.zeros(half)]))
+    return c[w:] - c[:-w]
+
+
+def _biweight_trend(y, window_length, c=5.0, iterations=3):
+    """
+    Tukey biweight location in a sliding window.
+    Starts from the running median and refines it with biweight-weighted running
+    means of the residuals. Weights are evaluated against the current location at
+    each sample, which keeps every iteration to O(n) running sums; averaging
+    residuals rather than raw flux keeps the estimate unbiased on steep trends.
+    """
+    w = _odd_window(window_length, len(y))
+    location = _median_trend(y, w)
+    mad = _median_trend(np.abs(y - location), w)
+    fallback = np.median(mad[mad > 0]) if np.any(mad > 0) else 1.0
+    scale = c * np.where(mad > 0, mad, fallback)
+
+    for _ in range(iterations):
+        resid = y - location
+        u = resid / scale
+        weights = np.where(np.abs(u) < 1, (1 - u ** 2) ** 2, 0.0)
+        norm = _rolling_sum(weights, w)
+        shift = _rolling_sum(weights * resid, w) / np.where(norm > 0, norm, 1.0)
+        location = location + np.where(norm > 0, shift, 0.0)
+
+    return location
+
+
+DETRENDERS = {
+    "savgol": _savgol_trend,
+    "median": _median_trend,
+    "biweight": _biweight_trend,
+}
+
+
+def _segments(time, break_tolerance):
+    """Split at gaps longer than break_tolerance times the median cadence"""
+    if len(time) < 3 or break_tolerance is None:
+        return [slice(0, len(time))]
+    dt = np.diff(time)
+    gaps = np.flatnonzero(dt > break_tolerance * np.median(dt)) + 1
+    bounds = np.concatenate([[0], gaps, [len(time)]])
+    return [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def robust_std(values):
+    """Standard deviation estimated from the median absolute deviation"""
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.nan
+    return 1.4826 * np.median(np.abs(values - np.median(values)))
+
+
+def detrend(time, flux, method="savgol", window_length=401, polyorder=2,
+            sigma=3, niters=None, break_tolerance=5):
+    """
+    Remove stellar variability and instrumental trends from a light curve.
+    The trend is fit per continuous segment with the chosen sliding-window
+    filter ('savgol', 'median' or 'biweight'), iteratively sigma-clipping
+    outliers (e.g. transits) out of the fit. window_length is in cadences,
+    matching lightkurve's flatten(window_length=...). time must be ascending.
+    niters defaults to 3 clipping passes, or 1 for 'biweight', whose weights
+    already reject samples beyond c * MAD inside every window.
+    Returns (flat_flux, trend) with flat_flux = flux / trend.
+    """
+    if method not in DETRENDERS:
+        raise ValueError(f"Unknown detrending method '{method}'. Use one of {list(DETRENDERS)}")
+
+    if niters is None:
+        niters = 1 if method == "biweight" else 3
+
+    time = np.asarray(time, dtype=float)
+    flux = np.asarray(flux, dtype=float)
+    finite = np.isfinite(time) & np.isfinite(flux)
+    trend = np.full(len(flux), np.nan)
+
+    for seg in _segments(time, break_tolerance):
+        t, f = time[seg], flux[seg]
+        keep = finite[seg].copy()
+        if not np.any(keep):
+            continue
+
+        for it in range(max(niters, 1)):
+            if method == "savgol":
+                fitted = _savgol_trend(f[keep], window_length, polyorder)
+            else:
+                fitted = DETRENDERS[method](f[keep], window_length)
+            seg_trend = np.interp(t, t[keep], fitted)
+
+            if not sigma or it == niters - 1:
+                break
+            resid = f - seg_trend
+            new_keep = finite[seg] & (np.abs(resid) <= sigma * robust_std(resid[keep]))
+            if np.array_equal(new_keep, keep) or new_keep.sum() < 3:
+                break
+            keep = new_keep
+
+        trend[seg] = seg_trend
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flat = flux / trend
+    return flat, trend
+
+
+def outlier_mask(flux, sigma=5, maxiters=5):
+    """
+    Iterative sigma clipping around the median, like lightkurve's remove_outliers.
+    Returns a boolean mask that is True for samples to keep.
+    """
+    flux = np.asarray(flux, dtype=float)
+    keep = np.isfinite(flux)
+    for _ in range(maxiters):
+        center = np.median(flux[keep])
+        std = np.std(flux[keep])
+        new_keep = np.isfinite(flux) & (np.abs(flux - center) <= sigma * std)
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    return keep
+
+
+def flatten_lightcurve(time, flux, flux_err=None, method="savgol", window_length=401,
+                       outlier_sigma=5, **kwargs):
+    """
+    Detrend a light curve and drop outliers, the shared replacement for
+    lc.flatten(window_length=401).remove_outliers(sigma=5).
+    Returns (time, flat_flux, flat_flux_err) with non-finite samples removed.
+    """
+    time = np.asarray(time, dtype=float)
+    flux = np.asarray(flux, dtype=float)
+    flat, trend = detrend(time, flux, method=method, window_length=window_length, **kwargs)
+
+    if flux_err is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            flat_err = np.asarray(flux_err, dtype=float) / trend
+    else:
+        flat_err = np.full(len(flat), np.nan)
+
+    keep = np.isfinite(time) & np.isfinite(flat)
+    if outlier_sigma:
+        keep &= outlier_mask(flat, sigma=outlier_sigma)
+    return time[keep], flat[keep], flat_err[keep]
+
+
+# ============================================================================
+# Phase folding
+# ============================================================================
+
+def _group_medians(bin_ids, values, n_groups, values_sorted=False):
+    """
+    Median of values per integer group id in one vectorized pass.
+    A single lexsort orders the samples by group and by value within each group;
+    each group's median is then the mean of its one or two middle elements.
+    If values are already ascending, a stable (radix) sort on the small-integer
+    group ids gives the same order without comparing the values again.
+    """
+    if values_sorted:
+        dtype = np.uint16 if n_groups <= np.iinfo(np.uint16).max else np.int64
+        order = np.argsort(bin_ids.astype(dtype), kind="stable")
+    else:
+        order = np.lexsort((values, bin_ids))
+    grouped = values[order]
+    counts = np.bincount(bin_ids, minlength=n_groups)
+    bounds = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    medians = np.full(n_groups, np.nan)
+    g = np.flatnonzero(counts)
+    lower = grouped[bounds[g] + (counts[g] - 1) // 2]
+    upper = grouped[bounds[g] + counts[g] // 2]
+    medians[g] = 0.5 * (lower + upper)
+    return medians
+
+
+def phase_fold(time, flux, periods, n_bins=200, epoch=0.0, max_chunk=4_000_000):
+    """
+    Fold a light curve at one or more periods and bin it in phase.
+    Phase is ((time - epoch) / period) % 1, as in the original chart code.
+    Bin statistics are computed with np.bincount reductions over all requested
+    periods at once (chunked to bound memory); medians come from one sort of the
+    flux plus a radix sort of the bin ids per chunk.
+    Returns a dict with 'phase' (bin centers) and (n_periods, n_bins) arrays
+    'mean', 'median', 'std' and 'count'.
+    """
+    time, flux = clean_series(time, flux)
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    if np.any(periods <= 0):
+        raise ValueError("Fold periods must be positive")
+
+    n, n_periods = len(time), len(periods)
+    count = np.zeros((n_periods, n_bins))
+    total = np.zeros((n_periods, n_bins))
+    total_sq = np.zeros((n_periods, n_bins))
+    median = np.full((n_periods, n_bins), np.nan)
+
+    # Center the flux so the sum-of-squares scatter does not lose precision. Samples
+    # are ordered by flux once, so every period's bins come out value-sorted for the medians
+    offset = np.median(flux) if n else 0.0
+    by_flux = np.argsort(flux)
+    time, centered = time[by_flux], flux[by_flux] - offset
+
+    chunk = max(1, max_chunk // max(n, 1))
+    for start in range(0, n_periods, chunk):
+        p = periods[start:start + chunk]
+        phase = np.mod((time[None, :] - epoch) / p[:, None], 1.0)
+        bins = np.minimum((phase * n_bins).astype(np.int64), n_bins - 1)
+        flat_ids = (bins + n_bins * np.arange(len(p))[:, None]).ravel()
+        size = len(p) * n_bins
+        # Period blocks follow each other in flat_ids, so the tiled values stay sorted per group
+        values = np.tile(centered, len(p))
+
+        count[start:start + len(p)] = np.bincount(flat_ids, minlength=size).reshape(len(p), n_bins)
+        total[start:start + len(p)] = np.bincount(flat_ids, weights=values, minlength=size).reshape(len(p), n_bins)
+        total_sq[start:start + len(p)] = np.bincount(flat_ids, weights=values ** 2, minlength=size).reshape(len(p), n_bins)
+        median[start:start + len(p)] = _group_medians(flat_ids, values, size, values_sorted=True).reshape(len(p), n_bins)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0.0))
+
+    return {
+        "periods": periods,
+        "phase": (np.arange(n_bins) + 0.5) / n_bins,
+        "mean": mean + offset,
+        "median": median + offset,
+        "std": std,
+        "count": count.astype(np.int64),
+    }
+
+
+def folded_records(folded, i=0):
+    """Chart records for the i-th period of a phase_fold result, skipping empty bins"""
+    filled = folded["count"][i] > 0
+    phase = folded["phase"][filled].tolist()
+    median = folded["median"][i][filled].tolist()
+    mean = folded["mean"][i][filled].tolist()
+    std = folded["std"][i][filled].tolist()
+    count = folded["count"][i][filled].tolist()
+    return [
+        {"phase": ph, "flux": md, "flux_mean": mn, "flux_std": sd, "count": c}
+        for ph, md, mn, sd, c in zip(phase, median, mean, std, count)
+    ]
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
@@ -6,24 +7,41 @@ import pandas as pd
 import numpy as np
 import io
 import json
+import asyncio
 from datetime import datetime
 
 # Import ML wrappers
 from ml_wrappers import (
-    load_k2_models,
-    load_tess_models,
     classify_k2_data,
     classify_tess_data,
     calculate_habitability_k2,
     calculate_habitability_tess,
     run_triceratops_fpp,
-    generate_charts_from_lightcurve
+    run_triceratops_fpp_batch,
+    classify_rows,
+    warm_explainers,
+    MODEL_TIERS,
+    MODEL_REGISTRY_DIR,
+    MODEL_RELOAD_INTERVAL,
+    generate_charts_from_lightcurve,
+    generate_archived_charts,
+    archived_charts_key
 )
+from api_responses import CompressionMiddleware, FastJSONResponse, cached_response
+from lightcurve_tools import DETRENDERS, DOWNSAMPLERS
+from progress import event_stream, get_job, start_job
+from model_registry import ModelRegistry, list_versions
+from publish_models import train_and_publish
+from results_store import ResultsStore, _number, target_id_of
+import profiling
+import tracing
+from tracing import span
 
 app = FastAPI(
     title="NASA Exoplanet Classification API",
     description="Backend API for ExoScope - Exoplanet Classification System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware for frontend connection
@@ -34,22 +52,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/zstd for bodies above RESPONSE_COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+# Per-request profiling for admins (X-Profile header); not installed unless PROFILING_TOKEN is set
+if profiling.PROFILING_TOKEN:
+    app.add_middleware(profiling.ProfilingMiddleware)
+# Trace ID per request (X-Trace-Id); requests over SLOW_REQUEST_MS go to the slow log
+app.add_middleware(tracing.TracingMiddleware)
 
-# Load models at startup
-k2_models = None
-tess_models = None
+# Versioned models; endpoints lease the live set, new versions are hot-swapped in
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR, poll_interval=MODEL_RELOAD_INTERVAL, warmup=warm_explainers)
+# Classification, habitability and FPP results, written in batches by a background thread
+results_store = ResultsStore()
 
 @app.on_event("startup")
 async def startup_event():
-    """Load ML models on startup"""
-    global k2_models, tess_models
+    """Load the latest published models, training and publishing them on first run"""
+    results_store.start()
     try:
-        k2_models = load_k2_models()
-        tess_models = load_tess_models()
+        missing = [dataset for dataset in ("k2", "tess") if not model_registry.load_latest(dataset)]
+        for dataset, version in train_and_publish(missing).items():
+            model_registry.load(dataset, version)
+        model_registry.start_watching()
         print("✓ Models loaded successfully")
     except Exception as e:
         print(f"⚠ Warning: Could not load all models: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write the results still queued"""
+    results_store.close()
+
 
 # ============================================================================
 # Request/Response Models
@@ -59,13 +92,20 @@ class ModelInfo(BaseModel):
     id: str
     name: str
     description: str
-    metrics: Dict[str, float]
+    metrics: Optional[Dict[str, float]] = None  # Cross-validated; None until evaluated
+    version: Optional[str] = None
 
 class ClassificationRequest(BaseModel):
     data: List[Dict[str, Any]]  # Accept any type (float, str, int, None)
     model_type: str  # 'random_forest' or 'mlp'
     dataset: str  # 'k2' or 'tess'
     threshold: Optional[float] = 0.5
+    model_tier: Optional[str] = "full"  # 'full' or 'fast' (small depth-limited forest)
+    chart_points: Optional[int] = 1000  # Max points per light-curve chart
+    detrend_method: Optional[str] = "savgol"  # 'savgol', 'median' or 'biweight'
+    fold_periods: Optional[List[float]] = None  # Candidate periods for the phase-folded chart
+    phase_bins: Optional[int] = 200
+    target_id: Optional[str] = None  # Results store key (default: pl_name, toi, tid, epic... of the first row)
 
 class ClassificationResponse(BaseModel):
     prediction: str
@@ -73,20 +113,55 @@ class ClassificationResponse(BaseModel):
     probabilities: Dict[str, float]
     explainability: Dict
     charts: Optional[Dict] = None
+    model_tier: Optional[str] = None
+    model_version: Optional[str] = None
+
+class LightCurveZoomRequest(BaseModel):
+    data: Optional[List[Dict[str, Any]]] = None  # Full-resolution light curve rows (time, flux)
+    epic: Optional[int] = None  # Or read the light curve from the local archive
+    t_min: Optional[float] = None
+    t_max: Optional[float] = None
+    max_points: Optional[int] = 1000
+    method: Optional[str] = "lttb"  # 'lttb' or 'minmax'
+    detrend_method: Optional[str] = "savgol"
 
 class HabitabilityRequest(BaseModel):
     planet_data: Dict[str, float]
     dataset: str  # 'k2' or 'tess'
+    target_id: Optional[str] = None
 
 class TriceratopsRequest(BaseModel):
     planet_data: Dict
     search_radius: Optional[int] = 10
+    adaptive: Optional[bool] = False  # Stop Monte Carlo sampling once NFPP is clearly decided
+    force: Optional[bool] = False  # Recompute even if a memoized result exists
+    target_id: Optional[str] = None
+
+class TriceratopsBatchRequest(BaseModel):
+    planets: List[Dict]
+    search_radius: Optional[int] = 10
+    adaptive: Optional[bool] = False
+    force: Optional[bool] = False
+    max_workers: Optional[int] = None  # Worker processes per host (default: CPU count)
+
+class BatchClassificationRequest(BaseModel):
+    data: List[Dict[str, Any]]
+    model_type: str  # 'random_forest' or 'mlp'
+    dataset: str  # 'k2' or 'tess'
+    chunk_size: Optional[int] = 500  # Rows per partial result event
+    model_tier: Optional[str] = "full"
 
 
 # ============================================================================
 # API Endpoints
 # ============================================================================
 
+def select_model(models, model_type, model_tier="full"):
+    """Model for a request; the fast tier swaps the full forest for the small one"""
+    if model_type == "random_forest":
+        return models["rf_fast"] if model_tier == "fast" else models["rf"]
+    return models["mlp"]
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -97,42 +172,94 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def live_model_info(model_id, name, description, dataset, key):
+    """
+    ModelInfo for a classifier from the live model set: cross-validated metrics
+    with serving latency and size, and the version
+    metrics is None until the live version has been evaluated (models not
+    loaded yet, or published before evaluation)
+    """
+    models = model_registry.get(dataset) or {}
+    evaluation = (models.get("evaluation") or {}).get(key) or {}
+    cv = evaluation.get("cv")
+    metrics = None
+    if cv:
+        metrics = {m: cv[m] for m in ("precision", "recall", "f1", "accuracy", "roc_auc")}
+        metrics.update({f"{m}_std": cv[f"{m}_std"] for m in ("precision", "recall", "f1")})
+        for stat in ("latency_ms", "batch_latency_ms", "size_bytes"):
+            if stat in evaluation:
+                metrics[stat] = float(evaluation[stat])
+    return {
+        "id": model_id,
+        "name": name,
+        "description": description,
+        "metrics": metrics,
+        "version": model_registry.version(dataset),
+    }
+
+def model_versions_key():
+    """Live model versions, which determine every model-describing response"""
+    return [model_registry.version("k2"), model_registry.version("tess")]
+
 @app.get("/api/models", response_model=List[ModelInfo])
-async def get_models():
-    """Get list of available classification models"""
+async def get_models(request: Request):
+    """Get list of available classification models (ETag keyed by the live model versions)"""
+    return cached_response(request, ("models", *model_versions_key()), build_models_list)
+
+def build_models_list():
     return [
-        {
-            "id": "random_forest_k2",
-            "name": "Random Forest (K2)",
-            "description": "Random Forest classifier trained on K2 mission data with SMOTE",
-            "metrics": {"precision": 0.91, "recall": 0.88, "f1": 0.89}
-        },
-        {
-            "id": "mlp_k2",
-            "name": "Neural Network (K2)",
-            "description": "Multi-layer Perceptron trained on K2 mission data",
-            "metrics": {"precision": 0.87, "recall": 0.85, "f1": 0.86}
-        },
-        {
-            "id": "random_forest_tess",
-            "name": "Random Forest (TESS)",
-            "description": "Random Forest classifier trained on TESS mission data with SMOTE",
-            "metrics": {"precision": 0.89, "recall": 0.86, "f1": 0.87}
-        },
-        {
-            "id": "mlp_tess",
-            "name": "Neural Network (TESS)",
-            "description": "Multi-layer Perceptron trained on TESS mission data",
-            "metrics": {"precision": 0.85, "recall": 0.83, "f1": 0.84}
-        },
+        live_model_info(
+            "random_forest_k2", "Random Forest (K2)",
+            "Random Forest classifier trained on K2 mission data with SMOTE", "k2", "rf"
+        ),
+        live_model_info(
+            "mlp_k2", "Neural Network (K2)",
+            "Multi-layer Perceptron trained on K2 mission data", "k2", "mlp"
+        ),
+        live_model_info(
+            "random_forest_tess", "Random Forest (TESS)",
+            "Random Forest classifier trained on TESS mission data with SMOTE", "tess", "rf"
+        ),
+        live_model_info(
+            "mlp_tess", "Neural Network (TESS)",
+            "Multi-layer Perceptron trained on TESS mission data", "tess", "mlp"
+        ),
         {
             "id": "triceratops",
             "name": "TRICERATOPS FPP",
             "description": "False Positive Probability analysis using TRICERATOPS",
-            "metrics": {"precision": 0.93, "recall": 0.90, "f1": 0.91}
+            "metrics": None  # Not evaluated against labeled data
         }
     ]
 
+@app.get("/api/models/registry")
+async def get_model_registry():
+    """Live and draining model versions, and the published versions per dataset"""
+    return {
+        **model_registry.status(),
+        "published": {
+            dataset: [f"v{v:04d}" for v in list_versions(str(MODEL_REGISTRY_DIR), dataset)]
+            for dataset in model_registry.datasets
+        },
+    }
+
+@app.post("/api/models/reload")
+async def reload_models():
+    """Load newly published versions now instead of waiting for the next poll"""
+    await asyncio.to_thread(model_registry.check_for_updates)
+    return model_registry.status()
+
+@app.get("/api/models/tiers")
+async def get_model_tiers(request: Request):
+    """
+    Fast vs full tier agreement, accuracy, latency and size, and the compact
+    forest sizes and errors, measured when the models were built
+    """
+    return cached_response(request, ("tiers", *model_versions_key()), lambda: {
+        name: {**models["tier_stats"], "compact": models["compact_stats"]} if models else None
+        for name, models in (("k2", model_registry.get("k2")), ("tess", model_registry.get("tess")))
+    })
+
 @app.post("/api/classify", response_model=ClassificationResponse)
 async def classify_lightcurve(request: ClassificationRequest):
     """
@@ -140,35 +267,61 @@ async def classify_lightcurve(request: ClassificationRequest):
     """
     try:
         # Convert data to DataFrame
-        df = pd.DataFrame(request.data)
+        with span("parse"):
+            df = pd.DataFrame(request.data)
+        tracing.note(rows=len(df), columns=len(df.columns), dataset=request.dataset,
+                     model_type=request.model_type, model_tier=request.model_tier)
         
-        print(f"Received {len(df)} rows with {len(df.columns)} columns")
-        print(f"Columns: {df.columns.tolist()[:10]}...")  # Print first 10 columns
-        print(f"Model: {request.model_type}, Dataset: {request.dataset}")
+        tracing.log(f"Received {len(df)} rows with {len(df.columns)} columns")
+        tracing.log(f"Columns: {df.columns.tolist()[:10]}...")  # Print first 10 columns
+        tracing.log(f"Model: {request.model_type}, Dataset: {request.dataset}")
         
-        # Check if models are loaded
-        if request.dataset == "k2" and k2_models is None:
-            raise HTTPException(status_code=503, detail="K2 models not loaded yet")
-        if request.dataset == "tess" and tess_models is None:
-            raise HTTPException(status_code=503, detail="TESS models not loaded yet")
+        if request.detrend_method not in DETRENDERS:
+            raise HTTPException(status_code=400, detail=f"Unknown detrending method '{request.detrend_method}'")
+        if request.model_tier not in MODEL_TIERS:
+            raise HTTPException(status_code=400, detail=f"Unknown model tier '{request.model_tier}'")
         
-        # Determine which model to use
-        if request.dataset == "k2":
-            if request.model_type == "random_forest":
-                result = classify_k2_data(df, k2_models["rf"], k2_models["scaler"], k2_models["features"])
-            else:  # mlp
-                result = classify_k2_data(df, k2_models["mlp"], k2_models["scaler"], k2_models["features"])
-        else:  # tess
-            if request.model_type == "random_forest":
-                result = classify_tess_data(df, tess_models["rf"], tess_models["scaler"], tess_models["features"])
-            else:  # mlp
-                result = classify_tess_data(df, tess_models["mlp"], tess_models["scaler"], tess_models["features"])
+        # Hold the live model set for the whole request, even if a new version is swapped in
+        with model_registry.use(request.dataset) as models:
+            # Check if models are loaded
+            if models is None:
+                raise HTTPException(status_code=503, detail=f"{request.dataset.upper()} models not loaded yet")
+            
+            # Determine which model to use
+            model = select_model(models, request.model_type, request.model_tier)
+            with span("classify"):
+                if request.dataset == "k2":
+                    result = classify_k2_data(df, model, models["scaler"], models["features"])
+                else:  # tess
+                    result = classify_tess_data(df, model, models["scaler"], models["features"])
+            result["model_version"] = models.get("version")
+        tracing.note(model_version=result["model_version"])
+        result["model_tier"] = request.model_tier
+        results_store.record(
+            "classification",
+            target_id=target_id_of(request.data[0] if request.data else {}, request.target_id),
+            dataset=request.dataset,
+            model_version=result["model_version"],
+            model_type=request.model_type,
+            prediction=result["prediction"],
+            score=result["probabilities"]["confirmed"],
+            payload={"model_tier": request.model_tier, "confidence": result["confidence"]}
+        )
         
         # Generate charts if light curve data is available
-        charts = generate_charts_from_lightcurve(df)
+        with span("charts"):
+            charts = generate_charts_from_lightcurve(
+                df,
+                max_points=request.chart_points,
+                detrend_method=request.detrend_method,
+                fold_periods=request.fold_periods,
+                phase_bins=request.phase_bins
+            )
         result["charts"] = charts
         
-        return result
+        # Rendered directly (orjson), skipping the jsonable_encoder pass over the chart arrays
+        with span("render"):
+            return FastJSONResponse(result)
         
     except HTTPException:
         raise
@@ -184,8 +337,11 @@ async def upload_lightcurve(file: UploadFile = File(...)):
     """
     try:
         # Read the file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        with span("read"):
+            contents = await file.read()
+        with span("parse_csv"):
+            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        tracing.note(file_bytes=len(contents), rows=len(df), columns=len(df.columns))
         
         # Determine data type
         has_lightcurve = 'time' in df.columns and 'flux' in df.columns
@@ -197,25 +353,79 @@ async def upload_lightcurve(file: UploadFile = File(...)):
                 detail=f"Unrecognized data format. Found columns: {list(df.columns)[:10]}..."
             )
         
-        # Convert to dict format
-        data = df.head(1000).to_dict('records')  # Limit to 1000 rows for performance
+        # Every row: /api/classify downsamples the whole series (LTTB) and zooms at full resolution
+        with span("to_records"):
+            data = df.to_dict('records')
         
         data_type = "lightcurve" if has_lightcurve else "exoplanet_parameters"
         
-        return {
-            "success": True,
-            "headers": list(df.columns),
-            "data": data,
-            "rows": len(data),
-            "dataType": data_type,
-            "message": f"Successfully parsed {len(data)} rows of {data_type}"
-        }
+        with span("render"):
+            return FastJSONResponse({
+                "success": True,
+                "headers": list(df.columns),
+                "data": data,
+                "rows": len(data),
+                "dataType": data_type,
+                "message": f"Successfully parsed {len(data)} rows of {data_type}"
+            })
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.post("/api/lightcurve/zoom")
+async def zoom_lightcurve(request: LightCurveZoomRequest):
+    """
+    Re-downsample a time window of a light curve at full resolution
+    """
+    if request.method not in DOWNSAMPLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown downsampling method '{request.method}'")
+    if request.detrend_method not in DETRENDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown detrending method '{request.detrend_method}'")
+    
+    chart_options = dict(
+        max_points=request.max_points,
+        time_range=(request.t_min, request.t_max),
+        method=request.method,
+        detrend_method=request.detrend_method
+    )
+    if request.epic is not None:
+        charts = generate_archived_charts(request.epic, **chart_options)
+        if charts is None:
+            raise HTTPException(status_code=404, detail=f"EPIC {request.epic} is not in the light curve archive")
+    else:
+        charts = generate_charts_from_lightcurve(pd.DataFrame(request.data or []), **chart_options)
+    if not charts:
+        raise HTTPException(status_code=400, detail="Light curve data must include 'time' and 'flux' columns")
+    
+    return FastJSONResponse({
+        "raw": charts["raw"],
+        "detrended": charts["detrended"],
+        "range": {"t_min": request.t_min, "t_max": request.t_max}
+    })
+
+@app.get("/api/lightcurve/archive/{epic}")
+async def get_archived_lightcurve(request: Request, epic: int, max_points: int = 1000,
+                                  detrend_method: str = "savgol"):
+    """
+    Chart data for an EPIC light curve from the local archive (no MAST download)
+    ETag keyed by the archived light curve and the chart options
+    """
+    if detrend_method not in DETRENDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown detrending method '{detrend_method}'")
+    
+    stamp = archived_charts_key(epic)
+    if stamp is None:
+        raise HTTPException(status_code=404, detail=f"EPIC {epic} is not in the light curve archive")
+    
+    def build():
+        charts = generate_archived_charts(epic, max_points=max_points, detrend_method=detrend_method)
+        if charts is None:
+            raise HTTPException(status_code=404, detail=f"EPIC {epic} is not in the light curve archive")
+        return {"epic": epic, "charts": charts}
+    return cached_response(request, ("archive", epic, stamp, max_points, detrend_method), build)
+
 @app.post("/api/habitability")
 async def calculate_habitability(request: HabitabilityRequest):
     """
@@ -226,6 +436,12 @@ async def calculate_habitability(request: HabitabilityRequest):
             score = calculate_habitability_k2(request.planet_data)
         else:
             score = calculate_habitability_tess(request.planet_data)
+        results_store.record(
+            "habitability",
+            target_id=target_id_of(request.planet_data, request.target_id),
+            dataset=request.dataset,
+            habitability=score
+        )
         
         return {
             "habitability_score": score,
@@ -240,35 +456,324 @@ async def calculate_habitability(request: HabitabilityRequest):
 async def analyze_triceratops(request: TriceratopsRequest):
     """
     Run TRICERATOPS False Positive Probability analysis
-    Note: This is a computationally expensive operation
+    Note: This is a computationally expensive operation; it runs in a worker
+    thread so the event loop keeps serving other requests and event streams
     """
     try:
-        fpp, nfpp = run_triceratops_fpp(
+        fpp, nfpp, precision = await asyncio.to_thread(
+            run_triceratops_fpp,
             request.planet_data,
-            search_radius=request.search_radius
+            search_radius=request.search_radius,
+            adaptive=request.adaptive,
+            force=request.force
         )
+        record_fpp(request.planet_data, fpp, nfpp, precision, request.target_id)
+        return fpp_summary(fpp, nfpp, precision)
         
-        is_planet = nfpp < 0.1 if nfpp != "Nan" else None
-        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"TRICERATOPS analysis failed: {str(e)}")
+
+def record_fpp(planet, fpp, nfpp, precision, target_id=None):
+    """Store an FPP result (the TRICERATOPS pipeline runs on K2 targets)"""
+    results_store.record(
+        "fpp",
+        target_id=target_id_of(planet, target_id),
+        dataset=planet.get("dataset", "k2"),
+        fpp=fpp,
+        nfpp=nfpp,
+        payload={"precision": precision}
+    )
+
+def fpp_summary(fpp, nfpp, precision):
+    """Response fields for one FPP result (failed runs report NFPP "Nan", None or NaN)"""
+    value = _number(nfpp)
+    is_planet = value < 0.1 if value is not None else None
+    return {
+        "FPP": fpp,
+        "NFPP": nfpp,
+        "is_confirmed_planet": is_planet,
+        "threshold": 0.1,
+        "precision": precision,
+        "cached": bool(precision and precision.get("cached")),
+        "message": "Planet confirmed" if is_planet else "Not a planet" if is_planet is False else "Analysis failed"
+    }
+
+@app.post("/api/triceratops/batch")
+async def analyze_triceratops_batch(request: TriceratopsBatchRequest):
+    """
+    Run TRICERATOPS FPP analysis for several candidates
+    Candidates orbiting the same host share one target and light curve
+    Runs in a worker thread, off the event loop
+    """
+    if not request.planets:
+        raise HTTPException(status_code=400, detail="No planets provided")
+    try:
+        results = await asyncio.to_thread(
+            run_triceratops_fpp_batch,
+            request.planets,
+            search_radius=request.search_radius,
+            adaptive=request.adaptive,
+            force=request.force,
+            max_workers=request.max_workers
+        )
+        for planet, result in zip(request.planets, results):
+            record_fpp(planet, *result)
+
         return {
-            "FPP": fpp,
-            "NFPP": nfpp,
-            "is_confirmed_planet": is_planet,
-            "threshold": 0.1,
-            "message": "Planet confirmed" if is_planet else "Not a planet" if is_planet is False else "Analysis failed"
+            "results": [
+                {"pl_name": planet.get("pl_name"), "hostname": planet.get("hostname"), **fpp_summary(*result)}
+                for planet, result in zip(request.planets, results)
+            ],
+            "n_hosts": len({planet.get("hostname") for planet in request.planets})
         }
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"TRICERATOPS analysis failed: {str(e)}")
 
+# ============================================================================
+# Background jobs with progress streaming
+# ============================================================================
+
+def job_response(job):
+    tracing.note(job_id=job.id)
+    return {"job_id": job.id, "status": job.status, "events_url": f"/api/jobs/{job.id}/events"}
+
+def triceratops_job(request, progress):
+    fpp, nfpp, precision = run_triceratops_fpp(
+        request.planet_data,
+        search_radius=request.search_radius,
+        adaptive=request.adaptive,
+        force=request.force,
+        progress=progress
+    )
+    record_fpp(request.planet_data, fpp, nfpp, precision, request.target_id)
+    return fpp_summary(fpp, nfpp, precision)
+
+def triceratops_batch_job(request, progress):
+    results = run_triceratops_fpp_batch(
+        request.planets,
+        search_radius=request.search_radius,
+        adaptive=request.adaptive,
+        force=request.force,
+        max_workers=request.max_workers,
+        progress=progress
+    )
+    for planet, result in zip(request.planets, results):
+        record_fpp(planet, *result)
+    return {
+        "results": [
+            {"pl_name": planet.get("pl_name"), "hostname": planet.get("hostname"), **fpp_summary(*result)}
+            for planet, result in zip(request.planets, results)
+        ]
+    }
+
+def classify_job(request, progress):
+    # The job keeps its model version leased until the last chunk is classified
+    with model_registry.use(request.dataset) as models:
+        if models is None:
+            raise RuntimeError(f"{request.dataset.upper()} models not loaded")
+        model = select_model(models, request.model_type, request.model_tier)
+        tracing.note(rows=len(request.data), dataset=request.dataset, model_type=request.model_type,
+                     model_version=models.get("version"))
+        with span("classify", chunk_size=request.chunk_size):
+            predictions = classify_rows(
+                pd.DataFrame(request.data), model, models["scaler"], models["features"],
+                chunk_size=max(1, request.chunk_size), progress=progress
+            )
+        for row, prediction in zip(request.data, predictions):
+            results_store.record(
+                "classification",
+                target_id=target_id_of(row),
+                dataset=request.dataset,
+                model_version=models.get("version"),
+                model_type=request.model_type,
+                prediction=prediction["prediction"],
+                score=prediction["probabilities"]["confirmed"],
+                payload={"model_tier": request.model_tier, "confidence": prediction["confidence"], "job": True}
+            )
+        return predictions
+
+@app.post("/api/jobs/triceratops")
+async def start_triceratops_job(request: TriceratopsRequest):
+    """
+    Start TRICERATOPS FPP analysis in the background
+    Follow progress at /api/jobs/{job_id}/events
+    """
+    return job_response(start_job("triceratops", triceratops_job, request))
+
+@app.post("/api/jobs/triceratops/batch")
+async def start_triceratops_batch_job(request: TriceratopsBatchRequest):
+    """Start multi-candidate TRICERATOPS analysis in the background"""
+    if not request.planets:
+        raise HTTPException(status_code=400, detail="No planets provided")
+    return job_response(start_job("triceratops_batch", triceratops_batch_job, request))
+
+@app.post("/api/jobs/classify")
+async def start_classification_job(request: BatchClassificationRequest):
+    """
+    Classify every row of a catalog in the background
+    Each chunk's predictions are streamed as a "partial" event
+    """
+    if request.dataset not in ("k2", "tess"):
+        raise HTTPException(status_code=400, detail=f"Unknown dataset '{request.dataset}'")
+    if model_registry.get(request.dataset) is None:
+        raise HTTPException(status_code=503, detail=f"{request.dataset.upper()} models not loaded yet")
+    if not request.data:
+        raise HTTPException(status_code=400, detail="No data provided")
+
+    if request.model_tier not in MODEL_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown model tier '{request.model_tier}'")
+
+    return job_response(start_job("classify", classify_job, request))
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Current status, last event and (when finished) result of a job"""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.snapshot()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of a job's progress
+    Reconnecting clients send Last-Event-ID and resume after that event
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    try:
+        start = int(last_event_id) if last_event_id is not None else -1
+    except ValueError:
+        start = -1
+    return StreamingResponse(
+        event_stream(job, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================================================
+# Stored results
+# ============================================================================
+
+@app.get("/api/results")
+async def query_results(
+    view: str = "targets",
+    target_id: Optional[str] = None,
+    dataset: Optional[str] = None,
+    model_version: Optional[str] = None,
+    prediction: Optional[str] = None,
+    kind: Optional[str] = None,
+    model_type: Optional[str] = None,
+    score_min: Optional[float] = None,
+    score_max: Optional[float] = None,
+    habitability_min: Optional[float] = None,
+    habitability_max: Optional[float] = None,
+    fpp_min: Optional[float] = None,
+    fpp_max: Optional[float] = None,
+    nfpp_min: Optional[float] = None,
+    nfpp_max: Optional[float] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Query stored results
+    view "targets" has the latest score, habitability, FPP and NFPP of each
+    target; view "results" has every result (kind: classification,
+    habitability or fpp). E.g. ?nfpp_max=0.1&habitability_min=0.5&sort=nfpp&order=asc
+    """
+    filters = {
+        "target_id": target_id, "dataset": dataset, "model_version": model_version, "prediction": prediction,
+        "score_min": score_min, "score_max": score_max, "habitability_min": habitability_min,
+        "habitability_max": habitability_max, "fpp_min": fpp_min, "fpp_max": fpp_max,
+        "nfpp_min": nfpp_min, "nfpp_max": nfpp_max, "since": since, "until": until,
+    }
+    if view == "results":
+        filters.update(kind=kind, model_type=model_type)
+    elif kind or model_type:
+        raise HTTPException(status_code=400, detail="kind and model_type filter the 'results' view only")
+    try:
+        rows, total = await asyncio.to_thread(results_store.query, view, filters, sort, order, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"view": view, "total": total, "limit": limit, "offset": offset, "results": rows}
+
+@app.get("/api/results/status")
+async def results_status():
+    """Results store location, queued and written results"""
+    return results_store.status()
+
+# ============================================================================
+# Profiling (admin only, enabled by PROFILING_TOKEN)
+# ============================================================================
+
+def require_admin(x_admin_token: Optional[str]):
+    if not profiling.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_TOKEN)")
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid X-Admin-Token")
+
+@app.post("/api/admin/profiles/capture")
+async def capture_profile(
+    seconds: float = Query(10, gt=0, le=profiling.MAX_CAPTURE_SECONDS),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample every thread of the API process for a number of seconds; the profile is stored when it ends"""
+    require_admin(x_admin_token)
+    profile_id = profiling.capture(seconds)
+    return {"id": profile_id, "status": "running", "seconds": seconds}
+
+@app.get("/api/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Stored request profiles and process captures, newest first"""
+    require_admin(x_admin_token)
+    return {"profiles": await asyncio.to_thread(profiling.list_profiles)}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """A profile's metadata and hottest functions"""
+    require_admin(x_admin_token)
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    with open(path) as f:
+        return json.load(f)
+
+@app.get("/api/admin/profiles/{profile_id}/collapsed")
+async def get_profile_collapsed(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Collapsed stacks of a profile, for flamegraph.pl, speedscope or inferno"""
+    require_admin(x_admin_token)
+    path = profiling.profile_path(profile_id, "collapsed.txt")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile, or capture still running")
+    return PlainTextResponse(path.read_text())
+
+@app.get("/api/admin/profiles/{profile_id}/pstats")
+async def get_profile_pstats(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """cProfile statistics of a cprofile-mode request (for pstats, snakeviz)"""
+    require_admin(x_admin_token)
+    path = profiling.profile_path(profile_id, "profile.prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="No cProfile statistics for this profile")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
 @app.get("/api/health")
 async def health_check():
     """Check if models are loaded and ready"""
     return {
         "status": "healthy",
         "models_loaded": {
-            "k2": k2_models is not None,
-            "tess": tess_models is not None
+            "k2": model_registry.get("k2") is not None,
+            "tess": model_registry.get("tess") is not None
+        },
+        "model_versions": {
+            "k2": model_registry.version("k2"),
+            "tess": model_registry.version("tess")
         },
         "timestamp": datetime.utcnow().isoformat()
     }
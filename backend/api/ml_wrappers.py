@@ -13,141 +13,44 @@ backend_path = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_path / "RF & MLP Classifiers"))
 sys.path.insert(0, str(backend_path / "TRICERATOPS" / "model"))
 
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.neural_network import MLPClassifier
-from sklearn.preprocessing import StandardScaler
-from imblearn.over_sampling import SMOTE
-from sklearn.model_selection import train_test_split
+from lightcurve_tools import clean_series, detrend, downsample, folded_records, phase_fold, to_records
+from lightcurve_archive import RAW_VARIANT, lightcurve_stamp, load_lightcurve
+from explain import explain_row, global_importance
+from training import train_models
+import tracing
+from tracing import span
+
+# Local memory-mapped light curve archive shared by the FPP pipeline and the charts
+LC_ARCHIVE_DIR = backend_path.parent / "model" / "data" / "lc_archive"
+# Normalized TRICERATOPS star tables, reused across FPP runs on the same EPIC
+STAR_CACHE_DIR = backend_path.parent / "model" / "data" / "star_tables"
+# Memoized (FPP, NFPP) results keyed by target, period and search settings
+FPP_RESULT_DIR = backend_path.parent / "model" / "data" / "fpp_results"
+
+# Published model versions served (and hot-reloaded) by the API
+MODEL_REGISTRY_DIR = backend_path.parent / "model" / "data" / "registry"
+# Seconds between checks for newly published versions (0 disables the watcher)
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", "30"))
+
+# Serving tiers: "full" is the 100-tree forest, "fast" a small depth-limited forest
+# for interactive requests (the MLP is served as-is in both tiers)
+MODEL_TIERS = {"fast", "full"}
 
 
 def load_k2_models():
     """
-    Load and train K2 models using the existing logic from final_models_k2.py
+    Train the K2 models (training.train_models with the K2 mission schema)
     Returns dict with trained models, scaler, and features
     """
-    # Load data
-    csv_path = backend_path / "RF & MLP Classifiers" / "data" / "k2.csv"
-    df = pd.read_csv(csv_path)
-    
-    # Encode disposition (same logic as original)
-    def encode_disposition(x):
-        if x == "CONFIRMED":
-            return 1
-        elif x in ["FALSE POSITIVE", "REFUTED"]:
-            return 0
-        else:
-            return -1
-    
-    df['target'] = df['disposition'].apply(encode_disposition)
-    labeled = df[df['target'] != -1]
-    
-    # Define features to ignore (same as original)
-    ignore = [
-        'disposition', 'target', 'pl_name', 'kepid', 'kepoi_name', 'kepler_name', 'hostname', 'toi', 'tid',
-        'sy_pnum', 'default_flag', 'disp_refname', 'pl_refname', 'st_refname', 'sy_refname', 'pl_bmassprov',
-        'rastr', 'decstr', 'rowupdate', 'pl_pubdate', 'releasedate', 'soltype', 'pl_controv_flag', 'ttv_flag',
-        'sy_snum', 'discoverymethod', 'disc_facility', 'st_spectype'
-    ]
-    ignore += [col for col in df.columns if col.endswith('lim') or col.endswith('refname')]
-    features = [c for c in df.columns if c not in ignore and pd.api.types.is_numeric_dtype(df[c])]
-    
-    # Prepare data
-    X_labeled = labeled[features].fillna(labeled[features].median())
-    y = labeled['target']
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_labeled_scaled = scaler.fit_transform(X_labeled)
-    
-    # Train/test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_labeled_scaled, y, test_size=0.2, stratify=y, random_state=42
-    )
-    
-    # Train Random Forest with SMOTE
-    smote = SMOTE(random_state=42)
-    X_train_smote, y_train_smote = smote.fit_resample(X_train, y_train)
-    rf_clf = RandomForestClassifier(n_estimators=100, random_state=42)
-    rf_clf.fit(X_train_smote, y_train_smote)
-    
-    # Train MLP without SMOTE
-    mlp_clf = MLPClassifier(random_state=42, max_iter=500)
-    mlp_clf.fit(X_train, y_train)
-    
-    return {
-        "rf": rf_clf,
-        "mlp": mlp_clf,
-        "scaler": scaler,
-        "features": features,
-        "feature_names": X_labeled.columns.tolist(),
-        "median_values": labeled[features].median()
-    }
+    return train_models("k2")
 
 
 def load_tess_models():
     """
-    Load and train TESS models using the existing logic from final_models_tess.py
+    Train the TESS models (training.train_models with the TESS mission schema)
     Returns dict with trained models, scaler, and features
     """
-    # Load data
-    csv_path = backend_path / "RF & MLP Classifiers" / "data" / "tess.csv"
-    df = pd.read_csv(csv_path)
-    
-    # Encode disposition (same logic as original)
-    def encode_disposition(x):
-        if x == "CP":
-            return 1
-        elif x in ["FP", "AFP"]:
-            return 0
-        else:
-            return -1
-    
-    df['target'] = df['tfopwg_disp'].apply(encode_disposition)
-    labeled = df[df['target'] != -1].copy()
-    
-    # Exclude unwanted columns
-    ignore = ['toi', 'tid', 'tfopwg_disp', 'toi_created', 'rowupdate', 'rastr', 'decstr', 'ra', 'dec', 'target']
-    ignore += [col for col in df.columns if col.endswith('err1') or col.endswith('err2') or col.endswith('lim')]
-    
-    features = [c for c in df.columns if c not in ignore and pd.api.types.is_numeric_dtype(df[c])]
-    
-    # Prepare feature data
-    X_labeled = labeled[features].copy()
-    y = labeled['target'].copy()
-    
-    # Replace zeros with NaN
-    X_labeled.replace(0, pd.NA, inplace=True)
-    
-    # Drop rows with missing values
-    X_labeled.dropna(inplace=True)
-    y = y.loc[X_labeled.index]
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_labeled_scaled = scaler.fit_transform(X_labeled)
-    
-    # Train/test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_labeled_scaled, y, test_size=0.2, stratify=y, random_state=42
-    )
-    
-    # Train Random Forest with SMOTE
-    smote = SMOTE(random_state=42)
-    X_train_smote, y_train_smote = smote.fit_resample(X_train, y_train)
-    rf_clf = RandomForestClassifier(n_estimators=100, random_state=42)
-    rf_clf.fit(X_train_smote, y_train_smote)
-    
-    # Train MLP without SMOTE
-    mlp_clf = MLPClassifier(random_state=42, max_iter=500)
-    mlp_clf.fit(X_train, y_train)
-    
-    return {
-        "rf": rf_clf,
-        "mlp": mlp_clf,
-        "scaler": scaler,
-        "features": features,
-        "feature_names": X_labeled.columns.tolist()
-    }
+    return train_models("tess")
 
 
 def classify_k2_data(df, model, scaler, features):
@@ -155,41 +58,38 @@ def classify_k2_data(df, model, scaler, features):
     Classify K2 data using trained model
     """
     try:
-        # Convert all numeric columns that might be strings
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except:
-                    pass
+        with span("features"):
+            # Convert all numeric columns that might be strings
+            for col in df.columns:
+                if df[col].dtype == 'object':
+                    try:
+                        df[col] = pd.to_numeric(df[col], errors='coerce')
+                    except:
+                        pass
         
-        # Ensure all required features are present
-        for feature in features:
-            if feature not in df.columns:
-                df[feature] = 0  # Default value
+            # Ensure all required features are present
+            for feature in features:
+                if feature not in df.columns:
+                    df[feature] = 0  # Default value
         
-        # Select and order features correctly
-        X = df[features].fillna(0)
+            # Select and order features correctly
+            X = df[features].fillna(0)
         
-        # Replace any remaining non-numeric values
-        X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
+            # Replace any remaining non-numeric values
+            X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
         
         # Scale features
-        X_scaled = scaler.transform(X)
-        
-        # Predict - take first row if multiple rows
-        prediction = model.predict(X_scaled)[0]
-        probabilities = model.predict_proba(X_scaled)[0]
+        with span("predict"):
+            X_scaled = scaler.transform(X)
+            
+            # Predict - take first row if multiple rows
+            prediction = model.predict(X_scaled)[0]
+            probabilities = model.predict_proba(X_scaled)[0]
         
-        # Get feature importance for explainability
-        if hasattr(model, 'feature_importances_'):
-            importances = model.feature_importances_
-            feature_importance = [
-                {"feature": name, "importance": float(imp)}
-                for name, imp in sorted(zip(features, importances), key=lambda x: x[1], reverse=True)[:8]
-            ]
-        else:
-            feature_importance = []
+        # Global importances (cached per model) and what drove this row
+        with span("explain"):
+            feature_importance = global_importance(model, features)
+            row_explanation = explain_row(model, X_scaled, X.values, features)
         
         return {
             "prediction": "Confirmed" if prediction == 1 else "Not a Planet",
@@ -201,11 +101,12 @@ def classify_k2_data(df, model, scaler, features):
             },
             "explainability": {
                 "featureImportance": feature_importance,
-                "rationale": generate_rationale(prediction, df)
+                "rationale": generate_rationale(prediction, df, row_explanation),
+                **row_explanation
             }
         }
     except Exception as e:
-        print(f"Error in classify_k2_data: {e}")
+        tracing.log(f"Error in classify_k2_data: {e}")
         import traceback
         traceback.print_exc()
         raise
@@ -216,41 +117,38 @@ def classify_tess_data(df, model, scaler, features):
     Classify TESS data using trained model
     """
     try:
-        # Convert all numeric columns that might be strings
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except:
-                    pass
+        with span("features"):
+            # Convert all numeric columns that might be strings
+            for col in df.columns:
+                if df[col].dtype == 'object':
+                    try:
+                        df[col] = pd.to_numeric(df[col], errors='coerce')
+                    except:
+                        pass
         
-        # Ensure all required features are present
-        for feature in features:
-            if feature not in df.columns:
-                df[feature] = 0
+            # Ensure all required features are present
+            for feature in features:
+                if feature not in df.columns:
+                    df[feature] = 0
         
-        # Select and order features correctly
-        X = df[features].fillna(0)
+            # Select and order features correctly
+            X = df[features].fillna(0)
         
-        # Replace any remaining non-numeric values
-        X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
+            # Replace any remaining non-numeric values
+            X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
         
         # For TESS, don't drop zeros - just use the data as is
-        X_scaled = scaler.transform(X)
-        
-        # Predict - take first row if multiple rows
-        prediction = model.predict(X_scaled)[0]
-        probabilities = model.predict_proba(X_scaled)[0]
+        with span("predict"):
+            X_scaled = scaler.transform(X)
+            
+            # Predict - take first row if multiple rows
+            prediction = model.predict(X_scaled)[0]
+            probabilities = model.predict_proba(X_scaled)[0]
         
-        # Get feature importance for explainability
-        if hasattr(model, 'feature_importances_'):
-            importances = model.feature_importances_
-            feature_importance = [
-                {"feature": name, "importance": float(imp)}
-                for name, imp in sorted(zip(features, importances), key=lambda x: x[1], reverse=True)[:8]
-            ]
-        else:
-            feature_importance = []
+        # Global importances (cached per model) and what drove this row
+        with span("explain"):
+            feature_importance = global_importance(model, features)
+            row_explanation = explain_row(model, X_scaled, X.values, features)
         
         return {
             "prediction": "Confirmed" if prediction == 1 else "Not a Planet",
@@ -262,26 +160,82 @@ def classify_tess_data(df, model, scaler, features):
             },
             "explainability": {
                 "featureImportance": feature_importance,
-                "rationale": generate_rationale(prediction, df)
+                "rationale": generate_rationale(prediction, df, row_explanation),
+                **row_explanation
             }
         }
     except Exception as e:
-        print(f"Error in classify_tess_data: {e}")
+        tracing.log(f"Error in classify_tess_data: {e}")
         import traceback
         traceback.print_exc()
         raise
 
 
-def generate_rationale(prediction, df):
+def classify_rows(df, model, scaler, features, chunk_size=500, progress=None):
+    """
+    Classify every row of df (classify_k2_data/classify_tess_data only score
+    the first), chunk_size rows at a time
+    progress receives a "partial" event with each chunk's predictions
+    Returns a list of per-row prediction dicts
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    X = df.reindex(columns=features).apply(pd.to_numeric, errors='coerce').fillna(0)
+    X_scaled = scaler.transform(X)
+
+    predictions = []
+    for start in range(0, len(X_scaled), chunk_size):
+        probabilities = model.predict_proba(X_scaled[start:start + chunk_size])
+        chunk = [
+            {
+                "row": start + i,
+                "prediction": "Confirmed" if model.classes_[p.argmax()] == 1 else "Not a Planet",
+                "confidence": float(p.max()),
+                "probabilities": {
+                    "confirmed": float(p[1]) if len(p) > 1 else 0.0,
+                    "candidate": 0.0,
+                    "notPlanet": float(p[0])
+                }
+            }
+            for i, p in enumerate(probabilities)
+        ]
+        predictions.extend(chunk)
+        if progress is not None:
+            progress("partial", rows_done=len(predictions), n_rows=len(X_scaled), predictions=chunk)
+    return predictions
+
+
+def warm_explainers(models, rows):
+    """Fill the per-model explanation caches before a model set goes live"""
+    for key in ("rf", "rf_fast", "mlp"):
+        if key in models:
+            global_importance(models[key], models["features"])
+            explain_row(models[key], rows, rows, models["features"])
+
+
+def generate_rationale(prediction, df, explanation=None):
     """Generate human-readable rationale for classification"""
     rationale = []
     
     if prediction == 1:
         rationale.append("Model detected transit-like signal patterns")
-        rationale.append("Feature analysis suggests planetary characteristics")
     else:
         rationale.append("Signal characteristics inconsistent with transiting planet")
-        rationale.append("May be stellar activity or instrumental artifact")
+    
+    # Name the inputs that moved this prediction the most
+    drivers = [c for c in (explanation or {}).get("contributions", []) if abs(c["contribution"]) >= 0.01][:3]
+    for c in drivers:
+        direction = "raised" if c["contribution"] > 0 else "lowered"
+        rationale.append(
+            f"{c['feature']} = {c['value']:.4g} {direction} the planet probability by {abs(c['contribution']):.2f}"
+        )
+    if not drivers:
+        if prediction == 1:
+            rationale.append("Feature analysis suggests planetary characteristics")
+        else:
+            rationale.append("May be stellar activity or instrumental artifact")
     
     return rationale
 
@@ -321,10 +275,14 @@ def calculate_habitability_tess(planet_data):
     return score
 
 
-def run_triceratops_fpp(planet_data, search_radius=10):
+def run_triceratops_fpp(planet_data, search_radius=10, adaptive=False, force=False, progress=None):
     """
     Run TRICERATOPS FPP analysis
     Note: This wraps the existing TRICERATOPS logic
+    adaptive stops sampling once NFPP is clearly on one side of the threshold;
+    results are memoized on disk and force recomputes them
+    progress receives stage and calc_probs scenario events
+    Returns (FPP, NFPP, precision)
     """
     try:
         # Import the TRICERATOPS module
@@ -332,63 +290,148 @@ def run_triceratops_fpp(planet_data, search_radius=10):
         
         # Convert dict to pandas Series
         planet_series = pd.Series(planet_data)
+        tracing.note(hostname=planet_data.get("hostname"), pl_orbper=planet_data.get("pl_orbper"),
+                     adaptive=adaptive, force=force)
         
         # Run FPP analysis
-        FPP, NFPP = run_fpp_for_planet(
+        FPP, NFPP, precision = run_fpp_for_planet(
             planet_series,
             csv_base_path=str(backend_path / "RF & MLP Classifiers" / "data" / "k2.csv"),
             k2_lc_cache_dir=str(backend_path.parent / "model" / "data" / "k2_lk"),
             trilegal_cache_dir=str(backend_path.parent / "model" / "data" / "trilegal"),
-            search_radius=search_radius
+            search_radius=search_radius,
+            lc_archive_dir=str(LC_ARCHIVE_DIR),
+            star_cache_dir=str(STAR_CACHE_DIR),
+            adaptive=adaptive,
+            return_precision=True,
+            result_cache_dir=str(FPP_RESULT_DIR),
+            force=force,
+            progress=progress
         )
         
-        return FPP, NFPP
+        return FPP, NFPP, precision
     except Exception as e:
-        print(f"TRICERATOPS error: {e}")
-        return None, None
+        tracing.log(f"TRICERATOPS error: {e}")
+        return None, None, None
 
 
-def generate_charts_from_lightcurve(df):
+def run_triceratops_fpp_batch(planets_data, search_radius=10, adaptive=False, force=False,
+                              max_workers=None, progress=None):
+    """
+    Run TRICERATOPS FPP analysis for several candidates at once
+    Candidates sharing a hostname are evaluated against one target, star table
+    and light curve, with their periods run in parallel
+    progress receives host, stage and per-candidate result events
+    Returns a list of (FPP, NFPP, precision) in input order
+    """
+    try:
+        from triceratops_model import run_fpp_for_planets
+
+        tracing.note(candidates=len(planets_data), hosts=len({p.get("hostname") for p in planets_data}),
+                     adaptive=adaptive, force=force)
+        results = run_fpp_for_planets(
+            pd.DataFrame(planets_data),
+            max_workers=max_workers,
+            k2_lc_cache_dir=str(backend_path.parent / "model" / "data" / "k2_lk"),
+            trilegal_cache_dir=str(backend_path.parent / "model" / "data" / "trilegal"),
+            search_radius=search_radius,
+            lc_archive_dir=str(LC_ARCHIVE_DIR),
+            star_cache_dir=str(STAR_CACHE_DIR),
+            adaptive=adaptive,
+            result_cache_dir=str(FPP_RESULT_DIR),
+            force=force,
+            progress=progress
+        )
+
+        return list(zip(results["FPP"], results["NFPP"], results["precision"]))
+    except Exception as e:
+        tracing.log(f"TRICERATOPS error: {e}")
+        return [(None, None, None)] * len(planets_data)
+
+
+def generate_charts_from_lightcurve(df, **kwargs):
     """
     Generate chart data from light curve dataframe
+    See generate_charts_from_arrays for the supported options
+    """
+    # Ensure required columns exist
+    if 'time' not in df.columns or 'flux' not in df.columns:
+        return {}
+    
+    return generate_charts_from_arrays(
+        pd.to_numeric(df['time'], errors='coerce'),
+        pd.to_numeric(df['flux'], errors='coerce'),
+        **kwargs
+    )
+
+
+def generate_archived_charts(epic, **kwargs):
+    """
+    Generate chart data for an EPIC light curve stored in the local archive
+    Returns None if the EPIC is not archived
+    """
+    archived = load_lightcurve(str(LC_ARCHIVE_DIR), epic, RAW_VARIANT)
+    tracing.cache_outcome("lc_archive", archived is not None)
+    if archived is None:
+        return None
+    return generate_charts_from_arrays(archived["time"], archived["flux"], **kwargs)
+
+
+def archived_charts_key(epic):
+    """Identifier of the archived light curve behind generate_archived_charts (None if not archived)"""
+    return lightcurve_stamp(str(LC_ARCHIVE_DIR), epic, RAW_VARIANT)
+
+
+def generate_charts_from_arrays(time, flux, max_points=1000, time_range=None, method="lttb",
+                                detrend_method="savgol", window_length=401,
+                                fold_periods=None, phase_bins=200):
+    """
+    Generate chart data from time and flux arrays
+    Each series is downsampled to at most max_points over its whole span;
+    time_range=(t_min, t_max) re-downsamples only that window at full resolution.
+    The detrended curve uses the same detrending stage as the TRICERATOPS pipeline.
+    The phase-folded curve is binned into phase_bins bins; passing several
+    fold_periods also returns a binned curve per candidate period
     """
     try:
-        # Ensure required columns exist
-        if 'time' not in df.columns or 'flux' not in df.columns:
-            return {}
+        time_arr, flux_arr = clean_series(time, flux)
+        tracing.note(lightcurve_points=len(time_arr))
         
         # Raw light curve
-        raw_data = df[['time', 'flux']].to_dict('records')
+        with span("downsample"):
+            raw_t, raw_f = downsample(time_arr, flux_arr, max_points, time_range, method)
+            raw_data = to_records(raw_t, raw_f, 'time', 'flux')
         
-        # Detrended (simple linear detrend)
-        if len(df) > 1:
-            z = np.polyfit(df['time'], df['flux'], 1)
-            p = np.poly1d(z)
-            detrended = df.copy()
-            detrended['flux'] = df['flux'] - p(df['time']) + df['flux'].mean()
-            detrended_data = detrended[['time', 'flux']].to_dict('records')
+        # Detrended (sliding-window filter with sigma clipping)
+        if len(time_arr) > 1:
+            with span("detrend", method=detrend_method):
+                detrended_flux, _ = detrend(time_arr, flux_arr, method=detrend_method, window_length=window_length)
+                det_t, det_f = downsample(time_arr, detrended_flux, max_points, time_range, method)
+                detrended_data = to_records(det_t, det_f, 'time', 'flux')
         else:
             detrended_data = raw_data
         
-        # Generate mock periodogram (in production, use astropy.timeseries.LombScargle)
+        # Generate mock periodogram (in production, use astropy.timeseries.LombScargle);
+        # fixed noise keeps chart responses deterministic (ETag-cacheable)
         periods = np.linspace(0.5, 20, 200)
-        power = np.exp(-np.abs(periods - 10.5) / 2) + np.random.random(200) * 0.1
+        power = np.exp(-np.abs(periods - 10.5) / 2) + np.random.default_rng(0).random(200) * 0.1
         periodogram_data = [{"period": float(p), "power": float(pw)} for p, pw in zip(periods, power)]
         
-        # Phase-folded (using estimated period)
-        period = 10.5
-        phase = (df['time'] % period) / period
-        phase_folded_df = pd.DataFrame({'phase': phase, 'flux': df['flux']})
-        phase_folded_df = phase_folded_df.sort_values('phase')
-        phase_folded_data = phase_folded_df.to_dict('records')
+        # Phase-folded (using estimated period unless candidates are given)
+        candidate_periods = list(fold_periods) if fold_periods else [10.5]
+        with span("phase_fold", periods=len(candidate_periods)):
+            folded = phase_fold(time_arr, flux_arr, candidate_periods, n_bins=phase_bins)
+            phase_folded_data = folded_records(folded, 0)
         
         return {
-            "raw": raw_data[:1000],  # Limit data points
-            "detrended": detrended_data[:1000],
+            "raw": raw_data,
+            "detrended": detrended_data,
             "periodogram": periodogram_data,
-            "phaseFolded": phase_folded_data[:1000]
+            "phaseFolded": phase_folded_data,
+            "phaseFoldedCandidates": {
+                str(p): folded_records(folded, i) for i, p in enumerate(candidate_periods)
+            } if len(candidate_periods) > 1 else {}
         }
     except Exception as e:
-        print(f"Chart generation error: {e}")
+        tracing.log(f"Chart generation error: {e}")
         return {}
-
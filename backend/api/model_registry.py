@@ -0,0 +1,259 @@
+"""
+Versioned model registry with background hot-reload
+Each published model set lives in <registry_dir>/<dataset>/v<NNNN>/ with a
+manifest.json (hyperparameters, holdout and CV metrics, tier and compact stats), compact forests as memory-mapped
+.npy directories and everything else in models.joblib. A watcher thread polls
+for versions newer than the live one, loads them in the background, warms them
+with sample predictions and swaps them in atomically. Requests hold the model
+set they started with (ModelRegistry.use), and the previous version is released
+once its last request finishes.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from compact_forest import CompactForest, load_compact_forest, save_compact_forest
+
+MANIFEST = "manifest.json"
+# Entries of a model set stored in the manifest instead of the joblib file
+MANIFEST_KEYS = ("metrics", "evaluation", "params", "tier_stats", "compact_stats")
+
+
+def _version_name(version):
+    return f"v{int(version):04d}"
+
+
+def list_versions(registry_dir, dataset):
+    """Published (complete) versions of a dataset, oldest first"""
+    path = os.path.join(registry_dir, dataset)
+    if not os.path.isdir(path):
+        return []
+    versions = []
+    for name in os.listdir(path):
+        if name.startswith("v") and name[1:].isdigit() and os.path.exists(os.path.join(path, name, MANIFEST)):
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+
+def read_manifest(registry_dir, dataset, version):
+    with open(os.path.join(registry_dir, dataset, _version_name(version), MANIFEST)) as f:
+        return json.load(f)
+
+
+def publish_models(registry_dir, dataset, models, **info):
+    """
+    Write a model set as the next version (temp directory + rename, so the
+    watcher never sees a partial version). Returns the new version number.
+    """
+    dataset_dir = os.path.join(registry_dir, dataset)
+    os.makedirs(dataset_dir, exist_ok=True)
+    tmp_dir = os.path.join(dataset_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        compact, rest = [], {}
+        for key, value in models.items():
+            if isinstance(value, CompactForest):
+                save_compact_forest(os.path.join(tmp_dir, f"compact_{key}"), value)
+                compact.append(key)
+            elif key not in MANIFEST_KEYS:
+                rest[key] = value
+        joblib.dump(rest, os.path.join(tmp_dir, "models.joblib"))
+
+        versions = list_versions(registry_dir, dataset)
+        version = (versions[-1] if versions else 0) + 1
+        manifest = {
+            "dataset": dataset,
+            "version": version,
+            "created": datetime.utcnow().isoformat(),
+            "compact": compact,
+            **{key: models.get(key) for key in MANIFEST_KEYS},
+            **info,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        # A concurrent publisher may take the same number; retry with the next one
+        while True:
+            final_dir = os.path.join(dataset_dir, _version_name(version))
+            try:
+                os.rename(tmp_dir, final_dir)
+                break
+            except OSError:
+                if not os.path.exists(final_dir):
+                    raise
+                version += 1
+                manifest["version"] = version
+                with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+                    json.dump(manifest, f, indent=2, default=str)
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"Published {dataset} models as {_version_name(version)}")
+    return version
+
+
+def load_version(registry_dir, dataset, version):
+    """Load a published model set (compact forests memory-mapped)"""
+    path = os.path.join(registry_dir, dataset, _version_name(version))
+    manifest = read_manifest(registry_dir, dataset, version)
+    models = joblib.load(os.path.join(path, "models.joblib"))
+    for key in manifest.get("compact", []):
+        models[key] = load_compact_forest(os.path.join(path, f"compact_{key}"))
+    for key in MANIFEST_KEYS:
+        models[key] = manifest.get(key)
+    models["version"] = _version_name(version)
+    return models
+
+
+def warm_up(models, warmup=None):
+    """
+    Run sample predictions through every model so first requests do not pay
+    for lazy initialisation (memory-mapped pages, explainer caches)
+    """
+    rows = models.get("warmup_rows")
+    if rows is None or len(rows) == 0:
+        return
+    rows = np.asarray(rows)
+    for key in ("rf", "rf_fast", "mlp"):
+        if key in models:
+            models[key].predict_proba(rows)
+    if warmup is not None:
+        warmup(models, rows)
+
+
+class _Live:
+    """One loaded version and the number of requests using it"""
+
+    def __init__(self, dataset, version, models):
+        self.dataset = dataset
+        self.version = version
+        self.models = models
+        self.in_flight = 0
+        self.loaded = datetime.utcnow().isoformat()
+
+
+class ModelRegistry:
+    """Live model sets per dataset with atomic swaps and draining of old versions"""
+
+    def __init__(self, registry_dir, datasets=("k2", "tess"), poll_interval=30, warmup=None):
+        self.registry_dir = str(registry_dir)
+        self.datasets = datasets
+        self.poll_interval = poll_interval
+        self.warmup = warmup
+        self._live = {}
+        self._draining = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.last_error = None
+
+    def get(self, dataset):
+        """Current model set (no lease), or None if nothing is loaded"""
+        live = self._live.get(dataset)
+        return live.models if live else None
+
+    def version(self, dataset):
+        live = self._live.get(dataset)
+        return _version_name(live.version) if live else None
+
+    @contextmanager
+    def use(self, dataset):
+        """
+        Lease the current model set for the duration of a request. A swap
+        during the request does not affect it; the old version is released
+        after its last lease ends.
+        """
+        with self._lock:
+            live = self._live.get(dataset)
+            if live is not None:
+                live.in_flight += 1
+        try:
+            yield live.models if live else None
+        finally:
+            if live is not None:
+                with self._lock:
+                    live.in_flight -= 1
+                    self._release_drained()
+
+    def _release_drained(self):
+        still = []
+        for live in self._draining:
+            if live.in_flight > 0:
+                still.append(live)
+            else:
+                print(f"Released drained {live.dataset} models {_version_name(live.version)}")
+        self._draining = still
+
+    def swap(self, dataset, version, models):
+        """Make models the live set for dataset (atomic reference swap)"""
+        with self._lock:
+            old = self._live.get(dataset)
+            self._live[dataset] = _Live(dataset, version, models)
+            if old is not None:
+                self._draining.append(old)
+            self._release_drained()
+        print(f"{dataset} models now serving {_version_name(version)}")
+
+    def load(self, dataset, version):
+        """Load, warm and swap in a published version"""
+        start = time.perf_counter()
+        models = load_version(self.registry_dir, dataset, version)
+        warm_up(models, self.warmup)
+        self.swap(dataset, version, models)
+        print(f"Loaded {dataset} {_version_name(version)} in {time.perf_counter() - start:.2f}s")
+        return models
+
+    def load_latest(self, dataset):
+        """Load the newest published version if it is newer than the live one; True if one is live"""
+        versions = list_versions(self.registry_dir, dataset)
+        live = self._live.get(dataset)
+        if versions and (live is None or versions[-1] > live.version):
+            self.load(dataset, versions[-1])
+        return dataset in self._live
+
+    def check_for_updates(self):
+        for dataset in self.datasets:
+            try:
+                self.load_latest(dataset)
+            except Exception as e:
+                self.last_error = f"{dataset}: {e}"
+                print(f"Model reload failed for {dataset}: {e}")
+
+    def start_watching(self):
+        """Poll for new versions in a daemon thread"""
+        if self._watcher is not None or not self.poll_interval:
+            return
+
+        def watch():
+            while not self._stop.wait(self.poll_interval):
+                self.check_for_updates()
+
+        self._watcher = threading.Thread(target=watch, daemon=True, name="model-registry-watcher")
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                "live": {
+                    dataset: {"version": _version_name(live.version), "loaded": live.loaded,
+                              "in_flight": live.in_flight}
+                    for dataset, live in self._live.items()
+                },
+                "draining": [
+                    {"dataset": live.dataset, "version": _version_name(live.version), "in_flight": live.in_flight}
+                    for live in self._draining
+                ],
+                "poll_interval": self.poll_interval,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,277 @@
+"""
+On-demand profiling of the running API (admin only)
+Profiling is off unless PROFILING_TOKEN is set; then ProfilingMiddleware is
+installed and a request carrying X-Admin-Token plus X-Profile (or ?profile=)
+runs under a profiler:
+- "sampling" (default): a thread samples every thread's stack each
+  PROFILE_SAMPLE_INTERVAL seconds (low overhead; sees work in worker threads)
+- "cprofile": deterministic cProfile of the event loop thread (exact call
+  counts, higher overhead; concurrent requests on the loop are included). The
+  interpreter holds one such profiler at a time, so a cprofile request made
+  while another runs is refused with 409
+Each profile is stored under PROFILE_DIR/<id>/ (meta.json, collapsed stacks for
+flame graph tools, profile.prof for cProfile) and its ID returned in the
+X-Profile-Id header. capture() samples the whole process for a bounded time.
+Without PROFILING_TOKEN no middleware runs, so requests pay nothing.
+"""
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+from tracing import current_id
+
+PROFILE_DIR = Path(__file__).parent.parent.parent / "model" / "data" / "profiles"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN") or None
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_MODES = ("sampling", "cprofile")
+# Longest whole-process capture
+MAX_CAPTURE_SECONDS = 120
+# Stored profiles kept (oldest deleted first)
+MAX_PROFILES = 200
+
+# Held while a cprofile-mode request runs: a second cProfile.Profile().enable()
+# would replace the first, and the first disable() would stop both
+_cprofile_lock = threading.Lock()
+
+
+def is_admin(token):
+    """True if token is the configured admin token (always False while profiling is disabled)"""
+    return bool(PROFILING_TOKEN and token and hmac.compare_digest(token, PROFILING_TOKEN))
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts of every thread's call stacks (except ignored thread ids), sampled by a background thread"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, ignore=()):
+        self.interval = interval
+        self.ignore = set(ignore)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        self.ignore.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.ignore:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Folded stacks ("thread;outer;...;inner count"), the flamegraph.pl / speedscope input"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n=25):
+        """Functions by samples on top of the stack (self) and anywhere in it (total)"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) > 1:
+                own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        return {
+            "self": [{"function": f, "samples": c} for f, c in own.most_common(n)],
+            "total": [{"function": f, "samples": c} for f, c in total.most_common(n)],
+        }
+
+
+def _cprofile_top(profiler, n=25):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({"function": f"{name} ({os.path.basename(filename)}:{line})",
+                     "calls": nc, "self_s": tt, "total_s": ct})
+    return {
+        "self": sorted(rows, key=lambda r: -r["self_s"])[:n],
+        "total": sorted(rows, key=lambda r: -r["total_s"])[:n],
+    }
+
+
+def _cprofile_collapsed(profiler):
+    """Caller;callee pairs weighted by own time in microseconds (one level of stack, from cProfile)"""
+    stats = pstats.Stats(profiler)
+    lines = []
+    for (filename, line, name), (_, _, _, _, callers) in stats.stats.items():
+        callee = f"{name} ({os.path.basename(filename)}:{line})"
+        for (cfile, cline, cname), (_, _, tt, _) in callers.items():
+            us = int(tt * 1e6)
+            if us:
+                lines.append(f"{cname} ({os.path.basename(cfile)}:{cline});{callee} {us}\n")
+    return "".join(lines)
+
+
+def save_profile(meta, collapsed, top, profiler=None, profile_dir=PROFILE_DIR):
+    """Store a profile and prune the oldest beyond MAX_PROFILES; returns its id"""
+    out = Path(profile_dir) / meta["id"]
+    os.makedirs(out, exist_ok=True)
+    with open(out / "collapsed.txt", "w") as f:
+        f.write(collapsed)
+    if profiler is not None:
+        profiler.dump_stats(str(out / "profile.prof"))
+    with open(out / "meta.json", "w") as f:
+        json.dump({**meta, "top": top}, f, indent=2, default=str)
+
+    stored = sorted(Path(profile_dir).iterdir(), key=lambda p: p.stat().st_mtime)
+    for old in stored[:-MAX_PROFILES]:
+        shutil.rmtree(old, ignore_errors=True)
+    return meta["id"]
+
+
+def _new_meta(kind, mode, **info):
+    return {
+        "id": f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}",
+        "kind": kind,
+        "mode": mode,
+        "created": datetime.utcnow().isoformat(),
+        **info,
+    }
+
+
+class ProfilingMiddleware:
+    """Profile admin requests that ask for it (X-Profile header or ?profile= query flag)"""
+
+    def __init__(self, app, profile_dir=PROFILE_DIR):
+        self.app = app
+        self.profile_dir = profile_dir
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = headers.get("x-profile")
+        if mode is None and b"profile=" in scope.get("query_string", b""):
+            mode = parse_qs(scope["query_string"].decode()).get("profile", [None])[0]
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+        if not is_admin(headers.get("x-admin-token")):
+            await JSONResponse({"detail": "Profiling requires a valid X-Admin-Token"}, status_code=403)(
+                scope, receive, send)
+            return
+        mode = "sampling" if mode in ("1", "true", "") else mode
+        if mode not in PROFILE_MODES:
+            await JSONResponse({"detail": f"Unknown profile mode '{mode}' (expected sampling or cprofile)"},
+                               status_code=400)(scope, receive, send)
+            return
+
+        if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            await JSONResponse({"detail": "Another cprofile request is running; retry or use sampling mode"},
+                               status_code=409)(scope, receive, send)
+            return
+
+        meta = _new_meta("request", mode, method=scope["method"], path=scope["path"], trace_id=current_id())
+        status = {}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(raw=message["headers"])["X-Profile-Id"] = meta["id"]
+            await send(message)
+
+        profiler = sampler = None
+        start = time.perf_counter()
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler().start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            else:
+                sampler.stop()
+            meta.update(duration_ms=(time.perf_counter() - start) * 1e3, status_code=status.get("code"))
+            if profiler is not None:
+                save_profile(meta, _cprofile_collapsed(profiler), _cprofile_top(profiler), profiler,
+                             self.profile_dir)
+            else:
+                meta.update(samples=sampler.samples, interval_s=sampler.interval)
+                save_profile(meta, sampler.collapsed(), sampler.top(), profile_dir=self.profile_dir)
+            print(f"Profiled {scope['method']} {scope['path']} ({mode}, {meta['duration_ms']:.0f} ms) → {meta['id']}")
+
+
+def capture(seconds, interval=PROFILE_SAMPLE_INTERVAL, profile_dir=PROFILE_DIR):
+    """
+    Sample the whole process for seconds (at most MAX_CAPTURE_SECONDS) in the
+    background; returns the profile id, stored when the capture ends
+    """
+    seconds = min(max(float(seconds), 0.1), MAX_CAPTURE_SECONDS)
+    meta = _new_meta("capture", "sampling", seconds=seconds)
+    out = Path(profile_dir) / meta["id"]
+    os.makedirs(out, exist_ok=True)
+    with open(out / "meta.json", "w") as f:
+        json.dump({**meta, "status": "running"}, f, indent=2)
+
+    def run():
+        sampler = StackSampler(interval, ignore=[threading.get_ident()]).start()
+        time.sleep(seconds)
+        sampler.stop()
+        save_profile({**meta, "status": "done", "samples": sampler.samples, "interval_s": interval},
+                     sampler.collapsed(), sampler.top(), profile_dir=profile_dir)
+        print(f"Captured {seconds:.0f}s process profile → {meta['id']}")
+
+    threading.Thread(target=run, name="profile-capture", daemon=True).start()
+    return meta["id"]
+
+
+def list_profiles(profile_dir=PROFILE_DIR):
+    """Stored profiles' metadata (without the top tables), newest first"""
+    if not Path(profile_dir).exists():
+        return []
+    profiles = []
+    for path in Path(profile_dir).iterdir():
+        try:
+            with open(path / "meta.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta.pop("top", None)
+        profiles.append(meta)
+    return sorted(profiles, key=lambda m: m["created"], reverse=True)
+
+
+def profile_path(profile_id, name="meta.json", profile_dir=PROFILE_DIR):
+    """Path of a stored profile's file, or None (ids are validated against the directory)"""
+    if not profile_id or "/" in profile_id or profile_id.startswith("."):
+        return None
+    path = Path(profile_dir) / profile_id / name
+    return path if path.exists() else None
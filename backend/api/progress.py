@@ -0,0 +1,186 @@
+"""
+Background jobs with progress events for long-running API work
+A job runs in a worker thread and records events (stage transitions, calc_probs
+scenarios, partial results). Clients read them as Server-Sent Events from
+/api/jobs/{job_id}/events instead of holding one long synchronous request open.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import tracing
+from api_responses import dumps
+
+# Finished jobs are dropped after this many seconds
+JOB_TTL = 3600
+# "partial" events that keep their payload (a chunk of predictions); older ones
+# are compacted to their counters, and all of them once the job finishes, as the
+# final result holds every row
+MAX_PARTIAL_PAYLOADS = 20
+# Seconds between SSE keep-alive comments while a job is quiet
+KEEPALIVE_INTERVAL = 15
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class Job:
+    """Event log and final result of one background job"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.events = []
+        self.created = time.time()
+        self.finished = None
+        self._partials = []
+        self._lock = threading.Lock()
+
+    def emit(self, stage, **data):
+        """Append an event; usable directly as a pipeline progress callback"""
+        with self._lock:
+            event = {"id": len(self.events), "stage": stage, "time": time.time(), **data}
+            self.events.append(event)
+            if stage == "partial":
+                self._partials.append(event["id"])
+                if len(self._partials) > MAX_PARTIAL_PAYLOADS:
+                    self._compact(self._partials.pop(0))
+        return event
+
+    def _compact(self, event_id):
+        """Drop an event's payload (list and dict values), keeping its counters"""
+        event = self.events[event_id]
+        self.events[event_id] = {
+            **{key: value for key, value in event.items() if not isinstance(value, (list, dict))},
+            "compacted": True,
+        }
+
+    def compact_partials(self):
+        """Compact every stored "partial" event (called when the job finishes)"""
+        with self._lock:
+            for event_id in self._partials:
+                self._compact(event_id)
+            self._partials = []
+
+    def events_since(self, last_id=-1):
+        with self._lock:
+            return self.events[last_id + 1:]
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        """Status dict for polling clients"""
+        with self._lock:
+            last = self.events[-1] if self.events else None
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "last_event": last,
+            "n_events": len(self.events),
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+def _expire_jobs():
+    now = time.time()
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values() if j.finished and now - j.finished > JOB_TTL]:
+            del _jobs[job_id]
+
+
+def get_job(job_id):
+    """Job by ID, or None if unknown or expired"""
+    _expire_jobs()
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def start_job(kind, fn, *args, **kwargs):
+    """
+    Run fn(*args, progress=job.emit, **kwargs) in a daemon thread, traced
+    under the job ID (slow jobs go to the slow log like slow requests).
+    Its return value becomes the job result; exceptions mark the job failed.
+    Returns the Job.
+    """
+    _expire_jobs()
+    job = Job(kind)
+    with _jobs_lock:
+        _jobs[job.id] = job
+
+    def run():
+        trace, token = tracing.begin(f"job {kind}", job.id)
+        job.status = "running"
+        job.emit("started", kind=kind)
+        try:
+            result = fn(*args, progress=job.emit, **kwargs)
+            # Round-trip through JSON so numpy values and NaN serialize like any response
+            job.result = json.loads(dumps(result, default=_json_default))
+            job.compact_partials()
+            job.emit("done", result=job.result)
+            status = "done"
+        except Exception as e:
+            tracing.log(f"Job {job.id} ({kind}) failed: {e}")
+            job.compact_partials()
+            job.error = str(e)
+            job.emit("failed", error=job.error)
+            status = "failed"
+        # The final event is logged before the status flips, so streams see it
+        job.finished = time.time()
+        job.status = status
+        trace.info["status"] = status
+        tracing.end(trace, token)
+
+    threading.Thread(target=run, daemon=True, name=f"job-{kind}-{job.id[:8]}").start()
+    return job
+
+
+def format_sse(event):
+    """One event in text/event-stream framing (NaN and infinity become null, as JSON.parse needs)"""
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['stage']}\n"
+        f"data: {dumps(event, default=_json_default).decode()}\n\n"
+    )
+
+
+async def event_stream(job, last_event_id=-1, poll_interval=0.25):
+    """
+    Yield a job's events as SSE messages, starting after last_event_id
+    (so reconnecting EventSource clients resume where they left off), until
+    the job finishes.
+    """
+    quiet_since = time.time()
+    while True:
+        events = job.events_since(last_event_id)
+        for event in events:
+            last_event_id = event["id"]
+            yield format_sse(event)
+        if events:
+            quiet_since = time.time()
+        elif job.done:
+            return
+        elif time.time() - quiet_since > KEEPALIVE_INTERVAL:
+            quiet_since = time.time()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(poll_interval)
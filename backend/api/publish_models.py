@@ -0,0 +1,50 @@
+"""
+Train, evaluate and publish the K2 and/or TESS models as new registry versions
+Each version's manifest carries cross-validated metrics, serving latency and
+model size (evaluation.py). A running API picks new versions up on its next poll (MODEL_RELOAD_INTERVAL)
+or immediately via POST /api/models/reload.
+
+Usage: python publish_models.py [k2] [tess] [--note TEXT]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from ml_wrappers import load_k2_models, load_tess_models, MODEL_REGISTRY_DIR
+from model_registry import publish_models
+from evaluation import attach_evaluation, cross_validate
+
+LOADERS = {"k2": load_k2_models, "tess": load_tess_models}
+
+
+def train_and_publish(datasets, registry_dir=MODEL_REGISTRY_DIR, note=None):
+    """Train, evaluate and publish each dataset; returns {dataset: version}"""
+    if not datasets:
+        return {}
+    cv = cross_validate(datasets)
+    versions = {}
+    for dataset in datasets:
+        models = LOADERS[dataset]()
+        attach_evaluation(models, cv[dataset])
+        versions[dataset] = publish_models(str(registry_dir), dataset, models, note=note)
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and publish a new model version")
+    parser.add_argument("datasets", nargs="*", help="Datasets to publish (k2, tess; default: all)")
+    parser.add_argument("--note", default=None, help="Free-text note stored in the manifest")
+    args = parser.parse_args()
+    unknown = set(args.datasets) - set(LOADERS)
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+
+    versions = train_and_publish(args.datasets or sorted(LOADERS), note=args.note)
+    for dataset, version in versions.items():
+        print(f"✓ {dataset.upper()} published as v{version:04d} in {MODEL_REGISTRY_DIR / dataset}")
+
+
+if __name__ == "__main__":
+    main()
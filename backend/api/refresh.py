@@ -0,0 +1,336 @@
+"""
+Incremental refresh of the training artifacts from a new catalog snapshot
+Diffs the catalog against the snapshot stored with the last training run
+(snapshot.csv: row key, rowupdate, label, content digest and prediction of
+every row) and picks the cheapest update that keeps the outputs correct:
+
+- only unlabeled rows changed: the models stay as they are and only added or
+  changed candidates are scored; the other predictions are carried over
+- labeled rows changed with small label drift (added, removed or relabeled
+  labeled rows as a fraction of the previous labeled rows): warm start. Each
+  forest replaces its oldest trees with new ones fit on the current training
+  split (same scaler, medians and imbalance method) and the MLP continues
+  training with partial_fit; every candidate is rescored. Rows held out by the
+  last run stay held out (new labeled rows are assigned by a hash of their
+  key), so the holdout metrics never include rows the kept trees were fit on
+- larger drift, a changed feature set or no previous artifacts: full retrain
+  through training.train_models
+
+Rows are matched by the mission schema's id_columns (toi for TESS; pl_name,
+pl_refname and default_flag for K2, whose pl_name repeats per parameter set).
+
+Usage: python refresh.py [k2] [tess] [--catalog PATH] [--output DIR] [--max-drift 0.05]
+                         [--full] [--publish]
+"""
+import argparse
+import hashlib
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sklearn.model_selection import train_test_split
+
+from training import (
+    COMPACT_FORESTS, MISSIONS, TRAINING_DIR, _feature_key, build_features, compact_forests, encode_target,
+    holdout_metrics, predict_candidates, prepare_rows, resample, train_models, write_artifacts
+)
+
+SNAPSHOT_FILE = "snapshot.csv"
+# Largest label drift that is still handled by a warm start
+REFRESH_MAX_DRIFT = 0.05
+# Share of each forest's trees replaced by a warm start
+REFRESH_TREE_FRACTION = 0.25
+# partial_fit passes over the training split per MLP warm start
+MLP_REFRESH_EPOCHS = 10
+
+
+def row_keys(df, schema):
+    """Stable row identifiers: the id columns plus an occurrence counter for exact duplicates"""
+    key = df[schema["id_columns"]].astype(str).agg("|".join, axis=1)
+    return key + "#" + key.groupby(key).cumcount().astype(str)
+
+
+def row_digests(df):
+    """Hex digest of every row's catalog values"""
+    return pd.util.hash_pandas_object(df, index=False).map("{:016x}".format)
+
+
+def holdout_rows(y, test_size=0.2, random_state=42):
+    """Catalog index of the held-out rows of training.train_models' split of y"""
+    return train_test_split(y, test_size=test_size, stratify=y, random_state=random_state)[1].index
+
+
+def _hash_fraction(key):
+    return int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) / 16 ** 8
+
+
+def write_snapshot(mission, df, candidates, out, holdout=()):
+    """
+    Record a catalog's rows, the predictions in candidates (indexed like df) and
+    the held-out rows (df index) as the next refresh's baseline
+    """
+    schema = MISSIONS[mission]
+    snapshot = pd.DataFrame({
+        "key": row_keys(df, schema),
+        "updated": df[schema["updated_column"]].astype(str),
+        "target": encode_target(df[schema["label_column"]], schema),
+        "digest": row_digests(df),
+    })
+    snapshot["predicted_label"] = candidates["predicted_label"].reindex(df.index)
+    snapshot["predicted_proba"] = candidates["predicted_proba"].reindex(df.index)
+    snapshot["holdout"] = df.index.isin(holdout)
+    path = Path(out) / SNAPSHOT_FILE
+    snapshot.to_csv(path, index=False)
+    return path
+
+
+def load_snapshot(out):
+    path = Path(out) / SNAPSHOT_FILE
+    if not path.exists():
+        return None
+    return pd.read_csv(path, dtype={"key": str, "updated": str, "digest": str})
+
+
+def diff_catalog(snapshot, df, schema):
+    """
+    Compare a catalog with a snapshot by row key
+    Returns keys of added, removed, changed (rowupdate or content) and relabeled
+    rows, and the label drift
+    """
+    current = pd.DataFrame({
+        "key": row_keys(df, schema),
+        "updated": df[schema["updated_column"]].astype(str),
+        "target": encode_target(df[schema["label_column"]], schema),
+        "digest": row_digests(df),
+    })
+    merged = snapshot.merge(current, on="key", how="outer", suffixes=("_old", ""), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    added = merged[merged["_merge"] == "right_only"]
+    removed = merged[merged["_merge"] == "left_only"]
+    changed = both[(both["updated_old"] != both["updated"]) | (both["digest_old"] != both["digest"])]
+    relabeled = changed[changed["target_old"] != changed["target"]]
+
+    # Labeled rows that a model trained on the snapshot has not seen as they are now
+    labeled_changes = ((added["target"] != -1).sum() + (removed["target_old"] != -1).sum()
+                       + (changed[["target_old", "target"]] != -1).any(axis=1).sum())
+    label_changes = ((added["target"] != -1).sum() + (removed["target_old"] != -1).sum() + len(relabeled))
+    previous_labeled = max(1, int((snapshot["target"] != -1).sum()))
+    return {
+        "added": set(added["key"]),
+        "removed": set(removed["key"]),
+        "changed": set(changed["key"]),
+        "relabeled": set(relabeled["key"]),
+        "labeled_changes": int(labeled_changes),
+        "label_drift": float(label_changes / previous_labeled),
+    }
+
+
+def score_candidates(mission, models, df, reuse=None):
+    """
+    Unlabeled rows of a catalog with the random forest's predicted_label and
+    predicted_proba (the layout of training.predict_candidates)
+    reuse maps row keys to earlier (predicted_label, predicted_proba); those rows are not rescored
+    Returns (candidates, number of rows scored)
+    """
+    schema = MISSIONS[mission]
+    df = df.assign(target=encode_target(df[schema["label_column"]], schema))
+    X = prepare_rows(df[df["target"] == -1], schema, models["features"], models["median_values"])
+    candidates = df.loc[X.index].copy()
+
+    label = pd.Series(np.nan, index=X.index)
+    proba = pd.Series(np.nan, index=X.index)
+    if reuse is not None and len(reuse):
+        keys = row_keys(df, schema).loc[X.index]
+        label = keys.map(reuse["predicted_label"]).astype(float)
+        proba = keys.map(reuse["predicted_proba"]).astype(float)
+    todo = proba.isna()
+    if todo.any():
+        X_todo = models["scaler"].transform(X[todo])
+        label[todo] = models["rf"].predict(X_todo)
+        proba[todo] = models["rf"].predict_proba(X_todo)[:, 1]
+    candidates['predicted_label'] = label.astype(int)
+    candidates['predicted_proba'] = proba
+    return candidates, int(todo.sum())
+
+
+def extend_forest(forest, X, y, n_new, seed):
+    """Fit n_new trees on (X, y) with warm_start and drop the n_new oldest, keeping the forest's size"""
+    forest.set_params(warm_start=True, n_estimators=forest.n_estimators + n_new, random_state=seed)
+    forest.fit(X, y)
+    forest.estimators_ = forest.estimators_[n_new:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    return forest
+
+
+def carried_holdout(snapshot, df, schema, test_size=0.2):
+    """
+    Held-out labeled rows of a catalog (df index): rows labeled in the snapshot keep
+    their assignment, newly labeled rows are held out by a hash of their key with
+    probability test_size
+    """
+    keys = row_keys(df, schema)
+    previous = snapshot.set_index("key")
+    labeled = encode_target(df[schema["label_column"]], schema) != -1
+    known = (keys.map(previous["target"]).fillna(-1) != -1).values
+    holdout = keys.map(previous["holdout"]).fillna(False).astype(bool).values
+    fresh = keys.map(_hash_fraction).values < test_size
+    return df.index[labeled & np.where(known, holdout, fresh)]
+
+
+def warm_start(mission, models, forests, df, holdout, random_state=42,
+               tree_fraction=REFRESH_TREE_FRACTION, epochs=MLP_REFRESH_EPOCHS, seed=None):
+    """
+    Update a mission's models in place on a catalog's labeled rows outside holdout
+    (df index), keeping the scaler and median values the existing trees and
+    weights were fit with; the holdout rows give the new metrics
+    """
+    schema = MISSIONS[mission]
+    name = schema["name"]
+    labeled = df[encode_target(df[schema["label_column"]], schema) != -1]
+    X_labeled = prepare_rows(labeled, schema, models["features"], models["median_values"])
+    y = pd.Series(encode_target(labeled[schema["label_column"]], schema), index=labeled.index).loc[X_labeled.index]
+
+    test = X_labeled.index.isin(holdout)
+    X_scaled = models["scaler"].transform(X_labeled)
+    X_train, X_test, y_train, y_test = X_scaled[~test], X_scaled[test], y[~test], y[test]
+    # Class weights, if any, are already forest parameters
+    X_bal, y_bal, _ = resample(X_train, y_train, models["params"]["imbalance"], random_state)
+    seed = random_state + 1 if seed is None else seed
+    for key, forest in forests.items():
+        n_new = max(1, round(forest.n_estimators * tree_fraction))
+        extend_forest(forest, X_bal, y_bal, n_new, seed)
+        models[key] = forest
+        print(f"{name} {key}: replaced {n_new} of {forest.n_estimators} trees")
+
+    for _ in range(epochs):
+        models["mlp"].partial_fit(X_train, y_train)
+
+    fast_pred = forests["rf_fast"].predict(X_test)
+    full_pred = forests["rf"].predict(X_test)
+    models["tier_stats"].update({
+        "agreement": float(np.mean(fast_pred == full_pred)),
+        "accuracy": {"fast": float(np.mean(fast_pred == np.asarray(y_test))),
+                     "full": float(np.mean(full_pred == np.asarray(y_test)))},
+    })
+    models["metrics"] = holdout_metrics(models, X_test, y_test)
+    models["warmup_rows"] = X_test[:8]
+    # Cross-validation of the previous data no longer describes these models
+    models.pop("evaluation", None)
+    models["sklearn_forests"] = forests
+    if COMPACT_FORESTS:
+        models["compact_stats"] = compact_forests(models, X_test, name)
+    return models
+
+
+def refresh_mission(mission, csv=None, output_dir=TRAINING_DIR, max_drift=REFRESH_MAX_DRIFT, full=False,
+                    test_size=0.2, random_state=42, publish=False):
+    """
+    Bring a mission's training artifacts up to date with a catalog (default: the schema's file)
+    Returns a summary with the mode used ("unchanged", "rescore", "warm_start" or "full")
+    """
+    schema = MISSIONS[mission]
+    name = schema["name"]
+    start = time.perf_counter()
+    out = Path(output_dir) / mission
+    df = pd.read_csv(csv or schema["csv"])
+
+    snapshot = load_snapshot(out)
+    has_artifacts = snapshot is not None and (out / "models.joblib").exists() and (out / "forests.joblib").exists()
+    diff, models, previous = None, None, {}
+    if full:
+        mode, reason = "full", "requested"
+    elif not has_artifacts:
+        mode, reason = "full", "no previous artifacts"
+    else:
+        models = joblib.load(out / "models.joblib")
+        previous = models.get("refresh") or {}
+        diff = diff_catalog(snapshot, df, schema)
+        if not set(models["features"]) <= set(df.columns):
+            mode, reason = "full", "feature columns changed"
+        elif not (diff["added"] or diff["removed"] or diff["changed"]):
+            print(f"{name}: catalog unchanged since the last refresh")
+            return {"mission": mission, "mode": "unchanged", "seconds": time.perf_counter() - start}
+        elif diff["labeled_changes"] == 0:
+            mode, reason = "rescore", "only unlabeled rows changed"
+        elif diff["label_drift"] <= max_drift:
+            mode, reason = "warm_start", f"label drift {diff['label_drift']:.3f} <= {max_drift}"
+        else:
+            mode, reason = "full", f"label drift {diff['label_drift']:.3f} > {max_drift}"
+    count = previous.get("count", 0) + 1
+
+    if mode == "full":
+        fs = build_features(mission, csv=csv)
+        models = train_models(mission, fs, test_size=test_size, random_state=random_state, keep_forests=True)
+        candidates, rescored = predict_candidates(mission, models, fs, csv), len(fs["X_candidates"])
+        holdout = holdout_rows(fs["y"], test_size, random_state)
+    elif mode == "warm_start":
+        holdout = carried_holdout(snapshot, df, schema, test_size)
+        warm_start(mission, models, joblib.load(out / "forests.joblib"), df, holdout, random_state,
+                   seed=random_state + count)
+        models["feature_key"] = _feature_key(mission, csv)
+        candidates, rescored = score_candidates(mission, models, df)
+    else:
+        holdout = carried_holdout(snapshot, df, schema, test_size)
+        unchanged = snapshot[~snapshot["key"].isin(diff["changed"] | diff["removed"])]
+        reuse = unchanged.dropna(subset=["predicted_proba"]).set_index("key")
+        candidates, rescored = score_candidates(mission, models, df, reuse)
+
+    models["refresh"] = {
+        "mode": mode,
+        "reason": reason,
+        "count": count,
+        "created": datetime.utcnow().isoformat(),
+        "catalog": str(csv or schema["csv"]),
+        "rescored": rescored,
+        **({k: len(diff[k]) for k in ("added", "removed", "changed", "relabeled")} if diff else {}),
+        **({"label_drift": diff["label_drift"]} if diff else {}),
+    }
+    write_artifacts(mission, models, candidates, output_dir)
+    write_snapshot(mission, df, candidates, out, holdout)
+    summary = {"mission": mission, **models["refresh"], "seconds": time.perf_counter() - start}
+
+    if publish and mode != "rescore":
+        from ml_wrappers import MODEL_REGISTRY_DIR
+        from model_registry import publish_models
+        summary["version"] = publish_models(str(MODEL_REGISTRY_DIR), mission, models, source="refresh.py",
+                                            refresh=models["refresh"])
+    print(f"✓ {name} {mode} ({reason}): {rescored} candidates scored in {summary['seconds']:.1f}s → {out}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the training artifacts from a new catalog snapshot")
+    parser.add_argument("missions", nargs="*", help="Missions to refresh (k2, tess; default: all)")
+    parser.add_argument("--catalog", default=None, help="New catalog CSV (one mission only; default: the schema's file)")
+    parser.add_argument("--output", default=str(TRAINING_DIR), help="Training output directory")
+    parser.add_argument("--max-drift", type=float, default=REFRESH_MAX_DRIFT,
+                        help="Largest label drift handled by a warm start")
+    parser.add_argument("--full", action="store_true", help="Always retrain from scratch")
+    parser.add_argument("--publish", action="store_true", help="Publish updated models to the API model registry")
+    args = parser.parse_args(argv)
+    missions = args.missions or sorted(MISSIONS)
+    unknown = set(missions) - set(MISSIONS)
+    if unknown:
+        parser.error(f"unknown mission(s): {', '.join(sorted(unknown))}")
+    if args.catalog and len(missions) != 1:
+        parser.error("--catalog needs exactly one mission")
+
+    for mission in missions:
+        summary = refresh_mission(mission, args.catalog, args.output, args.max_drift, args.full,
+                                  publish=args.publish)
+        if "added" in summary:
+            print(f"      {summary['added']} added, {summary['changed']} changed ({summary['relabeled']} relabeled), "
+                  f"{summary['removed']} removed; label drift {summary['label_drift']:.3f}"
+                  + (f"; published as v{summary['version']:04d}" if "version" in summary else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Persistent store of classification, habitability and FPP results
+An SQLite database with every result (results) and the latest value of each
+score per target (targets), indexed by target ID, dataset, model version and
+score, so history can be queried by ranges and sorted. Endpoints hand results
+to record(), which only enqueues them; a writer thread inserts them in batches,
+one transaction per batch, off the request path.
+
+Set RESULTS_DB to move the database, or RESULTS_STORE=0 to disable it.
+"""
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+RESULTS_DB = Path(os.environ.get(
+    "RESULTS_DB", Path(__file__).parent.parent.parent / "model" / "data" / "results.sqlite"
+))
+RESULTS_STORE = os.environ.get("RESULTS_STORE", "1") != "0"
+
+# Request fields that identify a target, in order of preference
+TARGET_ID_COLUMNS = ("pl_name", "toi", "tid", "tic_id", "epic", "kepoi_name", "hostname")
+# Columns with _min/_max query filters
+RANGE_COLUMNS = ("score", "habitability", "fpp", "nfpp")
+# Columns with equality query filters, per view
+MATCH_COLUMNS = {
+    "targets": ("target_id", "dataset", "model_version", "prediction"),
+    "results": ("target_id", "dataset", "model_version", "prediction", "kind", "model_type"),
+}
+SORT_COLUMNS = {
+    "targets": ("updated", "target_id", "dataset", "score", "habitability", "fpp", "nfpp"),
+    "results": ("created", "id", "target_id", "dataset", "score", "habitability", "fpp", "nfpp"),
+}
+MAX_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    target_id TEXT,
+    dataset TEXT,
+    model_version TEXT,
+    model_type TEXT,
+    prediction TEXT,
+    score REAL,
+    habitability REAL,
+    fpp REAL,
+    nfpp REAL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS results_target ON results (target_id, created);
+CREATE INDEX IF NOT EXISTS results_dataset ON results (dataset, kind, created);
+CREATE INDEX IF NOT EXISTS results_version ON results (model_version);
+CREATE INDEX IF NOT EXISTS results_score ON results (score);
+CREATE INDEX IF NOT EXISTS results_nfpp ON results (nfpp);
+CREATE INDEX IF NOT EXISTS results_habitability ON results (habitability);
+
+CREATE TABLE IF NOT EXISTS targets (
+    target_id TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    model_version TEXT,
+    prediction TEXT,
+    score REAL,
+    habitability REAL,
+    fpp REAL,
+    nfpp REAL,
+    PRIMARY KEY (target_id, dataset)
+);
+CREATE INDEX IF NOT EXISTS targets_version ON targets (model_version);
+CREATE INDEX IF NOT EXISTS targets_score ON targets (score);
+CREATE INDEX IF NOT EXISTS targets_nfpp ON targets (nfpp);
+CREATE INDEX IF NOT EXISTS targets_habitability ON targets (habitability);
+"""
+
+RESULT_FIELDS = ("created", "kind", "target_id", "dataset", "model_version", "model_type", "prediction",
+                 "score", "habitability", "fpp", "nfpp", "payload")
+
+# A new value of a score replaces the target's old one; other scores are kept
+UPSERT_TARGET = """
+INSERT INTO targets (target_id, dataset, updated, model_version, prediction, score, habitability, fpp, nfpp)
+VALUES (:target_id, :dataset, :created, :model_version, :prediction, :score, :habitability, :fpp, :nfpp)
+ON CONFLICT (target_id, dataset) DO UPDATE SET
+    updated = excluded.updated,
+    model_version = coalesce(excluded.model_version, model_version),
+    prediction = coalesce(excluded.prediction, prediction),
+    score = coalesce(excluded.score, score),
+    habitability = coalesce(excluded.habitability, habitability),
+    fpp = coalesce(excluded.fpp, fpp),
+    nfpp = coalesce(excluded.nfpp, nfpp)
+"""
+
+
+def target_id_of(data, explicit=None):
+    """A target's ID: explicit if given, else the first identifying field of a request row"""
+    if explicit:
+        return str(explicit)
+    for column in TARGET_ID_COLUMNS:
+        value = data.get(column)
+        if value is None or (isinstance(value, float) and math.isnan(value)) or value == "":
+            continue
+        if isinstance(value, float) and value.is_integer() and column != "toi":
+            value = int(value)
+        return str(value)
+    return None
+
+
+def _number(value):
+    """A finite float, or None (failed FPP runs report "Nan" or None)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def connect(path):
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ResultsStore:
+    """Results database with a background batch writer"""
+
+    def __init__(self, path=RESULTS_DB, enabled=RESULTS_STORE, batch_size=500, flush_interval=0.5):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self.written = 0
+        self.errors = 0
+        if enabled:
+            os.makedirs(self.path.parent, exist_ok=True)
+            with closing(connect(self.path)) as conn:
+                conn.executescript(SCHEMA)
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="results-writer", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Write everything queued and stop the writer"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def flush(self):
+        """Block until every queued result is written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def record(self, kind, target_id=None, dataset=None, model_version=None, model_type=None, prediction=None,
+               score=None, habitability=None, fpp=None, nfpp=None, payload=None):
+        """Queue one result for writing (never blocks on the database)"""
+        if not self.enabled:
+            return
+        self._queue.put({
+            "created": datetime.utcnow().isoformat(),
+            "kind": kind,
+            "target_id": target_id,
+            "dataset": dataset,
+            "model_version": model_version,
+            "model_type": model_type,
+            "prediction": prediction,
+            "score": _number(score),
+            "habitability": _number(habitability),
+            "fpp": _number(fpp),
+            "nfpp": _number(nfpp),
+            "payload": json.dumps(payload, default=str) if payload is not None else None,
+        })
+
+    def _run(self):
+        conn = connect(self.path)
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(conn, batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn, batch):
+        start = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO results ({', '.join(RESULT_FIELDS)}) "
+                    f"VALUES ({', '.join(':' + f for f in RESULT_FIELDS)})",
+                    batch
+                )
+                conn.executemany(UPSERT_TARGET, [r for r in batch if r["target_id"] and r["dataset"]])
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.errors += len(batch)
+            print(f"⚠ Could not store {len(batch)} results: {e}")
+            return
+        if len(batch) > 1:
+            print(f"Stored {len(batch)} results in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    def query(self, view="targets", filters=None, sort=None, order="desc", limit=100, offset=0):
+        """
+        Rows of the targets or results view matching filters: equality on
+        MATCH_COLUMNS, <column>_min / <column>_max on RANGE_COLUMNS and
+        since / until on the timestamp; sorted by a SORT_COLUMNS entry
+        Returns (rows, total matching rows)
+        """
+        if view not in MATCH_COLUMNS:
+            raise ValueError(f"Unknown view '{view}' (expected targets or results)")
+        timestamp = "updated" if view == "targets" else "created"
+        sort = sort or timestamp
+        if sort not in SORT_COLUMNS[view]:
+            raise ValueError(f"Cannot sort {view} by '{sort}' (expected one of {', '.join(SORT_COLUMNS[view])})")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+
+        where, params = [], []
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            if name in MATCH_COLUMNS[view]:
+                where.append(f"{name} = ?")
+            elif name.endswith(("_min", "_max")) and name[:-4] in RANGE_COLUMNS:
+                where.append(f"{name[:-4]} {'>=' if name.endswith('_min') else '<='} ?")
+            elif name in ("since", "until"):
+                where.append(f"{timestamp} {'>=' if name == 'since' else '<='} ?")
+            else:
+                raise ValueError(f"Unknown filter '{name}' for {view}")
+            params.append(value)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+        if not self.enabled:
+            return [], 0
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        with closing(connect(self.path)) as conn:
+            total = conn.execute(f"SELECT count(*) FROM {view}{clause}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM {view}{clause} ORDER BY {sort} {order.upper()} NULLS LAST LIMIT ? OFFSET ?",
+                params + [limit, max(0, int(offset))]
+            ).fetchall()
+        rows = [dict(row) for row in rows]
+        for row in rows:
+            if row.get("payload"):
+                row["payload"] = json.loads(row["payload"])
+        return rows, total
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path),
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "errors": self.errors,
+        }
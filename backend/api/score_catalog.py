@@ -0,0 +1,226 @@
+"""
+Out-of-core scoring of K2 or TESS catalogs far larger than memory
+Streams a catalog CSV in chunks through the mission's feature alignment
+(training.prepare_rows with the model set's features and medians), scaler and
+models in worker processes, and appends each scored chunk to a Parquet file as
+a row group, in input order. At most two chunks per worker are in flight, so
+memory depends on the chunk size, not on the catalog size.
+
+Models come from the newest registry version of the mission (or --version), or
+from a training run's models.joblib (--models-file). Workers load them once;
+registry forests are memory-mapped, so their pages are shared between workers.
+
+Output columns: the --keep columns (default: the mission's id and label columns;
+typed float or string once, from the first rows, see keep_column_types),
+row (0-based input row), <model>_proba for every --models entry and
+predicted_label (random forest; -1 for rows the mission's missing-value policy
+cannot score). Requires pyarrow.
+
+Usage: python score_catalog.py k2|tess INPUT.csv OUTPUT.parquet [--chunk-rows 100000]
+                               [--workers N] [--models rf mlp] [--keep COL ...]
+                               [--version N | --models-file PATH]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from model_registry import list_versions, load_version
+from training import MISSIONS, prepare_rows
+
+CHUNK_ROWS = 100_000
+# Rows read up front to type the --keep columns
+SCHEMA_SAMPLE_ROWS = 10_000
+# Chunks queued or being scored per worker
+CHUNKS_PER_WORKER = 2
+
+# Model set of a worker process, loaded once by _init_worker
+_worker = {}
+
+
+def load_model_set(mission, registry_dir=None, version=None, models_file=None):
+    """A mission's models from a training models.joblib, or a (default: the newest) registry version"""
+    if models_file:
+        return joblib.load(models_file)
+    versions = list_versions(str(registry_dir), mission)
+    if not versions:
+        raise FileNotFoundError(f"No published {mission} models in {registry_dir} (run publish_models.py)")
+    if version is not None and version not in versions:
+        raise FileNotFoundError(f"{mission} v{version:04d} is not published in {registry_dir}")
+    return load_version(str(registry_dir), mission, version or versions[-1])
+
+
+def _init_worker(mission, source):
+    _worker["models"] = load_model_set(mission, **source)
+
+
+def keep_column_types(input_csv, keep, features, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Output type of each --keep column, fixed once for the whole catalog:
+    "float" for features and columns numeric in the first sample_rows rows,
+    "string" otherwise (including columns empty in the sample, so sparse text
+    columns never get a numeric type from a chunk of blanks)
+    """
+    sample = pd.read_csv(input_csv, usecols=keep, nrows=sample_rows)
+    return {
+        col: "float" if col in features or (pd.api.types.is_numeric_dtype(sample[col])
+                                            and sample[col].notna().any()) else "string"
+        for col in keep
+    }
+
+
+def output_schema(keep_types, model_keys):
+    import pyarrow as pa
+
+    fields = [pa.field(col, pa.float64() if kind == "float" else pa.string()) for col, kind in keep_types.items()]
+    fields.append(pa.field("row", pa.int64()))
+    fields += [pa.field(f"{key}_proba", pa.float64()) for key in model_keys]
+    fields.append(pa.field("predicted_label", pa.int8()))
+    return pa.schema(fields)
+
+
+def score_chunk(mission, chunk, keep_types, model_keys):
+    """Scores of one chunk of catalog rows as a DataFrame of output columns (runs in a worker process)"""
+    schema = MISSIONS[mission]
+    models = _worker["models"]
+    X = prepare_rows(chunk, schema, models["features"], models["median_values"])
+
+    out = pd.DataFrame(index=chunk.index)
+    for col, kind in keep_types.items():
+        out[col] = chunk[col].astype(np.float64 if kind == "float" else "string")
+    out["row"] = chunk.index.astype(np.int64)
+    for key in model_keys:
+        out[f"{key}_proba"] = np.nan
+    out["predicted_label"] = np.int8(-1)
+    if len(X):
+        X_scaled = models["scaler"].transform(X)
+        for key in model_keys:
+            out.loc[X.index, f"{key}_proba"] = models[key].predict_proba(X_scaled)[:, 1]
+        out.loc[X.index, "predicted_label"] = models["rf"].predict(X_scaled).astype(np.int8)
+    return out.reset_index(drop=True)
+
+
+def score_catalog(mission, input_csv, output, chunk_rows=CHUNK_ROWS, max_workers=None, model_keys=("rf",),
+                  keep=None, version=None, models_file=None):
+    """
+    Score every row of a catalog CSV into a Parquet file, chunk by chunk
+    Returns a summary (rows, scored rows, seconds, model version)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = MISSIONS[mission]
+    if models_file:
+        source = {"models_file": str(models_file)}
+    else:
+        from ml_wrappers import MODEL_REGISTRY_DIR
+        versions = list_versions(str(MODEL_REGISTRY_DIR), mission)
+        source = {"registry_dir": str(MODEL_REGISTRY_DIR), "version": version or (versions[-1] if versions else None)}
+    models = load_model_set(mission, **source)
+    missing = [key for key in model_keys if key not in models]
+    if missing:
+        raise ValueError(f"Model set has no {', '.join(missing)} (available: rf, rf_fast, mlp)")
+
+    header = list(pd.read_csv(input_csv, nrows=0).columns)
+    absent = [f for f in models["features"] if f not in header]
+    if absent:
+        raise ValueError(f"{input_csv} lacks feature columns: {', '.join(absent)}")
+    if keep is None:
+        keep = [c for c in schema["id_columns"] + [schema["label_column"]] if c in header]
+    unknown = [c for c in keep if c not in header]
+    if unknown:
+        raise ValueError(f"{input_csv} has no column(s) {', '.join(unknown)}")
+    usecols = list(dict.fromkeys(keep + list(models["features"])))
+    keep_types = keep_column_types(input_csv, keep, models["features"])
+    # Text columns are read as text in every chunk, whatever a chunk's values look like
+    dtypes = {col: str for col, kind in keep_types.items() if kind == "string"}
+    out_schema = output_schema(keep_types, model_keys)
+
+    metadata = {
+        "mission": mission,
+        "model_version": models.get("version") or "training",
+        "models": list(model_keys),
+        "source": str(input_csv),
+    }
+    workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    rows = scored = 0
+    writer = None
+    tmp = Path(f"{output}.tmp")
+
+    def write(future):
+        nonlocal writer, rows, scored
+        result = future.result()
+        table = pa.Table.from_pandas(result, schema=out_schema, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(
+                str(tmp), out_schema.with_metadata({b"exoplanet": json.dumps(metadata).encode()})
+            )
+        writer.write_table(table.replace_schema_metadata(writer.schema.metadata))
+        rows += table.num_rows
+        scored += int((result["predicted_label"] != -1).sum())
+        elapsed = time.perf_counter() - start
+        print(f"{rows:,} rows scored ({rows / elapsed:,.0f} rows/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(mission, source)) as pool:
+            pending = deque()
+            for chunk in pd.read_csv(input_csv, usecols=usecols, dtype=dtypes, chunksize=chunk_rows):
+                pending.append(pool.submit(score_chunk, mission, chunk, keep_types, model_keys))
+                if len(pending) >= workers * CHUNKS_PER_WORKER:
+                    write(pending.popleft())
+            while pending:
+                write(pending.popleft())
+        if writer is None:
+            raise ValueError(f"{input_csv} has no rows")
+        writer.close()
+        os.replace(tmp, output)
+    finally:
+        if tmp.exists():
+            if writer is not None:
+                writer.close()
+            tmp.unlink()
+
+    return {**metadata, "rows": rows, "scored": scored, "workers": workers,
+            "seconds": time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a large K2 or TESS catalog chunk by chunk into Parquet")
+    parser.add_argument("mission", help="k2 or tess")
+    parser.add_argument("input", help="Catalog CSV")
+    parser.add_argument("output", help="Output Parquet file")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--models", nargs="+", default=["rf"], help="rf, rf_fast and/or mlp probabilities to write")
+    parser.add_argument("--keep", nargs="+", default=None, help="Input columns copied to the output")
+    parser.add_argument("--version", type=int, default=None, help="Registry version (default: newest)")
+    parser.add_argument("--models-file", default=None, help="models.joblib of a training.py run instead of the registry")
+    args = parser.parse_args(argv)
+    if args.mission not in MISSIONS:
+        parser.error(f"unknown mission: {args.mission}")
+    unknown = set(args.models) - {"rf", "rf_fast", "mlp"}
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(sorted(unknown))}")
+    if args.version is not None and args.models_file:
+        parser.error("--version and --models-file are exclusive")
+
+    summary = score_catalog(args.mission, args.input, args.output, args.chunk_rows, args.workers, args.models,
+                            args.keep, args.version, args.models_file)
+    print(f"✓ {summary['rows']:,} rows ({summary['scored']:,} scored) with {summary['mission'].upper()} "
+          f"{summary['model_version']} in {summary['seconds']:.1f}s on {summary['workers']} workers → {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
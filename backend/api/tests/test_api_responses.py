@@ -0,0 +1,103 @@
+import gzip
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import api_responses
+from api_responses import CompressionMiddleware, FastJSONResponse, cached_response, dumps, etag_for
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    builds = []
+
+    @app.get("/small")
+    def small():
+        return FastJSONResponse({"x": 1})
+
+    @app.get("/large")
+    def large():
+        return FastJSONResponse({"values": list(range(2000))})
+
+    @app.get("/resource/{version}")
+    def resource(version: int, request: Request):
+        def build():
+            builds.append(version)
+            return {"version": version, "values": list(range(2000))}
+        return cached_response(request, ("resource", version), build)
+
+    client = TestClient(app)
+    client.builds = builds
+    return client
+
+
+def test_compression_threshold(client):
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"x": 1}
+
+    raw = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert int(large.headers["content-length"]) < len(raw.content)
+    assert large.json() == raw.json()
+
+    refused = client.get("/large", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+
+
+def test_etag_and_not_modified(client):
+    first = client.get("/resource/1", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert etag == etag_for("resource", 1)
+
+    again = client.get("/resource/1", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    # The compressed variant's ETag matches too
+    gzipped = client.get("/resource/1", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["etag"] == f'{etag[:-1]}-gzip"'
+    assert client.get("/resource/1", headers={"If-None-Match": gzipped.headers["etag"]}).status_code == 304
+
+    other = client.get("/resource/2", headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+    # Rendered once per key
+    assert client.builds == [1, 2]
+
+
+def test_etag_salt_is_the_same_in_every_process():
+    code = "import api_responses; print(api_responses.ETAG_SALT)"
+    salts = {subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+                            capture_output=True, text=True, check=True).stdout.strip()
+             for _ in range(2)}
+    assert salts == {api_responses.ETAG_SALT}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_writes_null_for_non_finite(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(api_responses, "orjson", None)
+    content = {"FPP": float("nan"), "NFPP": np.float64("inf"), "flux": np.array([1.0, np.nan]),
+               "rows": [{"x": 1, "y": -float("inf")}], "n": np.int64(3)}
+    assert json.loads(dumps(content)) == {
+        "FPP": None, "NFPP": None, "flux": [1.0, None], "rows": [{"x": 1, "y": None}], "n": 3,
+    }
+
+
+def test_gzip_is_deterministic():
+    body = dumps({"values": list(range(500))})
+    assert api_responses.compress(body, "gzip") == api_responses.compress(body, "gzip")
+    assert gzip.decompress(api_responses.compress(body, "gzip")) == body
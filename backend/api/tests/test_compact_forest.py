@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from compact_forest import CompactForest, load_compact_forest, save_compact_forest
+
+
+@pytest.fixture(scope="module")
+def data():
+    X, y = make_classification(n_samples=600, n_features=10, n_informative=6, random_state=0)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def forest(data):
+    X, y = data
+    return RandomForestClassifier(n_estimators=25, max_depth=10, random_state=0).fit(X[:400], y[:400])
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+def test_predict_proba_within_quantization_bound(data, forest, bits):
+    X, _ = data
+    compact = CompactForest.from_sklearn(forest, bits=bits)
+    ours, theirs = compact.predict_proba(X), forest.predict_proba(X)
+    assert ours.shape == theirs.shape
+    assert np.abs(ours - theirs).max() <= compact.max_error() + 1e-12
+    # Labels only differ where the original probabilities are within the bound of a tie
+    clear = np.abs(theirs[:, 1] - 0.5) > compact.max_error()
+    np.testing.assert_array_equal(compact.predict(X)[clear], forest.predict(X)[clear])
+
+    stats = compact.compare(forest, X)
+    assert stats["max_abs_error"] <= stats["bound"] + 1e-12
+    assert compact.meta["n_internal"] + compact.meta["n_leaves"] <= compact.meta["original_nodes"]
+
+
+def test_float32_inputs_on_thresholds(forest):
+    # Values at and just around a split threshold take the same branch as sklearn
+    compact = CompactForest.from_sklearn(forest, bits=16)
+    tree = forest.estimators_[0].tree_
+    feature, threshold = tree.feature[0], tree.threshold[0]
+    X = np.zeros((3, forest.n_features_in_))
+    X[:, feature] = [np.nextafter(threshold, -np.inf), threshold, np.nextafter(threshold, np.inf)]
+    assert np.abs(compact.predict_proba(X) - forest.predict_proba(X)).max() <= compact.max_error() + 1e-12
+
+
+def test_save_and_load(tmp_path, data, forest):
+    X, _ = data
+    compact = CompactForest.from_sklearn(forest)
+    path = save_compact_forest(tmp_path / "rf", compact)
+    loaded = load_compact_forest(path)
+    assert isinstance(loaded.leaf_value, np.memmap)
+    np.testing.assert_array_equal(loaded.predict_proba(X), compact.predict_proba(X))
+    np.testing.assert_array_equal(loaded.feature_importances_, forest.feature_importances_)
+    assert loaded.nbytes() == compact.nbytes()
+    assert load_compact_forest(tmp_path / "missing") is None
+    with pytest.raises(ValueError):
+        CompactForest.from_sklearn(forest, bits=12)
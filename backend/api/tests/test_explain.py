@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.neural_network import MLPClassifier
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from compact_forest import CompactForest
+from explain import contributions, explain_row, global_importance, occlusion_contributions
+
+FEATURES = [f"f{i}" for i in range(8)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    X, y = make_classification(n_samples=300, n_features=8, n_informative=5, random_state=1)
+    return (X - X.mean(axis=0)) / X.std(axis=0), y
+
+
+@pytest.fixture(scope="module")
+def forest(data):
+    X, y = data
+    return RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(X, y)
+
+
+def test_tree_attributions_sum_to_prediction_minus_bias(data, forest):
+    X, _ = data
+    for model in (forest, CompactForest.from_sklearn(forest, bits=8)):
+        bias, contrib, method = contributions(model, X[:50])
+        assert method == "tree_path" and contrib.shape == (50, len(FEATURES))
+        # The bias is the forest's mean root value, the same for every row
+        assert np.ptp(bias) == 0
+        compact = model if isinstance(model, CompactForest) else CompactForest.from_sklearn(model, bits=16)
+        np.testing.assert_allclose(bias + contrib.sum(axis=1), compact.predict_proba(X[:50])[:, 1], atol=1e-12)
+        np.testing.assert_allclose(bias + contrib.sum(axis=1), forest.predict_proba(X[:50])[:, 1],
+                                   atol=compact.max_error() + 1e-12)
+
+
+def test_occlusion_attributions(data):
+    X, y = data
+    mlp = MLPClassifier(hidden_layer_sizes=(16,), max_iter=2000, random_state=0).fit(X, y)
+    bias, contrib, method = contributions(mlp, X[:5])
+    assert method == "occlusion"
+    np.testing.assert_allclose(bias, mlp.predict_proba(np.zeros((1, len(FEATURES))))[0, 1])
+    for feature in (0, 3):
+        occluded = X[:5].copy()
+        occluded[:, feature] = 0
+        expected = mlp.predict_proba(X[:5])[:, 1] - mlp.predict_proba(occluded)[:, 1]
+        np.testing.assert_allclose(contrib[:, feature], expected, atol=1e-12)
+    _, shifted = occlusion_contributions(mlp, X[:5], baseline=X[:5].mean(axis=0))
+    assert not np.allclose(shifted, contrib)
+
+
+def test_explain_row(data, forest):
+    X, _ = data
+    raw = X * 10
+    explanation = explain_row(forest, X, raw, FEATURES, row=3, top=4)
+    assert explanation["method"] == "tree_path"
+    entries = explanation["contributions"]
+    assert len(entries) == 4
+    magnitudes = [abs(e["contribution"]) for e in entries]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+    for entry in entries:
+        assert entry["value"] == raw[3, FEATURES.index(entry["feature"])]
+
+
+def test_global_importance(forest):
+    top = global_importance(forest, FEATURES, top=3)
+    order = np.argsort(forest.feature_importances_)[::-1][:3]
+    assert [t["feature"] for t in top] == [FEATURES[i] for i in order]
+    assert global_importance(forest, FEATURES, top=8)[:3] == top
+    assert global_importance(MLPClassifier(), FEATURES) == []
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import lightcurve_archive
+from lightcurve_archive import (KEEP_VERSIONS, POINTER, archive_path, has_lightcurve, lightcurve_stamp,
+                                load_lightcurve, save_lightcurve)
+
+EPIC = 201111557
+
+
+def curve(value, n=100):
+    return np.arange(n, dtype=float), np.full(n, float(value)), np.full(n, 0.1)
+
+
+def test_round_trip(tmp_path):
+    assert load_lightcurve(tmp_path, EPIC) is None and lightcurve_stamp(tmp_path, EPIC) is None
+    time, flux, flux_err = curve(1)
+    meta = save_lightcurve(tmp_path, EPIC, time, flux, flux_err, source="test")
+    assert has_lightcurve(tmp_path, EPIC)
+    loaded = load_lightcurve(tmp_path, EPIC)
+    assert loaded["meta"] == meta and meta["source"] == "test"
+    np.testing.assert_array_equal(loaded["flux"], flux)
+    assert not loaded["flux"].flags.writeable
+
+    stamp = lightcurve_stamp(tmp_path, EPIC)
+    save_lightcurve(tmp_path, EPIC, *curve(2))
+    assert lightcurve_stamp(tmp_path, EPIC) != stamp
+
+
+def test_rewrite_keeps_open_readers_and_prunes(monkeypatch, tmp_path):
+    monkeypatch.setattr(lightcurve_archive, "PRUNE_GRACE", 0)
+    save_lightcurve(tmp_path, EPIC, *curve(0))
+    before = load_lightcurve(tmp_path, EPIC)
+    for value in range(1, 5):
+        save_lightcurve(tmp_path, EPIC, *curve(value))
+    # Arrays mapped before the rewrites stay readable
+    assert before["flux"][0] == 0
+    assert load_lightcurve(tmp_path, EPIC)["flux"][0] == 4
+    variant_dir = Path(archive_path(tmp_path, EPIC))
+    versions = sorted(p.name for p in variant_dir.iterdir() if p.name != POINTER)
+    assert len(versions) == KEEP_VERSIONS and versions[-1] == (variant_dir / POINTER).read_text()
+
+
+def test_concurrent_writers_and_readers(tmp_path):
+    save_lightcurve(tmp_path, EPIC, *curve(0))
+    errors, seen = [], set()
+    done = threading.Event()
+
+    def write(value):
+        try:
+            for _ in range(10):
+                save_lightcurve(tmp_path, EPIC, *curve(value))
+        except Exception as exc:
+            errors.append(exc)
+
+    def read():
+        try:
+            while not done.is_set():
+                loaded = load_lightcurve(tmp_path, EPIC)
+                # Every read sees one complete curve
+                assert len(set(np.asarray(loaded["flux"]))) == 1
+                seen.add(float(loaded["flux"][0]))
+        except Exception as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    writers = [threading.Thread(target=write, args=(value,)) for value in range(1, 5)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors
+    assert load_lightcurve(tmp_path, EPIC)["flux"][0] in {1, 2, 3, 4}
+    assert seen
+
+
+def test_reads_and_replaces_legacy_layout(tmp_path):
+    variant_dir = Path(archive_path(tmp_path, EPIC))
+    variant_dir.mkdir(parents=True)
+    time, flux, flux_err = curve(7)
+    for name, arr in (("time", time), ("flux", flux), ("flux_err", flux_err)):
+        np.save(variant_dir / f"{name}.npy", arr)
+    (variant_dir / "meta.json").write_text(json.dumps({"format_version": 1, "n_points": len(time)}))
+
+    assert has_lightcurve(tmp_path, EPIC)
+    assert load_lightcurve(tmp_path, EPIC)["flux"][0] == 7
+    save_lightcurve(tmp_path, EPIC, *curve(8))
+    assert load_lightcurve(tmp_path, EPIC)["flux"][0] == 8
+    assert not any(name.endswith((".npy", ".json")) for name in os.listdir(variant_dir))
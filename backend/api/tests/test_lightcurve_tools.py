@@ -0,0 +1,141 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from lightcurve_tools import (_biweight_trend, _group_medians, _median_trend, _savgol_trend, downsample,
+                              lttb_indices, minmax_indices, phase_fold)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    t = np.arange(3000) * 0.02
+    trend = 1 + 0.01 * np.sin(t / 5)
+    flux = trend + rng.normal(0, 1e-4, len(t))
+    return t, flux, trend
+
+
+def reference_lttb(x, y, n_out):
+    """Textbook LTTB loop"""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    out, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n - 1)
+        if i == n_out - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = [abs((x[a] - next_x) * (y[j] - y[a]) - (x[a] - x[j]) * (next_y - y[a])) for j in range(lo, hi)]
+        a = lo + int(np.argmax(area))
+        out.append(a)
+    return np.array(out + [n - 1])
+
+
+def reference_window(y, w, statistic):
+    half = w // 2
+    return np.array([statistic(y[max(0, i - half):i + half + 1]) for i in range(len(y))])
+
+
+def test_lttb_matches_reference(series):
+    t, flux, _ = series
+    for n_out in (3, 10, 257, 1000):
+        idx = lttb_indices(t, flux, n_out)
+        assert len(idx) == n_out and idx[0] == 0 and idx[-1] == len(t) - 1
+        np.testing.assert_array_equal(idx, reference_lttb(t, flux, n_out))
+    np.testing.assert_array_equal(lttb_indices(t, flux, 5000), np.arange(len(t)))
+
+
+def test_minmax_keeps_bucket_extremes(series):
+    t, flux, _ = series
+    flux = flux.copy()
+    flux[1234] = 0.5  # one-sample transit
+    idx = minmax_indices(t, flux, 100)
+    assert len(idx) <= 100 and np.all(np.diff(idx) > 0)
+    for bucket in np.array_split(np.arange(len(t)), 50):
+        assert bucket[np.argmin(flux[bucket])] in idx and bucket[np.argmax(flux[bucket])] in idx
+    assert 1234 in idx
+
+
+def test_downsample_window(series):
+    t, flux, _ = series
+    x, y = downsample(t, flux, max_points=200, x_range=(10, 20))
+    assert len(x) == 200 and x[0] == t[t >= 10][0] and x[-1] == t[t <= 20][-1]
+    with pytest.raises(ValueError):
+        downsample(t, flux, method="every_nth")
+
+
+def test_savgol_matches_local_polynomial_fit(series):
+    _, flux, _ = series
+    w, half = 51, 25
+    offsets = np.arange(-half, half + 1)
+
+    def fit(window):
+        return np.polyval(np.polyfit(offsets, window, 2), 0)
+
+    reference = reference_window(flux, w, lambda window: fit(window) if len(window) == w else np.nan)
+    np.testing.assert_allclose(_savgol_trend(flux, w)[half:-half], reference[half:-half], atol=1e-12)
+
+
+def test_median_trend_matches_running_median(series):
+    _, flux, _ = series
+    np.testing.assert_array_equal(_median_trend(flux, 31), reference_window(flux, 31, np.median))
+    # Long windows use block medians; they stay within the noise of the exact running median
+    w = 401
+    approx = _median_trend(flux, w)
+    np.testing.assert_allclose(approx[w:-w], reference_window(flux, w, np.median)[w:-w], atol=5e-4)
+
+
+def test_biweight_matches_windowed_biweight(series):
+    _, flux, trend = series
+    flux = flux.copy()
+    flux[::97] += 0.01  # outliers the biweight must reject
+
+    def biweight(window, c=5.0):
+        location = np.median(window)
+        scale = c * np.median(np.abs(window - location))
+        for _ in range(10):
+            u = (window - location) / scale
+            weights = np.where(np.abs(u) < 1, (1 - u ** 2) ** 2, 0.0)
+            location += np.sum(weights * (window - location)) / np.sum(weights)
+        return location
+
+    w = 31
+    fast = _biweight_trend(flux, w)[w:-w]
+    reference = reference_window(flux, w, biweight)[w:-w]
+    np.testing.assert_allclose(fast, reference, atol=3e-4)
+    assert np.abs(fast - trend[w:-w]).max() < 3e-4
+
+
+def test_group_medians():
+    rng = np.random.default_rng(1)
+    bin_ids = rng.integers(0, 40, 1000)
+    values = rng.normal(size=1000)
+    expected = pd.Series(values).groupby(bin_ids).median().reindex(range(50)).to_numpy()
+    np.testing.assert_allclose(_group_medians(bin_ids, values, 50), expected)
+    order = np.argsort(values)
+    np.testing.assert_allclose(_group_medians(bin_ids[order], values[order], 50, values_sorted=True), expected)
+
+
+def test_phase_fold_matches_groupby(series):
+    t, flux, _ = series
+    periods = [0.7, 1.3, 5.0]
+    n_bins = 40
+    folded = phase_fold(t, flux, periods, n_bins=n_bins, epoch=0.1, max_chunk=len(t) * 2)
+    assert folded["mean"].shape == (3, n_bins)
+
+    for i, period in enumerate(periods):
+        phase = np.mod((t - 0.1) / period, 1.0)
+        bins = np.minimum((phase * n_bins).astype(int), n_bins - 1)
+        grouped = pd.Series(flux).groupby(bins)
+        expected = grouped.agg(["mean", "median", lambda v: v.std(ddof=0), "count"]).reindex(range(n_bins))
+        np.testing.assert_allclose(folded["mean"][i], expected["mean"], rtol=1e-12)
+        np.testing.assert_allclose(folded["median"][i], expected["median"], rtol=1e-12)
+        np.testing.assert_allclose(folded["std"][i], expected["<lambda_0>"], rtol=1e-6)
+        np.testing.assert_array_equal(folded["count"][i], expected["count"].fillna(0))
@@ -0,0 +1,101 @@
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from compact_forest import CompactForest
+from model_registry import ModelRegistry, list_versions, load_version, publish_models, read_manifest
+
+
+@pytest.fixture(scope="module")
+def models():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    forest = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(X, y)
+    return {
+        "rf": CompactForest.from_sklearn(forest),
+        "scaler": StandardScaler().fit(X),
+        "features": ["a", "b", "c", "d"],
+        "metrics": {"accuracy": 0.9},
+        "warmup_rows": X[:3],
+    }
+
+
+def test_publish_and_load(tmp_path, models):
+    assert list_versions(tmp_path, "k2") == []
+    assert publish_models(tmp_path, "k2", models, note="first") == 1
+    assert publish_models(tmp_path, "k2", models) == 2
+    assert list_versions(tmp_path, "k2") == [1, 2]
+    # Leftovers of an interrupted publish are not versions
+    (tmp_path / "k2" / ".tmp-partial").mkdir()
+    (tmp_path / "k2" / "v0003").mkdir()
+    assert list_versions(tmp_path, "k2") == [1, 2]
+
+    manifest = read_manifest(tmp_path, "k2", 1)
+    assert manifest["version"] == 1 and manifest["note"] == "first"
+    assert manifest["compact"] == ["rf"] and manifest["metrics"] == {"accuracy": 0.9}
+
+    loaded = load_version(tmp_path, "k2", 1)
+    assert loaded["version"] == "v0001" and loaded["features"] == models["features"]
+    assert isinstance(loaded["rf"], CompactForest)
+    rows = models["warmup_rows"]
+    np.testing.assert_array_equal(loaded["rf"].predict_proba(rows), models["rf"].predict_proba(rows))
+    np.testing.assert_array_equal(loaded["scaler"].mean_, models["scaler"].mean_)
+
+
+def test_concurrent_publishers_get_distinct_versions(tmp_path, models):
+    versions = []
+    threads = [threading.Thread(target=lambda: versions.append(publish_models(tmp_path, "tess", models)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(versions) == [1, 2, 3, 4] == list_versions(tmp_path, "tess")
+    assert [read_manifest(tmp_path, "tess", v)["version"] for v in versions] == versions
+
+
+def test_lease_and_hot_swap(tmp_path, models):
+    warmed = []
+    registry = ModelRegistry(tmp_path, datasets=("k2",), poll_interval=0,
+                             warmup=lambda loaded, rows: warmed.append((loaded["version"], len(rows))))
+    assert registry.get("k2") is None and not registry.load_latest("k2")
+    with registry.use("k2") as nothing:
+        assert nothing is None
+
+    publish_models(tmp_path, "k2", models)
+    assert registry.load_latest("k2") and registry.version("k2") == "v0001"
+    with registry.use("k2") as leased:
+        publish_models(tmp_path, "k2", models)
+        registry.check_for_updates()
+        # New requests get v2 while the running one keeps v1
+        assert registry.version("k2") == "v0002" and registry.get("k2")["version"] == "v0002"
+        assert leased["version"] == "v0001"
+        status = registry.status()
+        assert status["live"]["k2"]["version"] == "v0002"
+        assert status["draining"] == [{"dataset": "k2", "version": "v0001", "in_flight": 1}]
+    # Released once its last lease ends
+    assert registry.status()["draining"] == []
+    assert warmed == [("v0001", 3), ("v0002", 3)]
+
+    # Nothing newer: no reload
+    registry.check_for_updates()
+    assert len(warmed) == 2 and registry.last_error is None
+
+
+def test_failed_reload_keeps_serving(tmp_path, models):
+    registry = ModelRegistry(tmp_path, datasets=("k2",), poll_interval=0)
+    publish_models(tmp_path, "k2", models)
+    registry.check_for_updates()
+    publish_models(tmp_path, "k2", models)
+    (tmp_path / "k2" / "v0002" / "models.joblib").write_bytes(b"not a pickle")
+    registry.check_for_updates()
+    assert registry.version("k2") == "v0001"
+    assert registry.last_error.startswith("k2:")
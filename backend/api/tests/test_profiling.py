@@ -0,0 +1,87 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import profiling
+from profiling import ProfilingMiddleware, list_profiles, profile_path
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profile_dir=tmp_path)
+    app.state.release = None
+
+    @app.get("/work")
+    def work():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        return {"ok": True}
+
+    @app.get("/wait")
+    async def wait():
+        await app.state.release.wait()
+        return {"ok": True}
+
+    return app
+
+
+def test_requests_need_admin_and_a_known_mode(app, tmp_path):
+    client = TestClient(app)
+    assert "x-profile-id" not in client.get("/work").headers
+    assert client.get("/work", headers={"X-Profile": "1"}).status_code == 403
+    assert client.get("/work", headers={"X-Profile": "1", "X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/work", headers={**ADMIN, "X-Profile": "perf"}).status_code == 400
+    assert list_profiles(tmp_path) == []
+
+
+@pytest.mark.parametrize("mode", ["sampling", "cprofile"])
+def test_profile_is_stored(app, tmp_path, mode):
+    response = TestClient(app).get(f"/work?profile={mode}", headers=ADMIN)
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    [meta] = list_profiles(tmp_path)
+    assert meta["id"] == profile_id and meta["mode"] == mode and meta["path"] == "/work"
+    assert meta["status_code"] == 200 and meta["duration_ms"] >= 50
+    top = json.loads(profile_path(profile_id, profile_dir=tmp_path).read_text())["top"]
+    assert top["self"] and top["total"]
+    assert profile_path(profile_id, "collapsed.txt", tmp_path).read_text()
+    assert (profile_path(profile_id, "profile.prof", tmp_path) is not None) == (mode == "cprofile")
+    assert profile_path("../x", profile_dir=tmp_path) is None
+
+
+def test_one_cprofile_request_at_a_time(app, tmp_path):
+    async def run():
+        app.state.release = asyncio.Event()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {**ADMIN, "X-Profile": "cprofile"}
+            first = asyncio.create_task(client.get("/wait", headers=headers))
+            await asyncio.sleep(0.1)
+            second = await client.get("/wait", headers=headers)
+            # Sampling is not affected
+            sampled = await client.get("/work", headers={**ADMIN, "X-Profile": "sampling"})
+            app.state.release.set()
+            return await first, second, sampled, await client.get("/wait", headers=headers)
+
+    first, second, sampled, after = asyncio.run(run())
+    assert first.status_code == 200 and "x-profile-id" in first.headers
+    assert second.status_code == 409
+    assert sampled.status_code == 200
+    # The lock is released once the first profile is stored
+    assert after.status_code == 200
+    assert len(list_profiles(tmp_path)) == 3
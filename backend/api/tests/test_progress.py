@@ -0,0 +1,76 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import progress
+from progress import MAX_PARTIAL_PAYLOADS, format_sse, get_job, start_job
+
+
+def strict_json(text):
+    def reject(constant):
+        raise ValueError(f"not JSON: {constant}")
+    return json.loads(text, parse_constant=reject)
+
+
+def wait(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.done
+
+
+def test_events_are_strict_json():
+    def failed_fpp(progress):
+        progress("candidate", FPP=float("nan"), NFPP=np.float64("inf"))
+        return {"FPP": float("nan"), "NFPP": None, "flux": np.array([1.0, np.nan])}
+
+    job = start_job("test", failed_fpp)
+    wait(job)
+    assert job.result == {"FPP": None, "NFPP": None, "flux": [1.0, None]}
+    for event in job.events_since():
+        message = format_sse(event)
+        data = message.split("data: ", 1)[1].rstrip("\n")
+        assert strict_json(data)["stage"] == event["stage"]
+    assert strict_json(format_sse(job.events[1]).split("data: ", 1)[1])["FPP"] is None
+
+
+def test_partial_payloads_are_capped_and_compacted():
+    release = []
+
+    def classify(progress):
+        for i in range(MAX_PARTIAL_PAYLOADS + 5):
+            progress("partial", rows_done=i + 1, n_rows=100, predictions=[{"row": i}])
+        while not release:
+            time.sleep(0.01)
+        return [{"row": i} for i in range(MAX_PARTIAL_PAYLOADS + 5)]
+
+    job = start_job("test", classify)
+    deadline = time.time() + 5
+    while len(job.events) < MAX_PARTIAL_PAYLOADS + 6 and time.time() < deadline:
+        time.sleep(0.01)
+    partials = [e for e in job.events_since() if e["stage"] == "partial"]
+    assert sum("predictions" in e for e in partials) == MAX_PARTIAL_PAYLOADS
+    assert partials[0] == {"id": 1, "stage": "partial", "time": partials[0]["time"],
+                           "rows_done": 1, "n_rows": 100, "compacted": True}
+    assert "predictions" in partials[-1]
+
+    release.append(True)
+    wait(job)
+    partials = [e for e in job.events_since() if e["stage"] == "partial"]
+    assert all(e.get("compacted") and "predictions" not in e for e in partials)
+    assert [e["id"] for e in job.events_since()] == list(range(len(job.events)))
+    assert len(job.events[-1]["result"]) == MAX_PARTIAL_PAYLOADS + 5
+
+
+def test_expired_jobs_are_dropped_on_read(monkeypatch):
+    job = start_job("test", lambda progress: 1)
+    wait(job)
+    assert get_job(job.id) is job
+    monkeypatch.setattr(progress, "JOB_TTL", 0)
+    job.finished -= 1
+    assert get_job(job.id) is None
@@ -0,0 +1,90 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from results_store import ResultsStore, target_id_of
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite", enabled=True, batch_size=50, flush_interval=0.05)
+    store.start()
+    yield store
+    store.close()
+
+
+def test_batched_writes(tmp_path, capsys):
+    store = ResultsStore(tmp_path / "results.sqlite", enabled=True, batch_size=50)
+    for i in range(120):
+        store.record("classification", target_id=f"EPIC {i}", dataset="k2", model_version="v0001",
+                     prediction="CONFIRMED" if i % 2 else "FALSE POSITIVE", score=i / 120, payload={"row": i})
+    assert store.status()["pending"] == 120
+    store.start()
+    store.close()
+    assert store.status() == dict(store.status(), pending=0, written=120, errors=0)
+    # One transaction per batch of at most batch_size results
+    assert [line.split()[1] for line in capsys.readouterr().out.splitlines()] == ["50", "50", "20"]
+
+    rows, total = store.query("results", {"target_id": "EPIC 7"})
+    assert total == 1 and rows[0]["payload"] == {"row": 7} and rows[0]["kind"] == "classification"
+    assert store.query("targets")[1] == 120
+
+
+def test_targets_keep_latest_scores(store):
+    store.record("classification", target_id="K2-18 b", dataset="k2", score=0.9, prediction="CONFIRMED")
+    store.record("fpp", target_id="K2-18 b", dataset="k2", fpp=0.01, nfpp="Nan")
+    store.record("habitability", target_id="K2-18 b", dataset="k2", habitability=0.7)
+    store.record("classification", target_id="K2-18 b", dataset="k2", score=0.8)
+    store.record("classification", dataset="k2", score=0.5)
+    store.flush()
+
+    [target], total = store.query("targets")
+    assert total == 1
+    assert (target["score"], target["fpp"], target["nfpp"], target["habitability"], target["prediction"]) == \
+        (0.8, 0.01, None, 0.7, "CONFIRMED")
+    assert store.query("results", {"target_id": "K2-18 b"})[1] == 4
+    assert store.query("results")[1] == 5
+
+
+def test_query_ranges_and_sort(store):
+    for i, (score, nfpp) in enumerate([(0.2, 0.5), (0.9, 0.01), (0.6, None), (0.95, 0.2)]):
+        store.record("classification", target_id=f"T{i}", dataset="tess", score=score, nfpp=nfpp)
+    store.flush()
+
+    rows, total = store.query("targets", {"score_min": 0.5, "score_max": 0.92}, sort="score", order="asc")
+    assert total == 2 and [r["target_id"] for r in rows] == ["T2", "T1"]
+    rows, _ = store.query("targets", sort="nfpp", order="asc")
+    # Missing values sort last in either order
+    assert [r["target_id"] for r in rows] == ["T1", "T3", "T0", "T2"]
+    rows, _ = store.query("targets", sort="nfpp", order="desc")
+    assert [r["target_id"] for r in rows] == ["T0", "T3", "T1", "T2"]
+    rows, total = store.query("targets", {"nfpp_max": 0.3, "dataset": "tess"}, sort="score", limit=1, offset=1)
+    assert total == 2 and [r["target_id"] for r in rows] == ["T1"]
+    assert store.query("targets", {"dataset": "k2"}) == ([], 0)
+    assert store.query("results", {"since": "2000-01-01", "until": "2999-01-01"})[1] == 4
+
+    with pytest.raises(ValueError):
+        store.query("targets", {"kind": "fpp"})
+    with pytest.raises(ValueError):
+        store.query("targets", sort="created")
+    with pytest.raises(ValueError):
+        store.query("targets", order="up")
+
+
+def test_disabled_store(tmp_path):
+    store = ResultsStore(tmp_path / "off.sqlite", enabled=False)
+    store.start()
+    store.record("classification", target_id="x", score=1)
+    assert store.query("results") == ([], 0)
+    assert not (tmp_path / "off.sqlite").exists()
+
+
+def test_target_id_of():
+    assert target_id_of({"pl_name": "K2-18 b", "epic": 201912552}) == "K2-18 b"
+    assert target_id_of({"pl_name": float("nan"), "tic_id": 12345.0}) == "12345"
+    assert target_id_of({"toi": 1234.01}) == "1234.01"
+    assert target_id_of({"pl_name": ""}, explicit=7) == "7"
+    assert target_id_of({}) is None
@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from score_catalog import score_catalog
+
+FEATURES = ["pl_orbper", "st_teff"]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 12
+    df = pd.DataFrame({
+        "pl_name": [f"K2-{i} b" for i in range(n)],
+        "disposition": ["CONFIRMED", "FALSE POSITIVE"] * (n // 2),
+        # Sparse text: blank in the first chunks, set further down
+        "st_spectype": [None] * 5 + ["G", None, "K2 V", None, "M", None, "F"],
+        "notes": [None] * n,
+        "pl_orbper": rng.uniform(1, 30, n),
+        "st_teff": rng.uniform(3000, 7000, n),
+    })
+    df.loc[3, "pl_orbper"] = np.nan
+    csv = tmp_path / "catalog.csv"
+    df.to_csv(csv, index=False)
+
+    X = df[FEATURES].fillna(df[FEATURES].median())
+    scaler = StandardScaler().fit(X)
+    y = (df["disposition"] == "CONFIRMED").astype(int)
+    models = {
+        "features": FEATURES,
+        "median_values": df[FEATURES].median(),
+        "scaler": scaler,
+        "rf": RandomForestClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), y),
+    }
+    models_file = tmp_path / "models.joblib"
+    joblib.dump(models, models_file)
+    return df, csv, models_file, models
+
+
+def test_sparse_string_columns_across_chunks(tmp_path, catalog):
+    df, csv, models_file, models = catalog
+    out = tmp_path / "scores.parquet"
+
+    summary = score_catalog("k2", csv, out, chunk_rows=1, max_workers=1,
+                            keep=["pl_name", "st_spectype", "notes", "pl_orbper"], models_file=models_file)
+
+    table = pq.read_table(out)
+    assert summary["rows"] == len(df) == table.num_rows
+    assert str(table.schema.field("st_spectype").type) == "string"
+    assert str(table.schema.field("notes").type) == "string"
+    assert str(table.schema.field("pl_orbper").type) == "double"
+
+    result = table.to_pandas()
+    assert result["row"].tolist() == list(range(len(df)))
+    assert result["st_spectype"].tolist()[5:8] == ["G", None, "K2 V"]
+    assert result["notes"].isna().all()
+
+    X = models["scaler"].transform(df[FEATURES].fillna(models["median_values"]))
+    np.testing.assert_allclose(result["rf_proba"], models["rf"].predict_proba(X)[:, 1])
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import tracing
+from tracing import TracingMiddleware, begin, cache_outcome, end, note, span
+
+
+def read_log(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_spans_follow_to_thread(tmp_path):
+    def work():
+        with span("inner", rows=3):
+            cache_outcome("response", False)
+        return tracing.current_id()
+
+    async def handler():
+        with span("outer"):
+            return await asyncio.to_thread(work)
+
+    async def run():
+        trace, token = begin("test")
+        worker_id = await handler()
+        end(trace, token, threshold_ms=0, log_path=tmp_path / "slow.jsonl")
+        return trace, worker_id
+
+    trace, worker_id = asyncio.run(run())
+    assert worker_id == trace.id
+    assert set(trace.stages) == {"outer", "outer/inner"}
+    assert trace.caches == {"response": {"miss": 1}}
+    assert tracing.current_id() is None
+
+
+def test_slow_log_entry(tmp_path):
+    log_path = tmp_path / "slow.jsonl"
+    trace, token = begin("job triceratops", "abc-123")
+    note(rows=10)
+    with span("parse"):
+        with span("csv"):
+            pass
+    cache_outcome("trilegal", "stale")
+    end(trace, token, threshold_ms=0, log_path=log_path)
+    fast, token = begin("fast")
+    end(fast, token, threshold_ms=60_000, log_path=log_path)
+
+    [entry] = read_log(log_path)
+    assert entry["trace_id"] == "abc-123" and entry["name"] == "job triceratops" and entry["rows"] == 10
+    assert set(entry) == {"trace_id", "name", "started", "duration_ms", "rows", "stages", "untracked_ms",
+                          "caches", "spans"}
+    assert set(entry["stages"]) == {"parse", "parse/csv"}
+    assert abs(entry["untracked_ms"] - (entry["duration_ms"] - entry["stages"]["parse"])) < 0.01
+    assert entry["caches"] == {"trilegal": {"stale": 1}}
+    assert [s["stage"] for s in entry["spans"]] == ["parse/csv", "parse"]
+    assert set(entry["spans"][0]) == {"stage", "start_ms", "ms"}
+
+
+def test_middleware_skips_event_streams(tmp_path):
+    log_path = tmp_path / "slow.jsonl"
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, threshold_ms=0, log_path=log_path)
+
+    @app.post("/echo")
+    async def echo(body: dict):
+        return body
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"]), media_type="text/event-stream")
+
+    client = TestClient(app)
+    response = client.post("/echo", json={"x": 1}, headers={"X-Request-Id": "req-1"})
+    assert response.headers["x-trace-id"] == "req-1"
+    streamed = client.get("/events")
+    assert streamed.headers["x-trace-id"]
+    # An unusable caller ID is replaced
+    assert client.get("/events", headers={"X-Request-Id": "bad id!"}).headers["x-trace-id"] != "bad id!"
+
+    [entry] = read_log(log_path)
+    assert entry["name"] == "POST /echo" and entry["trace_id"] == "req-1"
+    assert entry["status_code"] == 200
+    assert entry["input_bytes"] == len(b'{"x":1}') and entry["output_bytes"] == len(response.content)
@@ -0,0 +1,235 @@
+"""
+Request-scoped traces, stage spans and the slow-request log
+Every API request (TracingMiddleware) and background job (progress.start_job)
+runs under a Trace with an ID, returned in the X-Trace-Id header (a caller's
+X-Request-Id is reused). Code anywhere below it - main, ml_wrappers, the
+TRICERATOPS module - marks stages with span(), adds request details with note(),
+counts cache hits and misses with cache_outcome() and prints diagnostics with
+log(), which prefixes the trace ID so lines of concurrent requests can be told
+apart. The trace is held in a context variable, so it follows asyncio.to_thread;
+worker processes (parallel FPP candidates) are timed as one span in the parent.
+
+A trace lasting at least SLOW_REQUEST_MS (default 1000) is appended to
+SLOW_LOG (model/data/slow_requests.jsonl) as one JSON line with its stage
+timings, input and output sizes and cache outcomes.
+Outside a trace span/note/cache_outcome do nothing.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+SLOW_LOG = Path(os.environ.get(
+    "SLOW_LOG", Path(__file__).parent.parent.parent / "model" / "data" / "slow_requests.jsonl"
+))
+# The log is rotated to <SLOW_LOG>.1 beyond this size
+SLOW_LOG_MAX_BYTES = 20 * 1024 * 1024
+# Spans kept per trace (stage totals still count every span)
+MAX_SPANS = 500
+# Responses that stay open by design (job event streams); their duration is not latency
+STREAM_CONTENT_TYPES = (b"text/event-stream",)
+
+_current = ContextVar("trace", default=None)
+_parent = ContextVar("span_path", default="")
+_log_lock = threading.Lock()
+_trace_id_pattern = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    """Spans, details and cache outcomes of one request or job"""
+
+    def __init__(self, name, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = datetime.utcnow().isoformat()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.stages = defaultdict(float)
+        self.info = {}
+        self.caches = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add_span(self, path, start, end, info):
+        with self._lock:
+            self.stages[path] += (end - start) * 1e3
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append({
+                    "stage": path,
+                    "start_ms": round((start - self.start) * 1e3, 3),
+                    "ms": round((end - start) * 1e3, 3),
+                    **info,
+                })
+
+    def record(self):
+        """The trace as a slow-log entry"""
+        with self._lock:
+            return {
+                "trace_id": self.id,
+                "name": self.name,
+                "started": self.started,
+                "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+                **self.info,
+                "stages": {path: round(ms, 3) for path, ms in self.stages.items()},
+                # Time outside every top-level span (request parsing, middleware, waiting)
+                "untracked_ms": round(self.duration_ms - sum(
+                    ms for path, ms in self.stages.items() if "/" not in path
+                ), 3) if self.duration_ms is not None else None,
+                "caches": {name: dict(outcomes) for name, outcomes in self.caches.items()},
+                "spans": list(self.spans),
+            }
+
+
+def current_id():
+    """ID of the active trace, or None"""
+    trace = _current.get()
+    return trace.id if trace is not None else None
+
+
+class span:
+    """
+    Time a stage of the active trace: with span("predict", rows=n): ...
+    Nested spans are recorded as "outer/inner"; extra keyword values are kept
+    with the span. Does nothing outside a trace.
+    """
+    __slots__ = ("name", "info", "trace", "token", "start")
+
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = info
+        self.trace = None
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            parent = _parent.get()
+            self.token = _parent.set(f"{parent}/{self.name}" if parent else self.name)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            end = time.perf_counter()
+            path = _parent.get()
+            _parent.reset(self.token)
+            info = dict(self.info, error=exc_type.__name__) if exc_type is not None else self.info
+            self.trace.add_span(path, self.start, end, info)
+        return False
+
+
+def note(**info):
+    """Add details (input size, dataset, model...) to the active trace"""
+    trace = _current.get()
+    if trace is not None:
+        with trace._lock:
+            trace.info.update(info)
+
+
+def cache_outcome(cache, outcome):
+    """Count a lookup in a named cache for the active trace (outcome: True/False for hit/miss, or a label)"""
+    trace = _current.get()
+    if trace is not None:
+        if isinstance(outcome, bool):
+            outcome = "hit" if outcome else "miss"
+        with trace._lock:
+            trace.caches[cache][outcome] += 1
+
+
+def log(*args):
+    """print, prefixed with the active trace ID"""
+    trace = _current.get()
+    if trace is not None:
+        print(f"[{trace.id}]", *args)
+    else:
+        print(*args)
+
+
+def begin(name, trace_id=None):
+    """Start a trace in the current context; returns (trace, token for end)"""
+    trace = Trace(name, trace_id)
+    return trace, _current.set(trace)
+
+
+def end(trace, token, threshold_ms=SLOW_REQUEST_MS, log_path=SLOW_LOG):
+    """Finish a trace started by begin and write it to the slow log if it took threshold_ms or more"""
+    trace.duration_ms = (time.perf_counter() - trace.start) * 1e3
+    _current.reset(token)
+    if trace.duration_ms >= threshold_ms:
+        write_slow(trace.record(), log_path)
+
+
+def write_slow(entry, log_path=SLOW_LOG):
+    path = Path(log_path)
+    line = json.dumps(entry, default=str) + "\n"
+    try:
+        with _log_lock:
+            os.makedirs(path.parent, exist_ok=True)
+            if path.exists() and path.stat().st_size > SLOW_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, "a") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"⚠ Could not write slow log: {e}")
+        return
+    stages = sorted(entry["stages"].items(), key=lambda s: -s[1])[:3]
+    print(f"[{entry['trace_id']}] Slow: {entry['name']} took {entry['duration_ms']:.0f} ms "
+          f"({', '.join(f'{path} {ms:.0f} ms' for path, ms in stages) or 'no stages'})")
+
+
+class TracingMiddleware:
+    """
+    Run each HTTP request under a Trace, add X-Trace-Id and log slow requests.
+    Streaming responses (STREAM_CONTENT_TYPES) get a trace ID but never enter the slow log.
+    """
+
+    def __init__(self, app, threshold_ms=SLOW_REQUEST_MS, log_path=SLOW_LOG):
+        self.app = app
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                trace_id = value if _trace_id_pattern.match(value) else None
+                break
+        trace, token = begin(f"{scope['method']} {scope['path']}", trace_id)
+        sizes = {"input_bytes": 0, "output_bytes": 0}
+        streaming = False
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["input_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def send_traced(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                trace.info["status_code"] = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.split(b";")[0].strip() in STREAM_CONTENT_TYPES
+                    for name, value in message.get("headers", [])
+                )
+                message = {**message, "headers": [*message.get("headers", []),
+                                                   (b"x-trace-id", trace.id.encode())]}
+            elif message["type"] == "http.response.body":
+                sizes["output_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_traced)
+        finally:
+            trace.info.update(sizes)
+            end(trace, token, float("inf") if streaming else self.threshold_ms, self.log_path)
@@ -0,0 +1,653 @@
+"""
+Config-driven training for the K2 and TESS classifiers
+One pipeline for both missions, driven by a mission schema (label column and
+values, ignored columns, missing-value policy): features are built once per
+catalog file and cached as arrays, then the random forest (with SMOTE), the
+fast tier and the MLP are trained, evaluated on a held-out split and compacted.
+The API (ml_wrappers.load_*_models), publish_models.py and the predict scripts
+all train through train_models.
+
+As a command it runs unattended and writes, per mission, models.joblib,
+forests.joblib (the uncompacted forests), metrics.json, candidates.csv (every
+unlabeled row with its prediction), exoplanets_to_confirm.csv (predicted
+planets with complete stellar data) and snapshot.csv (the baseline refresh.py
+diffs the next catalog against):
+
+    python training.py [k2] [tess] [--config training.json] [--evaluate] [--publish]
+                       [--imbalance smote|smote_cached|class_weight] [--benchmark-imbalance]
+
+Config keys (JSON, all optional) are those of DEFAULT_CONFIG.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+from imblearn.over_sampling import SMOTE
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+import imblearn
+
+from compact_forest import CompactForest, load_compact_forest, save_compact_forest
+
+backend_path = Path(__file__).parent.parent
+DATA_DIR = backend_path / "RF & MLP Classifiers" / "data"
+
+# Cached feature arrays, one .npz per mission and catalog/schema hash
+FEATURE_CACHE_DIR = backend_path.parent / "model" / "data" / "features"
+# Default output directory of the training command
+TRAINING_DIR = backend_path.parent / "model" / "data" / "training"
+
+# Compact (quantized, memory-mapped) copies of the served forests
+COMPACT_MODEL_DIR = backend_path.parent / "model" / "data" / "compact_models"
+# Set COMPACT_FORESTS=0 to serve the original sklearn forests
+COMPACT_FORESTS = os.environ.get("COMPACT_FORESTS", "1") != "0"
+
+# Winning hyperparameters from tuning.py (<dataset>.json); set TUNED_PARAMS=0 to
+# train with the defaults even when a tuning result exists
+TUNING_DIR = backend_path.parent / "model" / "data" / "tuning"
+USE_TUNED_PARAMS = os.environ.get("TUNED_PARAMS", "1") != "0"
+DEFAULT_PARAMS = {"rf": {"n_estimators": 100}, "mlp": {"max_iter": 500}}
+
+# Fast serving tier: a small depth-limited forest for interactive requests
+FAST_TIER_PARAMS = {"n_estimators": 20, "max_depth": 10}
+
+# Class imbalance handling for the forests (the MLP always trains on the raw split):
+# "smote" resamples on every fit, "smote_cached" reuses resamples stored under
+# SMOTE_CACHE_DIR by a hash of the training split, "class_weight" skips resampling
+# and fits with balanced class weights
+IMBALANCE_METHODS = ("smote", "smote_cached", "class_weight")
+IMBALANCE = os.environ.get("TRAINING_IMBALANCE", "smote")
+SMOTE_CACHE_DIR = backend_path.parent / "model" / "data" / "smote_cache"
+
+# Mission schemas (the logic of k2_predict.py / tess_predict.py)
+MISSIONS = {
+    "k2": {
+        "name": "K2",
+        "csv": DATA_DIR / "k2.csv",
+        "label_column": "disposition",
+        "positive": ["CONFIRMED"],
+        "negative": ["FALSE POSITIVE", "REFUTED"],
+        "ignore": [
+            'disposition', 'target', 'pl_name', 'kepid', 'kepoi_name', 'kepler_name', 'hostname', 'toi', 'tid',
+            'sy_pnum', 'default_flag', 'disp_refname', 'pl_refname', 'st_refname', 'sy_refname', 'pl_bmassprov',
+            'rastr', 'decstr', 'rowupdate', 'pl_pubdate', 'releasedate', 'soltype', 'pl_controv_flag', 'ttv_flag',
+            'sy_snum', 'discoverymethod', 'disc_facility', 'st_spectype'
+        ],
+        "ignore_suffixes": ["lim", "refname"],
+        "zero_is_missing": False,
+        "missing": "median",  # fill with the labeled rows' medians
+        "confirm_required": ['st_mass', 'st_rad', 'st_teff', 'st_logg', 'sy_dist', 'sy_vmag', 'sy_kmag', 'st_met',
+                             'ra', 'dec'],
+        # Row identity across catalog snapshots (refresh.py); pl_name alone repeats per parameter set
+        "id_columns": ['pl_name', 'pl_refname', 'default_flag'],
+        "updated_column": "rowupdate",
+    },
+    "tess": {
+        "name": "TESS",
+        "csv": DATA_DIR / "tess.csv",
+        "label_column": "tfopwg_disp",
+        "positive": ["CP"],
+        "negative": ["FP", "AFP"],
+        "ignore": ['toi', 'tid', 'tfopwg_disp', 'toi_created', 'rowupdate', 'rastr', 'decstr', 'ra', 'dec', 'target'],
+        "ignore_suffixes": ["err1", "err2", "lim"],
+        "zero_is_missing": True,
+        "missing": "drop",  # drop rows with any missing feature
+        "confirm_required": ['st_teff', 'st_rad', 'st_logg', 'st_dist', 'st_tmag', 'ra', 'dec'],
+        "id_columns": ['toi'],
+        "updated_column": "rowupdate",
+    },
+}
+FEATURE_CACHE_VERSION = 1
+
+DEFAULT_CONFIG = {
+    "missions": ["k2", "tess"],
+    "output_dir": str(TRAINING_DIR),
+    "test_size": 0.2,
+    "random_state": 42,
+    "feature_cache": True,
+    # One of IMBALANCE_METHODS
+    "imbalance": IMBALANCE,
+    # Per-mission hyperparameter overrides, e.g. {"k2": {"rf": {"n_estimators": 50}}}
+    "params": {},
+    # Cross-validate (evaluation.py) and store the results with the artifacts
+    "evaluate": False,
+    # Publish the trained models to the API model registry
+    "publish": False,
+    # Extra copies of exoplanets_to_confirm.csv per mission, e.g. {"k2": "../TRICERATOPS/model/exoplanets_to_confirm.csv"}
+    "confirm_csv": {},
+}
+
+
+def encode_target(values, schema):
+    """1 for planets, 0 for false positives, -1 for unlabeled candidates"""
+    return np.where(values.isin(schema["positive"]), 1, np.where(values.isin(schema["negative"]), 0, -1))
+
+
+def _feature_key(mission, csv=None):
+    schema = MISSIONS[mission]
+    h = hashlib.sha1()
+    with open(csv or schema["csv"], "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(json.dumps({**schema, "version": FEATURE_CACHE_VERSION}, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def prepare_rows(rows, schema, features, median_values):
+    """Feature matrix of catalog rows under a schema's missing-value policy (rows with gaps dropped under "drop")"""
+    X = rows[features].copy()
+    if schema["zero_is_missing"]:
+        X = X.replace(0, np.nan)
+    if schema["missing"] == "median":
+        X = X.fillna(median_values)
+    else:
+        X = X.dropna()
+    return X.astype(np.float64)
+
+
+def _compute_features(mission, csv=None):
+    schema = MISSIONS[mission]
+    df = pd.read_csv(csv or schema["csv"])
+    df['target'] = encode_target(df[schema["label_column"]], schema)
+    labeled = df[df['target'] != -1]
+    candidates = df[df['target'] == -1]
+
+    ignore = list(schema["ignore"])
+    ignore += [col for col in df.columns if any(col.endswith(suffix) for suffix in schema["ignore_suffixes"])]
+    features = [c for c in df.columns if c not in ignore and pd.api.types.is_numeric_dtype(df[c])]
+
+    median_values = labeled[features].median()
+    X_labeled = prepare_rows(labeled, schema, features, median_values)
+    y = labeled['target'].loc[X_labeled.index]
+    return {
+        "features": features,
+        "X_labeled": X_labeled,
+        "y": y.astype(int),
+        "X_candidates": prepare_rows(candidates, schema, features, median_values),
+        "median_values": median_values,
+    }
+
+
+def build_features(mission, use_cache=True, csv=None):
+    """
+    Feature matrices of a mission's catalog (csv overrides the schema's file):
+    X_labeled and y (labeled rows), X_candidates (unlabeled rows), features and
+    median_values. Arrays are cached by a hash of the catalog file and schema.
+    """
+    key = _feature_key(mission, csv)
+    path = FEATURE_CACHE_DIR / f"{mission}-{key}.npz"
+    if use_cache and path.exists():
+        data = np.load(path)
+        features = [str(f) for f in data["features"]]
+        return {
+            "mission": mission,
+            "key": key,
+            "features": features,
+            "X_labeled": pd.DataFrame(data["X_labeled"], index=data["labeled_index"], columns=features),
+            "y": pd.Series(data["y"], index=data["labeled_index"], name="target"),
+            "X_candidates": pd.DataFrame(data["X_candidates"], index=data["candidate_index"], columns=features),
+            "median_values": pd.Series(data["median_values"], index=features),
+        }
+
+    start = time.perf_counter()
+    fs = _compute_features(mission, csv)
+    if use_cache:
+        os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+        tmp = FEATURE_CACHE_DIR / f".{mission}-{uuid.uuid4().hex}.npz"
+        np.savez(
+            tmp,
+            features=np.array(fs["features"]),
+            X_labeled=fs["X_labeled"].values,
+            labeled_index=fs["X_labeled"].index.values,
+            y=fs["y"].values,
+            X_candidates=fs["X_candidates"].values,
+            candidate_index=fs["X_candidates"].index.values,
+            median_values=fs["median_values"].values.astype(np.float64),
+        )
+        os.replace(tmp, path)
+    print(f"{MISSIONS[mission]['name']} features: {len(fs['y'])} labeled, {len(fs['X_candidates'])} candidates, "
+          f"{len(fs['features'])} features in {time.perf_counter() - start:.2f}s")
+    return {"mission": mission, "key": key, **fs}
+
+
+def _smote_key(X, y, random_state):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    h.update(f"{random_state}:{imblearn.__version__}".encode())
+    return h.hexdigest()[:20]
+
+
+def resample(X_train, y_train, method=IMBALANCE, random_state=42, cache_dir=SMOTE_CACHE_DIR):
+    """
+    Forest training rows under an imbalance method
+    Returns (X, y, forest_params): SMOTE-resampled rows (freshly computed or
+    from the cache), or the original rows with class_weight="balanced"
+    """
+    if method == "class_weight":
+        return X_train, y_train, {"class_weight": "balanced"}
+    if method == "smote":
+        X_res, y_res = SMOTE(random_state=random_state).fit_resample(X_train, y_train)
+        return X_res, y_res, {}
+    if method != "smote_cached":
+        raise ValueError(f"Unknown imbalance method '{method}' (expected one of {', '.join(IMBALANCE_METHODS)})")
+
+    path = Path(cache_dir) / f"{_smote_key(X_train, y_train, random_state)}.npz"
+    if path.exists():
+        data = np.load(path)
+        return data["X"], data["y"], {}
+    X_res, y_res = SMOTE(random_state=random_state).fit_resample(X_train, y_train)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = Path(cache_dir) / f".{uuid.uuid4().hex}.npz"
+    np.savez(tmp, X=np.asarray(X_res, dtype=np.float64), y=np.asarray(y_res))
+    os.replace(tmp, path)
+    return X_res, y_res, {}
+
+
+def model_params(dataset, key):
+    """Constructor arguments for a dataset's "rf" or "mlp": tuned if available, else the defaults"""
+    params = DEFAULT_PARAMS[key]
+    path = TUNING_DIR / f"{dataset}.json"
+    if USE_TUNED_PARAMS and path.exists():
+        with open(path) as f:
+            params = json.load(f).get(key, {}).get("params", params)
+    return {**params, "random_state": 42}
+
+
+def _predict_latency_ms(model, X, repeats=25):
+    """Median wall time of predict_proba on X, in milliseconds"""
+    model.predict_proba(X)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(X)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1e3)
+
+
+def holdout_metrics(models, X_test, y_test, keys=("rf", "rf_fast", "mlp")):
+    """Precision, recall, F1 and accuracy of each model on the held-out split"""
+    metrics = {}
+    for key in keys:
+        pred = models[key].predict(X_test)
+        metrics[key] = {
+            "precision": float(precision_score(y_test, pred, zero_division=0)),
+            "recall": float(recall_score(y_test, pred, zero_division=0)),
+            "f1": float(f1_score(y_test, pred, zero_division=0)),
+            "accuracy": float(accuracy_score(y_test, pred))
+        }
+    return metrics
+
+
+def compact_forests(models, X_test, name, keys=("rf", "rf_fast"), bits=8):
+    """
+    Replace the sklearn forests in models with CompactForest copies saved to
+    COMPACT_MODEL_DIR and reopened memory-mapped. A forest whose compact copy
+    strays beyond the quantization bound on X_test is kept as-is.
+    Returns per-forest stats (sizes, max probability error, label agreement).
+    """
+    stats = {}
+    for key in keys:
+        forest = models[key]
+        compact = CompactForest.from_sklearn(forest, bits=bits)
+        check = compact.compare(forest, X_test)
+        if check["max_abs_error"] > check["bound"] + 1e-9:
+            print(f"{name} {key}: compact forest exceeds tolerance ({check['max_abs_error']:.2e}); keeping sklearn model")
+            continue
+
+        path = COMPACT_MODEL_DIR / f"{name.lower()}_{key}"
+        save_compact_forest(str(path), compact)
+        models[key] = load_compact_forest(str(path))
+        stats[key] = {
+            **check,
+            "nodes": {"original": compact.meta["original_nodes"],
+                      "compact": compact.meta["n_internal"] + compact.meta["n_leaves"]},
+            "bytes": compact.nbytes(),
+            "path": str(path)
+        }
+        print(f"{name} {key}: compact forest {compact.nbytes() / 1e6:.2f} MB, "
+              f"max |dp| {check['max_abs_error']:.1e} (bound {check['bound']:.1e})")
+    return stats
+
+
+def build_fast_tier(X_train, y_train, X_test, y_test, full_model, name, extra_params=None):
+    """
+    Train the fast-tier forest on the same (SMOTE) training data and imbalance
+    settings (extra_params) as the full forest and compare the two on the
+    held-out split
+    Returns (fast_model, stats); stats has agreement, accuracy, latency and size
+    """
+    fast_model = RandomForestClassifier(random_state=42, **FAST_TIER_PARAMS, **(extra_params or {}))
+    fast_model.fit(X_train, y_train)
+
+    fast_pred = fast_model.predict(X_test)
+    full_pred = full_model.predict(X_test)
+    batch = X_test[:1000]
+    stats = {
+        "agreement": float(np.mean(fast_pred == full_pred)),
+        "accuracy": {
+            "fast": float(np.mean(fast_pred == np.asarray(y_test))),
+            "full": float(np.mean(full_pred == np.asarray(y_test)))
+        },
+        "latency_ms": {
+            "fast": _predict_latency_ms(fast_model, X_test[:1]),
+            "full": _predict_latency_ms(full_model, X_test[:1])
+        },
+        "batch_latency_ms": {
+            "rows": len(batch),
+            "fast": _predict_latency_ms(fast_model, batch, repeats=5),
+            "full": _predict_latency_ms(full_model, batch, repeats=5)
+        },
+        "nodes": {
+            "fast": int(sum(tree.tree_.node_count for tree in fast_model.estimators_)),
+            "full": int(sum(tree.tree_.node_count for tree in full_model.estimators_))
+        },
+        "params": {**FAST_TIER_PARAMS, **(extra_params or {})}
+    }
+    print(
+        f"{name} fast tier: agreement {stats['agreement']:.3f}, "
+        f"accuracy {stats['accuracy']['fast']:.3f} vs {stats['accuracy']['full']:.3f}, "
+        f"latency {stats['latency_ms']['fast']:.2f} ms vs {stats['latency_ms']['full']:.2f} ms per row, "
+        f"{stats['nodes']['fast']} vs {stats['nodes']['full']} nodes"
+    )
+    return fast_model, stats
+
+
+def train_models(mission, feature_set=None, params=None, test_size=0.2, random_state=42, imbalance=None,
+                 keep_forests=False):
+    """
+    Train a mission's models on its labeled rows (scaler, 80/20 stratified
+    split, random forest on SMOTE-resampled rows, fast tier, MLP without SMOTE)
+    params optionally overrides the constructor arguments per model ("rf", "mlp");
+    imbalance picks one of IMBALANCE_METHODS (default: TRAINING_IMBALANCE);
+    keep_forests keeps the sklearn forests under "sklearn_forests" (for warm starts)
+    Returns dict with trained models, scaler, features and holdout metrics
+    """
+    schema = MISSIONS[mission]
+    name = schema["name"]
+    fs = feature_set or build_features(mission)
+    params = params or {}
+    X_labeled, y = fs["X_labeled"], fs["y"]
+
+    # Scale features
+    scaler = StandardScaler()
+    X_labeled_scaled = scaler.fit_transform(X_labeled)
+
+    # Train/test split
+    X_train, X_test, y_train, y_test = train_test_split(
+        X_labeled_scaled, y, test_size=test_size, stratify=y, random_state=random_state
+    )
+
+    # Train Random Forest with SMOTE (or class weights)
+    imbalance = imbalance or IMBALANCE
+    X_train_bal, y_train_bal, balance_params = resample(X_train, y_train, imbalance, random_state)
+    rf_params = {**model_params(mission, "rf"), **balance_params, **params.get("rf", {})}
+    rf_clf = RandomForestClassifier(**rf_params)
+    rf_clf.fit(X_train_bal, y_train_bal)
+
+    # Fast serving tier
+    rf_fast, tier_stats = build_fast_tier(X_train_bal, y_train_bal, X_test, y_test, rf_clf, name, balance_params)
+
+    # Train MLP without SMOTE
+    mlp_params = {**model_params(mission, "mlp"), **params.get("mlp", {})}
+    mlp_clf = MLPClassifier(**mlp_params)
+    mlp_clf.fit(X_train, y_train)
+
+    models = {
+        "rf": rf_clf,
+        "rf_fast": rf_fast,
+        "tier_stats": tier_stats,
+        "compact_stats": {},
+        "mlp": mlp_clf,
+        "warmup_rows": X_test[:8],
+        "params": {"rf": rf_params, "mlp": mlp_params, "imbalance": imbalance},
+        "scaler": scaler,
+        "features": fs["features"],
+        "feature_names": list(fs["features"]),
+        "median_values": fs["median_values"],
+        "feature_key": fs["key"]
+    }
+
+    models["metrics"] = holdout_metrics(models, X_test, y_test)
+    if keep_forests:
+        models["sklearn_forests"] = {"rf": rf_clf, "rf_fast": rf_fast}
+    if COMPACT_FORESTS:
+        models["compact_stats"] = compact_forests(models, X_test, name)
+    return models
+
+
+def predict_candidates(mission, models, feature_set, csv=None):
+    """Unlabeled catalog rows with the random forest's predicted_label and predicted_proba"""
+    schema = MISSIONS[mission]
+    df = pd.read_csv(csv or schema["csv"])
+    df['target'] = encode_target(df[schema["label_column"]], schema)
+    X = models["scaler"].transform(feature_set["X_candidates"])
+    candidates = df.loc[feature_set["X_candidates"].index].copy()
+    if len(candidates):
+        candidates['predicted_label'] = models["rf"].predict(X)
+        candidates['predicted_proba'] = models["rf"].predict_proba(X)[:, 1]
+    else:
+        candidates['predicted_label'] = []
+        candidates['predicted_proba'] = []
+    return candidates
+
+
+def exoplanets_to_confirm(mission, candidates):
+    """Candidates predicted as planets with complete stellar data (the TRICERATOPS input)"""
+    required = [c for c in MISSIONS[mission]["confirm_required"] if c in candidates.columns]
+    return candidates[candidates['predicted_label'] == 1].dropna(subset=required)
+
+
+def write_artifacts(mission, models, candidates, output_dir, extra_confirm_csv=None):
+    """
+    Write models.joblib, metrics.json, candidates.csv and exoplanets_to_confirm.csv
+    (and forests.joblib when models carries its sklearn forests); returns the directory
+    """
+    out = Path(output_dir) / mission
+    os.makedirs(out, exist_ok=True)
+    confirm = exoplanets_to_confirm(mission, candidates)
+
+    forests = models.pop("sklearn_forests", None)
+    if forests:
+        joblib.dump(forests, out / "forests.joblib")
+    joblib.dump(models, out / "models.joblib")
+    candidates.to_csv(out / "candidates.csv", index=False)
+    confirm.to_csv(out / "exoplanets_to_confirm.csv", index=False)
+    if extra_confirm_csv:
+        confirm.to_csv(extra_confirm_csv, index=False)
+
+    report = {
+        "mission": mission,
+        "created": datetime.utcnow().isoformat(),
+        "refresh": models.get("refresh"),
+        "feature_key": models["feature_key"],
+        "n_features": len(models["features"]),
+        "params": models["params"],
+        "metrics": models["metrics"],
+        "evaluation": models.get("evaluation"),
+        "tier_stats": models["tier_stats"],
+        "compact_stats": models["compact_stats"],
+        "candidates": {
+            "total": int(len(candidates)),
+            "predicted_planets": int((candidates['predicted_label'] == 1).sum()) if len(candidates) else 0,
+            "to_confirm": int(len(confirm)),
+        },
+    }
+    with open(out / "metrics.json", "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    return out
+
+
+def load_config(path=None):
+    """DEFAULT_CONFIG overridden by a JSON config file"""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        config.update(overrides)
+    return config
+
+
+def run_training(config):
+    """Train, (optionally) evaluate and publish, and write artifacts for every configured mission"""
+    results = {}
+    for mission in config["missions"]:
+        if mission not in MISSIONS:
+            raise ValueError(f"Unknown mission '{mission}'")
+        start = time.perf_counter()
+        fs = build_features(mission, use_cache=config["feature_cache"])
+        params = config["params"].get(mission)
+        models = train_models(mission, fs, params, config["test_size"], config["random_state"],
+                              config["imbalance"], keep_forests=True)
+
+        if config["evaluate"]:
+            from evaluation import attach_evaluation, cross_validate
+            cv = cross_validate([mission], params={mission: params} if params else None,
+                                imbalance=config["imbalance"])
+            attach_evaluation(models, cv[mission])
+
+        candidates = predict_candidates(mission, models, fs)
+        out = write_artifacts(mission, models, candidates, config["output_dir"],
+                              config["confirm_csv"].get(mission))
+        # Baseline for incremental refreshes (refresh.py)
+        from refresh import holdout_rows, write_snapshot
+        write_snapshot(mission, pd.read_csv(MISSIONS[mission]["csv"]), candidates, out,
+                       holdout_rows(fs["y"], config["test_size"], config["random_state"]))
+        results[mission] = {"output": str(out)}
+
+        if config["publish"]:
+            from ml_wrappers import MODEL_REGISTRY_DIR
+            from model_registry import publish_models
+            results[mission]["version"] = publish_models(str(MODEL_REGISTRY_DIR), mission, models,
+                                                         source="training.py")
+        print(f"✓ {MISSIONS[mission]['name']} trained in {time.perf_counter() - start:.1f}s → {out}")
+    return results
+
+
+def benchmark_imbalance(missions, methods=IMBALANCE_METHODS, test_size=0.2, random_state=42, repeats=3):
+    """
+    Training wall time and held-out quality of the full forest under each
+    imbalance method (median of repeats). "smote_cached" is timed cold (empty
+    cache) and warm (resample already cached).
+    Returns a list of result rows.
+    """
+    rows = []
+    for mission in missions:
+        fs = build_features(mission)
+        X_scaled = StandardScaler().fit_transform(fs["X_labeled"])
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_scaled, fs["y"], test_size=test_size, stratify=fs["y"], random_state=random_state
+        )
+        rf_params = model_params(mission, "rf")
+        for method in methods:
+            variants = [("cold", True), ("warm", False)] if method == "smote_cached" else [(None, True)]
+            for variant, fresh_cache in variants:
+                timings = []
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    if not fresh_cache:
+                        resample(X_train, y_train, method, random_state, cache_dir)
+                    for _ in range(repeats):
+                        if fresh_cache:
+                            for f in Path(cache_dir).glob("*.npz"):
+                                f.unlink()
+                        start = time.perf_counter()
+                        X_bal, y_bal, balance_params = resample(X_train, y_train, method, random_state, cache_dir)
+                        resampled = time.perf_counter()
+                        model = RandomForestClassifier(**{**rf_params, **balance_params}).fit(X_bal, y_bal)
+                        timings.append((resampled - start, time.perf_counter() - resampled))
+                resample_s, fit_s = np.median(np.array(timings), axis=0)
+                proba = model.predict_proba(X_test)[:, 1]
+                pred = model.predict(X_test)
+                rows.append({
+                    "mission": mission,
+                    "method": method + (f" ({variant})" if variant else ""),
+                    "train_rows": int(len(y_bal)),
+                    "resample_s": float(resample_s),
+                    "fit_s": float(fit_s),
+                    "total_s": float(resample_s + fit_s),
+                    "precision": float(precision_score(y_test, pred, zero_division=0)),
+                    "recall": float(recall_score(y_test, pred, zero_division=0)),
+                    "f1": float(f1_score(y_test, pred, zero_division=0)),
+                    "accuracy": float(accuracy_score(y_test, pred)),
+                    "roc_auc": float(roc_auc_score(y_test, proba)),
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the K2 and TESS classifiers and write artifacts")
+    parser.add_argument("missions", nargs="*", help="Missions to train (k2, tess; default: from config)")
+    parser.add_argument("--config", default=None, help="JSON config file (keys of DEFAULT_CONFIG)")
+    parser.add_argument("--output", default=None, help="Output directory")
+    parser.add_argument("--evaluate", action="store_true", help="Cross-validate and store the results")
+    parser.add_argument("--publish", action="store_true", help="Publish to the API model registry")
+    parser.add_argument("--no-cache", action="store_true", help="Rebuild features instead of using the cache")
+    parser.add_argument("--imbalance", choices=IMBALANCE_METHODS, default=None,
+                        help="Class imbalance handling for the forests (default: from config)")
+    parser.add_argument("--benchmark-imbalance", action="store_true",
+                        help="Compare imbalance methods on training time and quality, then exit")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.missions:
+        config["missions"] = args.missions
+    unknown = set(config["missions"]) - set(MISSIONS)
+    if unknown:
+        parser.error(f"unknown mission(s): {', '.join(sorted(unknown))}")
+    if args.output:
+        config["output_dir"] = args.output
+    config["evaluate"] = config["evaluate"] or args.evaluate
+    config["publish"] = config["publish"] or args.publish
+    config["feature_cache"] = config["feature_cache"] and not args.no_cache
+    if args.imbalance:
+        config["imbalance"] = args.imbalance
+
+    if args.benchmark_imbalance:
+        rows = benchmark_imbalance(config["missions"], test_size=config["test_size"],
+                                   random_state=config["random_state"])
+        for r in rows:
+            print(f"{r['mission'].upper():5s} {r['method']:20s} {r['train_rows']:6d} rows  "
+                  f"resample {r['resample_s']:6.3f}s  fit {r['fit_s']:6.3f}s  total {r['total_s']:6.3f}s  "
+                  f"f1 {r['f1']:.3f}  accuracy {r['accuracy']:.3f}  roc_auc {r['roc_auc']:.3f}")
+        os.makedirs(config["output_dir"], exist_ok=True)
+        path = Path(config["output_dir"]) / "imbalance_benchmark.json"
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"✓ Wrote {path}")
+        return 0
+
+    for mission, result in run_training(config).items():
+        with open(Path(result["output"]) / "metrics.json") as f:
+            report = json.load(f)
+        for key in ("rf", "mlp"):
+            m = report["metrics"][key]
+            print(f"{mission.upper():5s} {key:4s} precision {m['precision']:.3f}  recall {m['recall']:.3f}  "
+                  f"f1 {m['f1']:.3f}  accuracy {m['accuracy']:.3f}")
+        c = report["candidates"]
+        print(f"      {c['total']} candidates: {c['predicted_planets']} predicted planets, "
+              f"{c['to_confirm']} with complete stellar data"
+              + (f"; published as v{result['version']:04d}" if "version" in result else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Successive-halving hyperparameter search for the K2 and TESS classifiers
+Samples random configurations of the random forest and MLP, scores each with
+stratified k-fold CV on a small stratified subsample of the labeled rows, keeps
+the best 1/eta and repeats with eta times more rows; the last round scores the
+finalists on all rows. The current defaults are carried through every round as
+the reference (and win if nothing beats them).
+Every (dataset, model, candidate, fold) fit of a round runs in one process pool.
+
+Configurations are ranked by a combined objective:
+    objective = CV metric - latency_weight * single-row predict_proba latency (ms)
+Latency is measured in the (busy) workers, so compare it across candidates of
+one run rather than with serving numbers.
+The winners are written to model/data/tuning/<dataset>.json, which
+training.model_params reads, so the next publish_models.py run trains (and
+evaluation.py cross-validates) the tuned models.
+
+Usage: python tuning.py [k2] [tess] [--models rf mlp] [--candidates 27] [--eta 3]
+                        [--metric accuracy] [--latency-weight 0.005] [--workers N]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from evaluation import METRICS, fit_model, score
+from training import DEFAULT_PARAMS, MISSIONS, TUNING_DIR, _predict_latency_ms, build_features
+
+SEARCH_SPACES = {
+    "rf": {
+        "n_estimators": [10, 25, 50, 100, 200],
+        "max_depth": [None, 6, 10, 16],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": ["sqrt", "log2", 0.5],
+    },
+    "mlp": {
+        "hidden_layer_sizes": [[32], [64], [100], [64, 32], [100, 50]],
+        "alpha": [1e-5, 1e-4, 1e-3, 1e-2],
+        "learning_rate_init": [1e-3, 3e-3, 1e-2],
+        "max_iter": [200, 500],
+        "early_stopping": [False, True],
+    },
+}
+N_CANDIDATES = 27
+ETA = 3
+N_SPLITS = 3
+MIN_ROWS = 300
+METRIC = "accuracy"
+# Objective cost of one millisecond of single-row latency, in metric units
+LATENCY_WEIGHT = 0.005
+
+
+def sample_candidates(space, n, rng):
+    """The defaults plus n - 1 distinct random configurations from the grid"""
+    names = sorted(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    picks = rng.choice(len(grid), size=min(n - 1, len(grid)), replace=False)
+    return [None] + [dict(zip(names, grid[i])) for i in picks]
+
+
+def candidate_params(model_key, config):
+    """Constructor arguments of a candidate (None = the untuned defaults)"""
+    return {**(DEFAULT_PARAMS[model_key] if config is None else config), "random_state": 42}
+
+
+def run_trial(search_id, candidate, fold, model_key, params, X, y, train_idx, test_idx):
+    """Fit and score one candidate on one fold, with its single-row latency (worker process)"""
+    scaler, model = fit_model(model_key, params, X[train_idx], y[train_idx])
+    X_test = scaler.transform(X[test_idx])
+    metrics = score(y[test_idx], model.predict_proba(X_test)[:, 1])
+    metrics["latency_ms"] = _predict_latency_ms(model, X_test[:1], repeats=10)
+    return search_id, candidate, fold, metrics
+
+
+def subsample(y, n_rows, seed):
+    """Indices of a stratified subsample of n_rows (all rows if n_rows >= len(y))"""
+    if n_rows >= len(y):
+        return np.arange(len(y))
+    idx, _ = train_test_split(np.arange(len(y)), train_size=n_rows, stratify=y, random_state=seed)
+    return np.sort(idx)
+
+
+def successive_halving(datasets, model_keys, n_candidates=N_CANDIDATES, eta=ETA, n_splits=N_SPLITS,
+                       metric=METRIC, latency_weight=LATENCY_WEIGHT, max_workers=None, seed=42):
+    """
+    Run one search per (dataset, model) in lockstep rounds over a shared pool
+    Returns {dataset: {"searches": {model_key: result}, "history": [...]}}
+    """
+    rng = np.random.default_rng(seed)
+    searches = []
+    for dataset in datasets:
+        fs = build_features(dataset)
+        X = np.asarray(fs["X_labeled"], dtype=np.float64)
+        y = np.asarray(fs["y"], dtype=int)
+        for model_key in model_keys:
+            searches.append({
+                "dataset": dataset, "model": model_key, "X": X, "y": y,
+                "candidates": sample_candidates(SEARCH_SPACES[model_key], n_candidates, rng),
+                "history": [],
+            })
+
+    n_rounds = max(1, math.floor(math.log(n_candidates, eta)) + 1)
+    workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rnd in range(n_rounds):
+            futures = []
+            for search_id, search in enumerate(searches):
+                n_rows = max(MIN_ROWS, int(len(search["y"]) * eta ** (rnd - n_rounds + 1)))
+                rows = subsample(search["y"], n_rows, seed + rnd)
+                X, y = search["X"][rows], search["y"][rows]
+                search["rows"] = len(rows)
+                splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+                splits = list(splitter.split(X, y))
+                for candidate, config in enumerate(search["candidates"]):
+                    params = candidate_params(search["model"], config)
+                    for fold, (train_idx, test_idx) in enumerate(splits):
+                        futures.append(pool.submit(
+                            run_trial, search_id, candidate, fold, search["model"], params, X, y, train_idx, test_idx
+                        ))
+
+            trials = {}
+            for future in futures:
+                search_id, candidate, fold, metrics = future.result()
+                trials.setdefault((search_id, candidate), []).append(metrics)
+
+            for search_id, search in enumerate(searches):
+                scored = []
+                for candidate, config in enumerate(search["candidates"]):
+                    folds = trials[(search_id, candidate)]
+                    entry = {
+                        "round": rnd,
+                        "rows": search["rows"],
+                        "params": candidate_params(search["model"], config),
+                        "default": config is None,
+                        **{m: float(np.nanmean([f[m] for f in folds])) for m in METRICS},
+                        "latency_ms": float(np.median([f["latency_ms"] for f in folds])),
+                    }
+                    entry["objective"] = entry[metric] - latency_weight * entry["latency_ms"]
+                    search["history"].append(entry)
+                    scored.append((entry["objective"], candidate, entry))
+                scored.sort(key=lambda item: -item[0])
+                keep = max(1, math.ceil(len(scored) / eta))
+                survivors = [c for _, c, _ in scored[:keep]]
+                # The defaults always advance, as the reference the winner is compared to
+                survivors += [c for c, config in enumerate(search["candidates"])
+                              if config is None and c not in survivors]
+                search["candidates"] = [search["candidates"][c] for c in survivors]
+                search["best"] = scored[0][2]
+            print(f"Round {rnd + 1}/{n_rounds}: {len(futures)} fits, "
+                  f"{time.perf_counter() - start:.1f}s elapsed")
+
+    results = {}
+    for search in searches:
+        defaults = [h for h in search["history"] if h["default"]]
+        result = {**search["best"], "baseline": defaults[-1]}
+        dataset_result = results.setdefault(search["dataset"], {"searches": {}, "history": []})
+        dataset_result["searches"][search["model"]] = result
+        dataset_result["history"].extend({"model": search["model"], **h} for h in search["history"])
+    return results
+
+
+def write_tuning(dataset, result, settings):
+    """Write a dataset's winning configurations where training.model_params finds them"""
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    path = TUNING_DIR / f"{dataset}.json"
+    previous = {}
+    if path.exists():
+        with open(path) as f:
+            previous = json.load(f)
+    artifact = {
+        **{k: v for k, v in previous.items() if k in SEARCH_SPACES},
+        "dataset": dataset,
+        "created": datetime.utcnow().isoformat(),
+        "settings": settings,
+        "history": result["history"],
+    }
+    for model_key, best in result["searches"].items():
+        params = {k: v for k, v in best["params"].items() if k != "random_state"}
+        artifact[model_key] = {"params": params, "score": {k: v for k, v in best.items() if k != "params"}}
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(artifact, f, indent=2, default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving search over RF and MLP hyperparameters")
+    parser.add_argument("datasets", nargs="*", help="Datasets to tune (k2, tess; default: all)")
+    parser.add_argument("--models", nargs="+", default=sorted(SEARCH_SPACES), help="rf and/or mlp")
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES)
+    parser.add_argument("--eta", type=int, default=ETA)
+    parser.add_argument("--folds", type=int, default=N_SPLITS)
+    parser.add_argument("--metric", default=METRIC, choices=METRICS)
+    parser.add_argument("--latency-weight", type=float, default=LATENCY_WEIGHT,
+                        help="Objective penalty per millisecond of single-row latency")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    unknown = (set(args.datasets) - set(MISSIONS)) | (set(args.models) - set(SEARCH_SPACES))
+    if unknown:
+        parser.error(f"unknown dataset(s) or model(s): {', '.join(sorted(unknown))}")
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+
+    settings = {k: getattr(args, k) for k in ("candidates", "eta", "folds", "metric", "latency_weight", "seed")}
+    results = successive_halving(
+        args.datasets or sorted(MISSIONS), args.models, args.candidates, args.eta, args.folds,
+        args.metric, args.latency_weight, args.workers, args.seed
+    )
+    for dataset, result in results.items():
+        path = write_tuning(dataset, result, settings)
+        for model_key, best in result["searches"].items():
+            base = best["baseline"]
+            print(f"{dataset.upper():5s} {model_key:4s} {best['params']}")
+            print(f"      {args.metric} {best[args.metric]:.3f}, {best['latency_ms']:.2f} ms "
+                  f"(defaults: {base[args.metric]:.3f}, {base['latency_ms']:.2f} ms)")
+        print(f"✓ Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
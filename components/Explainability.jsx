@@ -15,15 +15,24 @@ const Explainability = () => {
     );
   }
   
-  const { featureImportance, rationale } = explainability;
+  const { featureImportance, rationale, contributions } = explainability;
+  
+  // Per-row contributions when available, global importances otherwise
+  const perRow = Array.isArray(contributions) && contributions.length > 0;
+  const bars = perRow
+    ? contributions.slice(0, 8).map(c => ({
+        label: `${c.feature} = ${Number(c.value).toPrecision(4)}`,
+        value: c.contribution,
+      }))
+    : featureImportance.slice(0, 8).map(f => ({ label: f.feature, value: f.importance }));
   
   const chartData = [{
-    x: featureImportance.slice(0, 8).map(f => f.importance),
-    y: featureImportance.slice(0, 8).map(f => f.feature),
+    x: bars.map(b => b.value).reverse(),
+    y: bars.map(b => b.label).reverse(),
     type: 'bar',
     orientation: 'h',
     marker: {
-      color: '#7c4dff',
+      color: bars.map(b => (perRow ? (b.value >= 0 ? '#2ecc71' : '#ff5c7a') : '#7c4dff')).reverse(),
       line: {
         color: '#4a2a86',
         width: 1,
@@ -42,7 +51,7 @@ const Explainability = () => {
       color: '#e3ecff',
     },
     xaxis: {
-      title: 'Importance',
+      title: perRow ? 'Contribution to planet probability' : 'Importance',
       gridcolor: '#1e263d',
       color: '#aab6d6',
     },
@@ -50,7 +59,7 @@ const Explainability = () => {
       gridcolor: '#1e263d',
       color: '#aab6d6',
     },
-    margin: { l: 140, r: 20, t: 20, b: 40 },
+    margin: { l: perRow ? 200 : 140, r: 20, t: 20, b: 40 },
   };
   
   const config = {
@@ -63,7 +72,9 @@ const Explainability = () => {
       <h3 className="exo-card__title">Explainability</h3>
       
       <div className="exo-explain__section">
-        <h4 className="exo-explain__subtitle">Feature Importance</h4>
+        <h4 className="exo-explain__subtitle">
+          {perRow ? 'What Drove This Prediction' : 'Feature Importance'}
+        </h4>
         <Plot
           data={chartData}
           layout={layout}
@@ -136,7 +136,7 @@ const ModelControls = () => {
             Model Metrics (F1 Score)
           </p>
           <p className="tabular-nums" style={{ fontSize: '20px', fontWeight: '600', color: 'var(--color-accent-3)' }}>
-            {models.find(m => m.id === selectedModel)?.metrics.f1.toFixed(2)}
+            {models.find(m => m.id === selectedModel)?.metrics?.f1?.toFixed(2) ?? '--'}
           </p>
         </div>
       )}
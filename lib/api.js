@@ -137,13 +137,13 @@ export const getModels = async () => {
         id: 'random_forest_k2',
         name: 'Random Forest (K2)',
         description: 'Random Forest classifier trained on K2 mission data',
-        metrics: { precision: 0.91, recall: 0.88, f1: 0.89 },
+        metrics: null,  // Unknown until the API reports evaluated metrics
       },
       {
         id: 'mlp_k2',
         name: 'Neural Network (K2)',
         description: 'Multi-layer Perceptron trained on K2 mission data',
-        metrics: { precision: 0.87, recall: 0.85, f1: 0.86 },
+        metrics: null,
       },
     ];
   }
@@ -201,6 +201,51 @@ export const runInference = async (data, model, threshold) => {
   }
 };
 
+// Progress event stages sent by /api/jobs/{id}/events
+const JOB_STAGES = [
+  'started', 'host', 'star_table', 'lightcurve', 'detrend',
+  'calc_probs', 'candidate', 'partial', 'done', 'failed',
+];
+
+// Start a background job ('triceratops', 'triceratops/batch' or 'classify')
+export const startJob = async (kind, body) => {
+  const response = await fetchWithTimeout(`${API_BASE_URL}/api/jobs/${kind}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `Server error: ${response.status}`);
+  }
+
+  return await response.json();
+};
+
+// Stream a job's progress events; returns a function that stops listening
+export const streamJob = (jobId, { onEvent, onDone, onError } = {}) => {
+  const source = new EventSource(`${API_BASE_URL}/api/jobs/${jobId}/events`);
+
+  JOB_STAGES.forEach((stage) => {
+    source.addEventListener(stage, (message) => {
+      const event = JSON.parse(message.data);
+      onEvent?.(event);
+      if (stage === 'done') {
+        source.close();
+        onDone?.(event.result);
+      } else if (stage === 'failed') {
+        source.close();
+        onError?.(new Error(event.error));
+      }
+    });
+  });
+
+  return () => source.close();
+};
+
 // Generate mock light curve data
 const generateMockLightCurve = () => {
   const points = 2000;
@@ -290,6 +335,8 @@ export default {
   fetchMAST,
   getModels,
   runInference,
+  startJob,
+  streamJob,
   getExoplanetLinks,
 };
 
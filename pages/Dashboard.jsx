@@ -135,7 +135,7 @@ const Dashboard = () => {
         <div style={{ padding: '12px', background: '#0b1120', borderRadius: '10px' }}>
           <p style={{ fontSize: '12px', color: 'var(--color-text-dim)', marginBottom: '4px' }}>F1 Score</p>
           <p className="tabular-nums" style={{ fontSize: '24px', fontWeight: '600', color: 'var(--color-accent-3)' }}>
-            {activeModelData ? activeModelData.metrics.f1.toFixed(2) : '--'}
+            {activeModelData?.metrics?.f1?.toFixed(2) ?? '--'}
           </p>
         </div>
         <Link to="/models" className="exo-btn ghost" style={{ width: '100%', marginTop: '12px' }}>
@@ -31,21 +31,21 @@ const Models = () => {
               <div style={{ padding: '10px', background: '#0b1120', borderRadius: '8px' }}>
                 <div style={{ fontSize: '11px', color: 'var(--color-text-dim)' }}>Precision</div>
                 <div className="tabular-nums" style={{ fontSize: '18px', fontWeight: '600', color: 'var(--color-accent)' }}>
-                  {model.metrics.precision.toFixed(2)}
+                  {model.metrics?.precision?.toFixed(2) ?? '--'}
                 </div>
               </div>
               
               <div style={{ padding: '10px', background: '#0b1120', borderRadius: '8px' }}>
                 <div style={{ fontSize: '11px', color: 'var(--color-text-dim)' }}>Recall</div>
                 <div className="tabular-nums" style={{ fontSize: '18px', fontWeight: '600', color: 'var(--color-accent-2)' }}>
-                  {model.metrics.recall.toFixed(2)}
+                  {model.metrics?.recall?.toFixed(2) ?? '--'}
                 </div>
               </div>
               
               <div style={{ padding: '10px', background: '#0b1120', borderRadius: '8px' }}>
                 <div style={{ fontSize: '11px', color: 'var(--color-text-dim)' }}>F1 Score</div>
                 <div className="tabular-nums" style={{ fontSize: '18px', fontWeight: '600', color: 'var(--color-accent-3)' }}>
-                  {model.metrics.f1.toFixed(2)}
+                  {model.metrics?.f1?.toFixed(2) ?? '--'}
                 </div>
               </div>
             </div>